@@ -15,6 +15,8 @@
 """Build script for the CI `test_suites` target."""
 
 import argparse
+import collections
+import concurrent.futures
 from dataclasses import dataclass
 import json
 import logging
@@ -23,6 +25,7 @@ import pathlib
 import re
 import subprocess
 import sys
+import time
 from typing import Callable
 from build_context import BuildContext
 import optimized_targets
@@ -36,6 +39,8 @@ LOG_PATH = 'logs/build_test_suites.log'
 # Currently, this prevents the removal of those tags when they exist. In the future we likely
 # want the script to supply 'dist directly
 REQUIRED_BUILD_TARGETS = frozenset(['dist', 'droid', 'checkbuild'])
+# The maximum number of packaging commands that are run at the same time.
+MAX_PACKAGING_JOBS = min(os.cpu_count() or 1, 8)
 
 
 class Error(Exception):
@@ -105,8 +110,9 @@ class BuildPlanner:
           target, self.build_context, self.args
       )
       build_targets.update(target_optimizer.get_build_targets())
+      optimized_targets.request_soong_vars(target_optimizer.get_soong_vars())
       packaging_commands_getters.append(
-          target_optimizer.get_package_outputs_commands
+          (target, target_optimizer.get_package_outputs_commands)
       )
 
     return BuildPlan(build_targets, packaging_commands_getters)
@@ -204,7 +210,10 @@ class BuildPlanner:
 @dataclass(frozen=True)
 class BuildPlan:
   build_targets: set[str]
-  packaging_commands_getters: list[Callable[[], list[list[str]]]]
+  # The packaging commands getter of each optimized target.
+  packaging_commands_getters: list[
+      tuple[str, Callable[[], list[list[str]]]]
+  ]
 
 
 def build_test_suites(argv: list[str]) -> int:
@@ -301,15 +310,137 @@ def execute_build_plan(build_plan: BuildPlan):
 
   get_metrics_agent().packaging_start()
   try:
-    for packaging_commands_getter in build_plan.packaging_commands_getters:
-      for packaging_command in packaging_commands_getter():
-        run_command(packaging_command)
+    packaging_executor = PackagingExecutor(MAX_PACKAGING_JOBS)
+    for target, packaging_commands_getter in (
+        build_plan.packaging_commands_getters
+    ):
+      packaging_executor.add_commands(target, packaging_commands_getter())
+    packaging_executor.execute()
   except subprocess.CalledProcessError as e:
     raise BuildFailureError(e.returncode) from e
   finally:
     get_metrics_agent().packaging_end()
 
 
+@dataclass(frozen=True)
+class PackagingCommand:
+  target: str
+  args: list[str]
+  # The files written by the command, or None if they aren't known.
+  outputs: frozenset[str] | None
+
+
+class PackagingExecutor:
+  """Runs packaging commands concurrently, in dependency order.
+
+  A command runs after all of the commands added before it that write any of
+  its arguments, or that have any of its outputs as arguments. The outputs are
+  known for soong_zip commands; any other command runs after all of the
+  commands added before it, and before all of the commands added after it.
+
+  The packaging time of each target is reported from the start of its first
+  command to the end of its last one.
+  """
+
+  def __init__(self, max_workers: int):
+    self._max_workers = max_workers
+    self._commands = []
+
+  def add_commands(self, target: str, commands: list[list[str]]):
+    for args in commands:
+      self._commands.append(
+          PackagingCommand(target, args, self._get_outputs(args))
+      )
+
+  @staticmethod
+  def _get_outputs(args: list[str]) -> frozenset[str] | None:
+    if not args or not str(args[0]).endswith('soong_zip'):
+      return None
+    args = [str(arg) for arg in args]
+    try:
+      return frozenset([args[args.index('-o') + 1]])
+    except (ValueError, IndexError):
+      return None
+
+  def _get_dependencies(self) -> list[set[int]]:
+    args = [set(str(arg) for arg in command.args) for command in self._commands]
+    dependencies = []
+    for i, command in enumerate(self._commands):
+      command_dependencies = set()
+      for j, earlier_command in enumerate(self._commands[:i]):
+        # The outputs are also arguments, so this covers commands that write
+        # the same outputs.
+        if (
+            command.outputs is None
+            or earlier_command.outputs is None
+            or not earlier_command.outputs.isdisjoint(args[i])
+            or not command.outputs.isdisjoint(args[j])
+        ):
+          command_dependencies.add(j)
+      dependencies.append(command_dependencies)
+    return dependencies
+
+  def execute(self):
+    """Runs all of the added commands.
+
+    Raises:
+      subprocess.CalledProcessError: If any of the commands fails. The commands
+        that are already running are waited for, and no others are started.
+    """
+    dependencies = self._get_dependencies()
+    remaining_commands = collections.Counter(
+        command.target for command in self._commands
+    )
+    started_targets = set()
+    pending = list(range(len(self._commands)))
+    done = set()
+    running = {}
+    error = None
+
+    with concurrent.futures.ThreadPoolExecutor(self._max_workers) as executor:
+      while True:
+        # Commands are only submitted when they can start right away, so that
+        # the reported start times are accurate.
+        ready = [i for i in pending if dependencies[i] <= done]
+        while ready and not error and len(running) < self._max_workers:
+          i = ready.pop(0)
+          pending.remove(i)
+          command = self._commands[i]
+          if command.target and command.target not in started_targets:
+            started_targets.add(command.target)
+            get_metrics_agent().target_packaging_start(command.target)
+          running[executor.submit(self._run_command, command)] = i
+        if not running:
+          break
+
+        finished, _ = concurrent.futures.wait(
+            running, return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        for future in finished:
+          i = running.pop(future)
+          done.add(i)
+          command = self._commands[i]
+          remaining_commands[command.target] -= 1
+          if command.target and not remaining_commands[command.target]:
+            get_metrics_agent().target_packaging_end(command.target)
+          try:
+            future.result()
+          except subprocess.CalledProcessError as e:
+            error = error or e
+
+    if error:
+      raise error
+
+  @staticmethod
+  def _run_command(command: PackagingCommand):
+    start_time = time.monotonic()
+    run_command(command.args)
+    logging.info(
+        f'Packaging command for {command.target} took'
+        f' {time.monotonic() - start_time:.2f}s: {command.args}'
+    )
+
+
 def get_top() -> pathlib.Path:
   return pathlib.Path(os.environ['TOP'])
 
@@ -28,6 +28,7 @@ import subprocess
 import sys
 import tempfile
 import textwrap
+import threading
 import time
 from typing import Callable
 import unittest
@@ -252,6 +253,76 @@ class RunCommandIntegrationTest(ci_test_lib.TestCase):
       os.kill(p.pid, signal.SIGINT)
 
 
+class PackagingExecutorTest(unittest.TestCase):
+
+  def setUp(self):
+    run_command_patcher = mock.patch('build_test_suites.run_command')
+    self.addCleanup(run_command_patcher.stop)
+    self.mock_run_command = run_command_patcher.start()
+
+    metrics_agent_patcher = mock.patch('build_test_suites.get_metrics_agent')
+    self.addCleanup(metrics_agent_patcher.stop)
+    self.mock_metrics_agent = metrics_agent_patcher.start().return_value
+
+  def test_independent_commands_run_concurrently(self):
+    barrier = threading.Barrier(2, timeout=10)
+    self.mock_run_command.side_effect = lambda args: barrier.wait()
+    executor = build_test_suites.PackagingExecutor(max_workers=2)
+    executor.add_commands('target', [
+        ['/top/soong_zip', '-d', '-o', '/dist/a.zip', '-D', '/out/a'],
+        ['/top/soong_zip', '-d', '-o', '/dist/b.zip', '-D', '/out/b'],
+    ])
+
+    executor.execute()
+
+    self.assertEqual(self.mock_run_command.call_count, 2)
+
+  def test_dependent_commands_run_in_order(self):
+    commands = [
+        ['/top/soong_zip', '-o', '/dist/a.zip', '-D', '/out/a'],
+        ['/top/soong_zip', '-o', '/dist/b.zip', '-f', '/dist/a.zip'],
+        ['/top/soong_zip', '-o', '/dist/a.zip', '-D', '/out/c'],
+        ['other_command'],
+        ['/top/soong_zip', '-o', '/dist/d.zip', '-D', '/out/d'],
+    ]
+    run_order = []
+    self.mock_run_command.side_effect = lambda args: run_order.append(
+        commands.index(args)
+    )
+    executor = build_test_suites.PackagingExecutor(max_workers=4)
+    executor.add_commands('target', commands)
+
+    executor.execute()
+
+    self.assertLess(run_order.index(0), run_order.index(1))
+    self.assertLess(run_order.index(1), run_order.index(2))
+    self.assertEqual(run_order[3:], [3, 4])
+
+  def test_reports_target_packaging_times(self):
+    executor = build_test_suites.PackagingExecutor(max_workers=2)
+    executor.add_commands('target_1', [['command_1'], ['command_2']])
+    executor.add_commands('target_2', [['command_3']])
+
+    executor.execute()
+
+    self.mock_metrics_agent.assert_has_calls([
+        mock.call.target_packaging_start('target_1'),
+        mock.call.target_packaging_end('target_1'),
+        mock.call.target_packaging_start('target_2'),
+        mock.call.target_packaging_end('target_2'),
+    ])
+
+  def test_failure_stops_remaining_commands(self):
+    self.mock_run_command.side_effect = subprocess.CalledProcessError(42, None)
+    executor = build_test_suites.PackagingExecutor(max_workers=2)
+    executor.add_commands('target', [['command_1'], ['command_2']])
+
+    with self.assertRaises(subprocess.CalledProcessError):
+      executor.execute()
+
+    self.mock_run_command.assert_called_once_with(['command_1'])
+
+
 class BuildPlannerTest(unittest.TestCase):
 
   class TestOptimizedBuildTarget(optimized_targets.OptimizedBuildTarget):
@@ -332,6 +403,10 @@ class BuildPlannerTest(unittest.TestCase):
     build_plan = build_planner.create_build_plan()
 
     self.assertIn(packaging_commands, self.run_packaging_commands(build_plan))
+    self.assertIn(
+        'target_1',
+        [target for target, _ in build_plan.packaging_commands_getters],
+    )
 
   def test_individual_build_optimization_off_doesnt_optimize(self):
     build_targets = {'target_1', 'target_2'}
@@ -514,7 +589,7 @@ class BuildPlannerTest(unittest.TestCase):
   def run_packaging_commands(self, build_plan: build_test_suites.BuildPlan):
     return [
         packaging_command_getter()
-        for packaging_command_getter in build_plan.packaging_commands_getters
+        for _, packaging_command_getter in build_plan.packaging_commands_getters
     ]
 
 
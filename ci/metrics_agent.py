@@ -76,6 +76,11 @@ class MetricsAgent:
 
   def target_packaging_start(self, name: str):
     target_result = self._target_results.get(name)
+    if target_result is None:
+      target_result = (
+          metrics_pb2.OptimizedBuildMetrics.TargetOptimizationResult()
+      )
+      target_result.name = name
     target_result.packaging_perf.start_time = time.time_ns()
     self._target_results[name] = target_result
 
@@ -21,11 +21,62 @@ import logging
 import os
 import pathlib
 import subprocess
+from typing import Any
 
 from build_context import BuildContext
 import test_mapping_module_retriever
 
 
+# Outputs of the product config, relative to the out dir, which change whenever
+# the values of the soong variables may change.
+_PRODUCT_CONFIG_OUTPUTS = (
+    'soong/soong.variables',
+    'soong/soong.{product}.variables',
+)
+
+# Soong variables dumped by this process, keyed by the product configuration
+# they were dumped for.
+_soong_vars_cache: dict[tuple, dict[str, str]] = {}
+
+# Soong variables that the optimizers will need, which are dumped along with
+# the first query.
+_requested_soong_vars: set[str] = set()
+
+
+def request_soong_vars(soong_vars: set[str]):
+  """Adds soong variables to be dumped along with the first query.
+
+  This allows the variables needed by all of the optimizers to be dumped with a
+  single soong_ui invocation.
+  """
+  _requested_soong_vars.update(soong_vars)
+
+
+def _get_file_fingerprint(path: pathlib.Path) -> tuple[int, int] | None:
+  try:
+    st = os.stat(path)
+  except OSError:
+    return None
+  return (st.st_mtime_ns, st.st_size)
+
+
+def _soong_vars_cache_key(src_top: pathlib.Path, soong_ui: str) -> tuple:
+  product = os.environ.get('TARGET_PRODUCT', '')
+  out_dir = src_top / os.environ.get('OUT_DIR', 'out')
+  config_outputs = [soong_ui] + [
+      out_dir / output.format(product=product)
+      for output in _PRODUCT_CONFIG_OUTPUTS
+  ]
+  return (
+      str(src_top),
+      product,
+      os.environ.get('TARGET_BUILD_VARIANT', ''),
+      os.environ.get('TARGET_RELEASE', ''),
+      str(out_dir),
+      tuple(_get_file_fingerprint(path) for path in config_outputs),
+  )
+
+
 class OptimizedBuildTarget(ABC):
   """A representation of an optimized build target.
 
@@ -79,6 +130,10 @@ class OptimizedBuildTarget(ABC):
         f'get_build_targets_impl not implemented in {type(self).__name__}'
     )
 
+  def get_soong_vars(self) -> set[str]:
+    """Returns the soong variables needed to package the outputs."""
+    return set()
+
   def _generate_zip_options_for_items(
       self,
       prefix: str = '',
@@ -117,10 +172,29 @@ class OptimizedBuildTarget(ABC):
 
   def _query_soong_vars(
       self, src_top: pathlib.Path, soong_vars: list[str]
+  ) -> dict[str, str]:
+    """Returns the values of soong variables.
+
+    Variables are only dumped once per product configuration, along with any
+    variables requested through request_soong_vars().
+    """
+    soong_ui = src_top / self._SOONG_UI_BASH_PATH
+    cached_vars = _soong_vars_cache.setdefault(
+        _soong_vars_cache_key(src_top, soong_ui), {}
+    )
+    missing_vars = set(soong_vars) - cached_vars.keys()
+    if missing_vars:
+      missing_vars.update(_requested_soong_vars - cached_vars.keys())
+      cached_vars.update(self._dump_soong_vars(soong_ui, sorted(missing_vars)))
+
+    return {var: cached_vars[var] for var in soong_vars if var in cached_vars}
+
+  def _dump_soong_vars(
+      self, soong_ui: pathlib.Path, soong_vars: list[str]
   ) -> dict[str, str]:
     process_result = subprocess.run(
         args=[
-            f'{src_top / self._SOONG_UI_BASH_PATH}',
+            f'{soong_ui}',
             '--dumpvars-mode',
             f'--abs-vars={" ".join(soong_vars)}',
         ],
@@ -136,7 +210,7 @@ class OptimizedBuildTarget(ABC):
 
     if not process_result.stdout:
       raise RuntimeError(
-          'Necessary soong variables ' + soong_vars + ' not found.'
+          f'Necessary soong variables {" ".join(soong_vars)} not found.'
       )
 
     try:
@@ -204,6 +278,77 @@ class ChangeInfo:
     return changed_files
 
 
+class ModuleConfigIndex:
+  """A persistent index of the .config files in test module output dirs.
+
+  Each entry records the config files found under a module output dir, along
+  with the mtimes of all of the directories in it. Entries are checked by
+  stat-ing those directories, and the module dir is only walked again if any of
+  them was changed or removed, so packaging a few modules only costs a few
+  stats once the index was populated by an earlier build.
+  """
+
+  def __init__(self, index_file: pathlib.Path):
+    self._index_file = index_file
+    self._modified = False
+    try:
+      with open(index_file) as f:
+        self._entries = json.load(f)
+    except (OSError, ValueError):
+      self._entries = {}
+    if not isinstance(self._entries, dict):
+      self._entries = {}
+
+  def get_config_files(self, module_dir: pathlib.Path) -> list[pathlib.Path]:
+    """Returns the config files under module_dir, which must exist."""
+    key = str(module_dir)
+    entry = self._entries.get(key)
+    if entry is None or not self._is_up_to_date(module_dir, entry):
+      entry = self._index_module_dir(module_dir)
+      self._entries[key] = entry
+      self._modified = True
+    return [module_dir / config_file for config_file in entry['config_files']]
+
+  @staticmethod
+  def _is_up_to_date(module_dir: pathlib.Path, entry: dict[str, Any]) -> bool:
+    try:
+      return all(
+          os.stat(module_dir / directory).st_mtime_ns == mtime_ns
+          for directory, mtime_ns in entry['dirs'].items()
+      )
+    except (OSError, KeyError, TypeError, AttributeError):
+      return False
+
+  @staticmethod
+  def _index_module_dir(module_dir: pathlib.Path) -> dict[str, Any]:
+    dirs = {}
+    config_files = []
+    for root, _, files in os.walk(module_dir):
+      relative_root = os.path.relpath(root, module_dir)
+      dirs[relative_root] = os.stat(root).st_mtime_ns
+      for file in files:
+        if file.endswith('.config'):
+          config_files.append(
+              os.path.normpath(os.path.join(relative_root, file))
+          )
+    return {'dirs': dirs, 'config_files': sorted(config_files)}
+
+  def save(self):
+    """Writes the index out if any entries were updated."""
+    if not self._modified:
+      return
+    tmp_file = self._index_file.with_name(self._index_file.name + '.tmp')
+    try:
+      with open(tmp_file, 'w') as f:
+        json.dump(self._entries, f)
+      os.replace(tmp_file, self._index_file)
+    except OSError as e:
+      # The index is only an optimization.
+      logging.warning(f'Failed to write {self._index_file}: {e}')
+      return
+    self._modified = False
+
+
 class GeneralTestsOptimizer(OptimizedBuildTarget):
   """general-tests optimizer
 
@@ -222,6 +367,18 @@ class GeneralTestsOptimizer(OptimizedBuildTarget):
       'general-tests-shared-libs',
   ])
 
+  # The name of the ModuleConfigIndex file, in HOST_OUT.
+  _CONFIG_INDEX_NAME = 'general-tests_config_index.json'
+
+  # Soong variables needed to package general-tests.
+  _PACKAGING_SOONG_VARS = (
+      'HOST_OUT_TESTCASES',
+      'TARGET_OUT_TESTCASES',
+      'PRODUCT_OUT',
+      'SOONG_HOST_OUT',
+      'HOST_OUT',
+  )
+
   def get_build_targets_impl(self) -> set[str]:
     change_info_file_path = os.environ.get('CHANGE_INFO')
     if not change_info_file_path:
@@ -268,16 +425,7 @@ class GeneralTestsOptimizer(OptimizedBuildTarget):
     src_top = pathlib.Path(os.environ.get('TOP', os.getcwd()))
     dist_dir = pathlib.Path(os.environ.get('DIST_DIR'))
 
-    soong_vars = self._query_soong_vars(
-        src_top,
-        [
-            'HOST_OUT_TESTCASES',
-            'TARGET_OUT_TESTCASES',
-            'PRODUCT_OUT',
-            'SOONG_HOST_OUT',
-            'HOST_OUT',
-        ],
-    )
+    soong_vars = self._query_soong_vars(src_top, self._PACKAGING_SOONG_VARS)
     host_out_testcases = pathlib.Path(soong_vars.get('HOST_OUT_TESTCASES'))
     target_out_testcases = pathlib.Path(soong_vars.get('TARGET_OUT_TESTCASES'))
     product_out = pathlib.Path(soong_vars.get('PRODUCT_OUT'))
@@ -288,23 +436,33 @@ class GeneralTestsOptimizer(OptimizedBuildTarget):
     target_paths = []
     host_config_files = []
     target_config_files = []
+    config_index = ModuleConfigIndex(
+        src_top / host_out / self._CONFIG_INDEX_NAME
+    )
     for module in self.modules_to_build:
       # The required modules are handled separately, no need to package.
       if module in self._REQUIRED_MODULES:
         continue
 
       host_path = host_out_testcases / module
-      if os.path.exists(host_path):
+      host_path_exists = os.path.exists(host_path)
+      if host_path_exists:
         host_paths.append(host_path)
-        self._collect_config_files(src_top, host_path, host_config_files)
+        self._collect_config_files(
+            src_top, host_path, host_config_files, config_index
+        )
 
       target_path = target_out_testcases / module
-      if os.path.exists(target_path):
+      target_path_exists = os.path.exists(target_path)
+      if target_path_exists:
         target_paths.append(target_path)
-        self._collect_config_files(src_top, target_path, target_config_files)
+        self._collect_config_files(
+            src_top, target_path, target_config_files, config_index
+        )
 
-      if not os.path.exists(host_path) and not os.path.exists(target_path):
+      if not host_path_exists and not target_path_exists:
         logging.info(f'No host or target build outputs found for {module}.')
+    config_index.save()
 
     zip_commands = []
 
@@ -365,11 +523,12 @@ class GeneralTestsOptimizer(OptimizedBuildTarget):
       src_top: pathlib.Path,
       root_dir: pathlib.Path,
       config_files: list[str],
+      config_index: ModuleConfigIndex,
   ):
-    for root, dirs, files in os.walk(src_top / root_dir):
-      for file in files:
-        if file.endswith('.config'):
-          config_files.append(root_dir / file)
+    for config_file in config_index.get_config_files(src_top / root_dir):
+      config_files.append(
+          root_dir / os.path.relpath(config_file, src_top / root_dir)
+      )
 
   def _get_zip_test_configs_zips_commands(
       self,
@@ -470,6 +629,9 @@ class GeneralTestsOptimizer(OptimizedBuildTarget):
 
     return zip_commands
 
+  def get_soong_vars(self) -> set[str]:
+    return set(self._PACKAGING_SOONG_VARS)
+
   def get_enabled_flag(self):
     return 'general_tests_optimized'
 
@@ -37,6 +37,17 @@ class GeneralTestsOptimizerTest(fake_filesystem_unittest.TestCase):
     self.addCleanup(os_environ_patcher.stop)
     self.mock_os_environ = os_environ_patcher.start()
 
+    soong_vars_cache_patcher = mock.patch.dict(
+        optimized_targets._soong_vars_cache, clear=True
+    )
+    self.addCleanup(soong_vars_cache_patcher.stop)
+    soong_vars_cache_patcher.start()
+    requested_soong_vars_patcher = mock.patch.object(
+        optimized_targets, '_requested_soong_vars', set()
+    )
+    self.addCleanup(requested_soong_vars_patcher.stop)
+    requested_soong_vars_patcher.start()
+
     self._setup_working_build_env()
     self._write_change_info_file()
     test_mapping_dir = pathlib.Path('/project/path/file/path')
@@ -95,7 +106,7 @@ class GeneralTestsOptimizerTest(fake_filesystem_unittest.TestCase):
     with open(self.change_info_file, 'w') as f:
       json.dump(change_info_contents, f)
 
-  def _write_test_mapping_file(self):
+  def _write_test_mapping_file(self, file_patterns=None):
     test_mapping_contents = {
         'test-mapping-group': [
             {
@@ -103,6 +114,10 @@ class GeneralTestsOptimizerTest(fake_filesystem_unittest.TestCase):
             },
         ],
     }
+    if file_patterns is not None:
+      test_mapping_contents['test-mapping-group'][0][
+          'file_patterns'
+      ] = file_patterns
 
     with open('/project/path/file/path/TEST_MAPPING', 'w') as f:
       json.dump(test_mapping_contents, f)
@@ -119,6 +134,29 @@ class GeneralTestsOptimizerTest(fake_filesystem_unittest.TestCase):
 
     self.assertSetEqual(build_targets, expected_build_targets)
 
+  def test_file_patterns_match_changed_files(self):
+    self._write_test_mapping_file(file_patterns=['(?i).*/FILE_NAME$', 'other/.*'])
+    optimizer = self._create_general_tests_optimizer()
+
+    build_targets = optimizer.get_build_targets()
+
+    expected_build_targets = set(
+        optimized_targets.GeneralTestsOptimizer._REQUIRED_MODULES
+    )
+    expected_build_targets.add('test_mapping_module')
+    self.assertSetEqual(build_targets, expected_build_targets)
+
+  def test_file_patterns_no_match_module_not_built(self):
+    self._write_test_mapping_file(file_patterns=['.*\\.java$', 'other/.*'])
+    optimizer = self._create_general_tests_optimizer()
+
+    build_targets = optimizer.get_build_targets()
+
+    expected_build_targets = set(
+        optimized_targets.GeneralTestsOptimizer._REQUIRED_MODULES
+    )
+    self.assertSetEqual(build_targets, expected_build_targets)
+
   def test_no_change_info_no_optimization(self):
     del os.environ['CHANGE_INFO']
 
@@ -194,6 +232,88 @@ class GeneralTestsOptimizerTest(fake_filesystem_unittest.TestCase):
 
     self._verify_soong_zip_commands(package_commands, ['test_mapping_module'])
 
+  @mock.patch('subprocess.run')
+  def test_soong_vars_dumped_once(self, subprocess_run):
+    subprocess_run.return_value = self._get_soong_vars_output()
+    optimizer = self._create_general_tests_optimizer()
+    self._set_up_build_outputs(['test_mapping_module'])
+    optimizer.get_build_targets()
+
+    optimizer.get_package_outputs_commands()
+    optimizer.get_package_outputs_commands()
+
+    subprocess_run.assert_called_once()
+
+  @mock.patch('subprocess.run')
+  def test_soong_vars_dumped_again_on_product_config_change(
+      self, subprocess_run
+  ):
+    subprocess_run.return_value = self._get_soong_vars_output()
+    optimizer = self._create_general_tests_optimizer()
+    self._set_up_build_outputs(['test_mapping_module'])
+    optimizer.get_build_targets()
+    optimizer.get_package_outputs_commands()
+
+    soong_variables = pathlib.Path('/tmp/top/out/soong/soong.variables')
+    soong_variables.parent.mkdir(parents=True)
+    soong_variables.write_text('{}')
+    optimizer.get_package_outputs_commands()
+
+    self.assertEqual(subprocess_run.call_count, 2)
+
+  @mock.patch('subprocess.run')
+  def test_requested_soong_vars_dumped_together(self, subprocess_run):
+    subprocess_run.return_value = self._get_soong_vars_output()
+    optimizer = self._create_general_tests_optimizer()
+    self._set_up_build_outputs(['test_mapping_module'])
+    optimizer.get_build_targets()
+
+    optimized_targets.request_soong_vars({'OTHER_VAR'})
+    optimizer.get_package_outputs_commands()
+
+    subprocess_run.assert_called_once()
+    self.assertIn('OTHER_VAR', subprocess_run.call_args.kwargs['args'][2])
+
+  @mock.patch('subprocess.run')
+  def test_packaging_reuses_config_index(self, subprocess_run):
+    subprocess_run.return_value = self._get_soong_vars_output()
+    optimizer = self._create_general_tests_optimizer()
+    self._set_up_build_outputs(['test_mapping_module'])
+    optimizer.get_build_targets()
+    optimizer.get_package_outputs_commands()
+
+    with mock.patch('os.walk') as walk:
+      optimizer.get_package_outputs_commands()
+
+    walk.assert_not_called()
+    self.assertIn(
+        f'{self._host_out_testcases}/test_mapping_module/'
+        'test_mapping_module.config',
+        (self._host_out / 'host_general-tests_list').read_text(),
+    )
+
+  @mock.patch('subprocess.run')
+  def test_config_index_updated_on_change(self, subprocess_run):
+    subprocess_run.return_value = self._get_soong_vars_output()
+    optimizer = self._create_general_tests_optimizer()
+    self._set_up_build_outputs(['test_mapping_module'])
+    optimizer.get_build_targets()
+    optimizer.get_package_outputs_commands()
+
+    module_dir = self._host_out_testcases / 'test_mapping_module'
+    new_config_dir = module_dir / 'arm64'
+    new_config_dir.mkdir()
+    (new_config_dir / 'new_test.config').touch()
+    # The fake filesystem doesn't update the mtimes of parent directories.
+    mtime_ns = os.stat(module_dir).st_mtime_ns + 1
+    os.utime(module_dir, ns=(mtime_ns, mtime_ns))
+    optimizer.get_package_outputs_commands()
+
+    self.assertIn(
+        f'{new_config_dir}/new_test.config',
+        (self._host_out / 'host_general-tests_list').read_text(),
+    )
+
   @mock.patch('subprocess.run')
   def test_get_soong_dumpvars_fails_raises(self, subprocess_run):
     subprocess_run.return_value = self._get_soong_vars_output(return_code=-1)
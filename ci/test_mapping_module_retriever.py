@@ -20,6 +20,7 @@ TODO(lucafarsi): Deduplicate from artifact_helper.py
 # TODO(lucafarsi): Share this logic with the original logic in
 # test_mapping_test_retriever.py
 
+import functools
 import json
 import os
 import re
@@ -54,6 +55,35 @@ def FilterComments(test_mapping_file: str) -> str:
   """
   return re.sub(_COMMENTS_RE, r'\1', test_mapping_file)
 
+# Parsed TEST_MAPPING files, indexed by their path, along with the mtime and
+# size of the file when it was parsed.
+_test_mapping_cache: dict[str, tuple[tuple[int, int], dict[str, Any]]] = {}
+
+
+def LoadTestMapping(test_mapping_file: str) -> dict[str, Any]:
+  """Loads a TEST_MAPPING file, reusing the parsed content if it's unchanged.
+
+  Args:
+    test_mapping_file: Path to a TEST_MAPPING file.
+
+  Returns:
+    The parsed content of the TEST_MAPPING file, which must not be modified.
+
+  Raises:
+    FileNotFoundError, NotADirectoryError: If the file doesn't exist.
+  """
+  st = os.stat(test_mapping_file)
+  file_state = (st.st_mtime_ns, st.st_size)
+  cached = _test_mapping_cache.get(test_mapping_file)
+  if cached and cached[0] == file_state:
+    return cached[1]
+
+  with open(test_mapping_file, 'r') as f:
+    test_mapping = json.loads(FilterComments(f.read()))
+  _test_mapping_cache[test_mapping_file] = (file_state, test_mapping)
+  return test_mapping
+
+
 def GetTestMappings(paths: set[str],
                     checked_paths: set[str]) -> dict[str, dict[str, Any]]:
   """Get the affected TEST_MAPPING files.
@@ -103,8 +133,7 @@ def GetTestMappings(paths: set[str],
     try:
       test_mapping_file = os.path.join(os.path.join(os.getcwd(), path), 'TEST_MAPPING')
       # Read content of TEST_MAPPING file.
-      content = FilterComments(open(test_mapping_file, "r").read())
-      test_mapping = json.loads(content)
+      test_mapping = LoadTestMapping(test_mapping_file)
       test_mappings[path] = test_mapping
 
       import_paths = set()
@@ -153,6 +182,8 @@ def FindAffectedModules(
   """
 
   modules = set()
+  # The changed files are matched against the patterns all at once.
+  changed_files_string = '|'.join(changed_files)
 
   for test_mapping in test_mappings.values():
     for group_name, group in test_mapping.items():
@@ -172,11 +203,58 @@ def FindAffectedModules(
           modules.add(module_name)
           continue
 
-        if matches_file_patterns(file_patterns, changed_files):
+        if CompileFilePatterns(tuple(file_patterns)).search(
+            changed_files_string
+        ):
           modules.add(module_name)
 
   return modules
 
+
+class _PatternList:
+  """File patterns that are searched one by one, like a single regex."""
+
+  def __init__(self, patterns: tuple[str, ...]):
+    self._patterns = patterns
+
+  def search(self, string: str) -> bool:
+    return any(re.search(pattern, string) for pattern in self._patterns)
+
+
+# A reference to a numbered group, which would refer to a group of another
+# pattern once the patterns are combined.
+_NUMBERED_GROUP_REFERENCE = re.compile(r'\\[1-9]|\(\?\(\d')
+
+
+@functools.lru_cache(maxsize=None)
+def CompileFilePatterns(
+    file_patterns: tuple[str, ...],
+) -> re.Pattern | _PatternList:
+  """Compiles the file patterns of an entry into a single regex.
+
+  The regex matches wherever any of the patterns matches. The result is cached,
+  so each distinct list of patterns is only compiled once.
+
+  Args:
+    file_patterns: A tuple of file patterns.
+
+  Returns:
+    The compiled regex, or a _PatternList with the same search() method if the
+    patterns can't be combined.
+  """
+  # Some patterns can't be combined, e.g. ones with global flags or with
+  # references to numbered groups. They are matched one by one instead.
+  if any(
+      _NUMBERED_GROUP_REFERENCE.search(pattern.replace('\\\\', ''))
+      for pattern in file_patterns
+  ):
+    return _PatternList(file_patterns)
+  try:
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in file_patterns))
+  except re.error:
+    return _PatternList(file_patterns)
+
+
 def MatchesFilePatterns(
     file_patterns: list[set], changed_files: set[str]
 ) -> bool:
@@ -189,4 +267,6 @@ def MatchesFilePatterns(
   Returns:
     True if any of the changed files match any of the file patterns.
   """
-  return any(re.search(pattern, "|".join(changed_files)) for pattern in file_patterns)
+  return bool(
+      CompileFilePatterns(tuple(file_patterns)).search('|'.join(changed_files))
+  )
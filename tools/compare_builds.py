@@ -64,6 +64,16 @@ specific target, to reduce the scope of the checks performed.
 The --touch flag lets you specify a list of source files to touch between
 the builds, to examine the consequences of editing a particular file.
 
+In incremental mode, a snapshot of the out files (path, inode, size, mtime and,
+with --snapshot-hashes, a content hash) is written to out_incremental/ after
+each build, and the two snapshots are diffed to find the touched, added and
+removed files. With --no-build, the snapshots written by a previous run are
+reused; a missing second snapshot is taken from the current out directory.
+
+The --jobs flag sets the number of files that are compared in parallel. Each
+tree is scanned once, and the file metadata gathered by the scan (mode, size,
+symlink target, timestamp) is compared before any file contents are read.
+
 
 EXAMPLE COMMANDLINES
 
@@ -118,6 +128,9 @@ of the commandline flags. Here are a sampling of useful combinations.
 """
 
 import argparse
+import collections
+import concurrent.futures
+import hashlib
 import itertools
 import os
 import shutil
@@ -203,6 +216,11 @@ def main():
       help="Make target to run. The default is droid")
   argparser.add_argument("--touch", nargs="+", default=[],
       help="Files to touch between builds. Must pair with --incremental.")
+  argparser.add_argument("--jobs", type=int, default=os.cpu_count(),
+      help="Number of files to compare in parallel. The default is the number of CPUs.")
+  argparser.add_argument("--snapshot-hashes", action="store_true",
+      help="Include content hashes in the incremental mode snapshots, to also report"
+           + " which touched files have changed contents.")
   args = argparser.parse_args(sys.argv[1:])
 
   if args.detect_embedded_paths and args.incremental:
@@ -251,6 +269,25 @@ def main():
   timestamp_start = dir_prefix + "/timestamp_start"
   timestamp_between = dir_prefix + "/timestamp_between"
   timestamp_end = dir_prefix + "/timestamp_end"
+  snapshot_first = dir_prefix + "/snapshot_first"
+  snapshot_second = dir_prefix + "/snapshot_second"
+
+  def GetFiles(out_dir):
+    """Returns the iterator of the files to scan in out_dir."""
+    if args.subdirs is not None:
+      if args.subdirs:
+        subdirs = args.subdirs
+      else:
+        subdirs = DEFAULT_DIRS
+      return ProductFiles(RequireBuildVar(out_dir, "PRODUCT_OUT"), subdirs)
+    else:
+      return OutFiles(out_dir)
+
+  def SaveSnapshot(filename, out_dir):
+    files = GetFiles(out_dir)
+    print("Writing the snapshot of " + files.base_dir + " to " + filename)
+    WriteSnapshot(filename, files.base_dir,
+                  TakeSnapshot(files, args.snapshot_hashes, args.jobs))
 
   if args.run_build:
     # Initial clean, if necessary
@@ -261,38 +298,42 @@ def main():
     CreateEmptyFile(timestamp_start)
     print("Running the first build in " + first_work_dir)
     RunBuild(first_work_dir, first_out_dir, args.target, args.hide_build_output)
+    if args.incremental:
+      SaveSnapshot(snapshot_first, first_out_dir)
     for f in args.touch:
       print("Touching " + f)
       TouchFile(f)
     CreateEmptyFile(timestamp_between)
     print("Running the second build in " + second_work_dir)
     RunBuild(second_work_dir, second_out_dir, args.target, args.hide_build_output)
+    if args.incremental:
+      SaveSnapshot(snapshot_second, second_out_dir)
     CreateEmptyFile(timestamp_end)
     print("Done building")
     print()
 
-  # Which out directories to scan
-  if args.subdirs is not None:
-    if args.subdirs:
-      subdirs = args.subdirs
-    else:
-      subdirs = DEFAULT_DIRS
-    first_files = ProductFiles(RequireBuildVar(first_out_dir, "PRODUCT_OUT"), subdirs)
-    second_files = ProductFiles(RequireBuildVar(second_out_dir, "PRODUCT_OUT"), subdirs)
-  else:
-    first_files = OutFiles(first_out_dir)
-    second_files = OutFiles(second_out_dir)
-
   printer = Printer()
 
   if args.incremental:
     # Find files that were rebuilt unnecessarily
-    touched_incrementally = FindOutFilesTouchedAfter(first_files,
-                                                     GetFileTimestamp(timestamp_between))
-    printer.PrintList("Touched in incremental build", touched_incrementally)
+    if os.path.exists(snapshot_first):
+      if not os.path.exists(snapshot_second):
+        SaveSnapshot(snapshot_second, second_out_dir)
+      touched, removed, changed = DiffSnapshots(ReadSnapshot(snapshot_first),
+                                                ReadSnapshot(snapshot_second))
+      printer.PrintList("Touched in incremental build", touched)
+      printer.PrintList("Removed in incremental build", removed)
+      printer.PrintList("Changed contents in incremental build", changed)
+    else:
+      # No snapshot from the first build, e.g. with --no-build after a build by an older
+      # version of this tool.
+      touched_incrementally = FindOutFilesTouchedAfter(GetFiles(first_out_dir),
+                                                       GetFileTimestamp(timestamp_between))
+      printer.PrintList("Touched in incremental build", touched_incrementally)
   else:
     # Compare the two out dirs
-    added, removed, changed = DiffFileList(first_files, second_files)
+    added, removed, changed = DiffFileList(GetFiles(first_out_dir),
+                                           GetFiles(second_out_dir), args.jobs)
     printer.PrintList("Added", added)
     printer.PrintList("Removed", removed)
     printer.PrintList("Changed", changed, "%s %s")
@@ -376,6 +417,8 @@ def RunBuild(work_dir, out_dir, target, hide_build_output):
                     hide_build_output)
   if work_dir != out_dir:
     os.replace(work_dir, out_dir)
+  # The build changed the files.
+  STAT_CACHE.Clear()
   if returncode != 0:
     if hide_build_output:
       # The build output was hidden, so print it now for debugging
@@ -384,55 +427,62 @@ def RunBuild(work_dir, out_dir, target, hide_build_output):
     sys.exit(1)
 
 
-def DiffFileList(first_files, second_files):
+def DiffFileList(first_files, second_files, jobs=None):
   """Examines the files.
 
+  The two trees are scanned concurrently, and the files present in both are
+  compared on a pool of jobs threads.
+
   Returns:
     Filenames of files in first_filelist but not second_filelist (added files)
     Filenames of files in second_filelist but not first_filelist (removed files)
     2-Tuple of filenames for the files that are in both but are different (changed files)
   """
-  # List of files, relative to their respective PRODUCT_OUT directories
-  first_filelist = sorted([x for x in first_files], key=lambda x: x[1])
-  second_filelist = sorted([x for x in second_files], key=lambda x: x[1])
-
-  added = []
-  removed = []
-  changed = []
-
-  first_index = 0
-  second_index = 0
-
-  while first_index < len(first_filelist) and second_index < len(second_filelist):
-    # Path relative to source root and path relative to PRODUCT_OUT
-    first_full_filename, first_relative_filename = first_filelist[first_index]
-    second_full_filename, second_relative_filename = second_filelist[second_index]
-
-    if first_relative_filename < second_relative_filename:
-      # Removed
+  with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+    # List of files, relative to their respective PRODUCT_OUT directories
+    first_future = executor.submit(lambda: sorted(first_files, key=lambda x: x[1]))
+    second_future = executor.submit(lambda: sorted(second_files, key=lambda x: x[1]))
+    first_filelist = first_future.result()
+    second_filelist = second_future.result()
+
+    added = []
+    removed = []
+    both = []
+
+    first_index = 0
+    second_index = 0
+
+    while first_index < len(first_filelist) and second_index < len(second_filelist):
+      # Path relative to source root and path relative to PRODUCT_OUT
+      first_full_filename, first_relative_filename = first_filelist[first_index]
+      second_full_filename, second_relative_filename = second_filelist[second_index]
+
+      if first_relative_filename < second_relative_filename:
+        # Removed
+        removed.append(first_full_filename)
+        first_index += 1
+      elif first_relative_filename > second_relative_filename:
+        # Added
+        added.append(second_full_filename)
+        second_index += 1
+      else:
+        # Both present
+        both.append((first_full_filename, second_full_filename))
+        first_index += 1
+        second_index += 1
+
+    while first_index < len(first_filelist):
+      first_full_filename, first_relative_filename = first_filelist[first_index]
       removed.append(first_full_filename)
       first_index += 1
-    elif first_relative_filename > second_relative_filename:
-      # Added
+
+    while second_index < len(second_filelist):
+      second_full_filename, second_relative_filename = second_filelist[second_index]
       added.append(second_full_filename)
       second_index += 1
-    else:
-      # Both present
-      diff_type = DiffFiles(first_full_filename, second_full_filename)
-      if diff_type != DIFF_NONE:
-        changed.append((first_full_filename, second_full_filename))
-      first_index += 1
-      second_index += 1
 
-  while first_index < len(first_filelist):
-    first_full_filename, first_relative_filename = first_filelist[first_index]
-    removed.append(first_full_filename)
-    first_index += 1
-
-  while second_index < len(second_filelist):
-    second_full_filename, second_relative_filename = second_filelist[second_index]
-    added.append(second_full_filename)
-    second_index += 1
+    diff_types = executor.map(lambda pair: DiffFiles(*pair), both)
+    changed = [pair for pair, diff_type in zip(both, diff_types) if diff_type != DIFF_NONE]
 
   return (SortByTimestamp(added),
           SortByTimestamp(removed),
@@ -451,8 +501,7 @@ def FindOutFilesTouchedAfter(files, timestamp):
 
 def GetFileTimestamp(filename):
   """Get timestamp for a file (just wraps stat)."""
-  st = os.stat(filename, follow_symlinks=False)
-  return st.st_mtime
+  return STAT_CACHE.Stat(filename).st_mtime
 
 
 def SortByTimestamp(items, key=lambda item: item):
@@ -469,14 +518,11 @@ def FindSourceFilesTouchedAfter(timestamp):
   """Find files in the source tree that have changed after timestamp. Ignores
   the out directory."""
   result = []
-  for root, dirs, files in os.walk(".", followlinks=False):
-    if root == ".":
-      RemoveItemsFromList(dirs, (".repo", "out", "out_full", "out_incremental"))
-    for f in files:
-      full = os.path.sep.join((root, f))[2:]
-      ts = GetFileTimestamp(full)
-      if ts > timestamp:
-        result.append(TouchedFile(full, ts))
+  for root, files in ScanTree(".", (".repo", "out", "out_full", "out_incremental")):
+    for f, st in files:
+      if st.st_mtime > timestamp:
+        full = os.path.sep.join((root, f))[2:]
+        result.append(TouchedFile(full, st.st_mtime))
   return [f.filename for f in sorted(result, key=lambda f: f.timestamp)]
 
 
@@ -505,8 +551,12 @@ def TouchFile(filename):
 
 def DiffFiles(first_filename, second_filename):
   def AreFileContentsSame(remaining, first_filename, second_filename):
-    """Compare the file contents. They must be known to be the same size."""
-    CHUNK_SIZE = 32*1024
+    """Compare the file contents. They must be known to be the same size.
+
+    The files are read in large chunks, which releases the GIL while reading, and
+    the comparison stops at the first chunk that differs.
+    """
+    CHUNK_SIZE = 1024*1024
     with open(first_filename, "rb") as first_file:
       with open(second_filename, "rb") as second_file:
         while remaining > 0:
@@ -516,8 +566,10 @@ def DiffFiles(first_filename, second_filename):
           remaining -= size
         return True
 
-  first_stat = os.stat(first_filename, follow_symlinks=False)
-  second_stat = os.stat(first_filename, follow_symlinks=False)
+  # The stats were cached by the scan, so the metadata is compared without any
+  # further system calls.
+  first_stat = STAT_CACHE.Stat(first_filename)
+  second_stat = STAT_CACHE.Stat(second_filename)
 
   # Mode bits
   if first_stat.st_mode != second_stat.st_mode:
@@ -527,6 +579,10 @@ def DiffFiles(first_filename, second_filename):
   if first_stat.st_size != second_stat.st_size:
     return DIFF_SIZE
 
+  # The same file, e.g. hard links
+  if (first_stat.st_dev, first_stat.st_ino) == (second_stat.st_dev, second_stat.st_ino):
+    return DIFF_NONE
+
   # Contents
   if stat.S_ISLNK(first_stat.st_mode):
     if os.readlink(first_filename) != os.readlink(second_filename):
@@ -538,6 +594,125 @@ def DiffFiles(first_filename, second_filename):
   return DIFF_NONE
 
 
+# The state of a file in a snapshot. path is relative to the snapshot base
+# directory, and hash is None unless the snapshot was taken with hashes.
+SnapshotEntry = collections.namedtuple("SnapshotEntry",
+                                       ("path", "inode", "size", "mtime_ns", "hash"))
+
+SNAPSHOT_HEADER = "compare_builds snapshot 1"
+
+
+def HashFile(filename):
+  """Returns the SHA-256 of the contents of a regular file, or of a symlink target."""
+  st = STAT_CACHE.Stat(filename)
+  if stat.S_ISLNK(st.st_mode):
+    return hashlib.sha256(os.readlink(filename).encode()).hexdigest()
+  h = hashlib.sha256()
+  with open(filename, "rb") as f:
+    for chunk in iter(lambda: f.read(1024*1024), b""):
+      h.update(chunk)
+  return h.hexdigest()
+
+
+def TakeSnapshot(files, with_hashes=False, jobs=None):
+  """Returns the snapshot of the files, as a list of SnapshotEntry sorted by path.
+
+  Args:
+    files - a FileIterator
+    with_hashes - whether to hash the contents of the files, on jobs threads
+  """
+  items = sorted(files, key=lambda x: x[1])
+  hashes = itertools.repeat(None)
+  if with_hashes:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+      hashes = list(executor.map(HashFile, [full for full, _ in items]))
+  result = []
+  for (full, relative), content_hash in zip(items, hashes):
+    st = STAT_CACHE.Stat(full)
+    result.append(SnapshotEntry(relative, st.st_ino, st.st_size, st.st_mtime_ns,
+                                content_hash))
+  return result
+
+
+def WriteSnapshot(filename, base_dir, entries):
+  """Writes the snapshot of the files under base_dir, one tab separated line per file."""
+  os.makedirs(os.path.dirname(filename), exist_ok=True)
+  with open(filename + ".tmp", "w") as f:
+    f.write("%s\t%s\n" % (SNAPSHOT_HEADER, base_dir))
+    for entry in entries:
+      f.write("%s\t%d\t%d\t%d\t%s\n" % (entry.path, entry.inode, entry.size,
+                                         entry.mtime_ns, entry.hash or "-"))
+  # Only complete snapshots are ever read.
+  os.replace(filename + ".tmp", filename)
+
+
+def ReadSnapshot(filename):
+  """Reads a snapshot written by WriteSnapshot().
+
+  Returns:
+    The base directory of the snapshot, and an iterator of its SnapshotEntry, in the
+    order they were written (i.e. sorted by path).
+  """
+  f = open(filename)
+  header, base_dir = f.readline().rstrip("\n").split("\t")
+  if header != SNAPSHOT_HEADER:
+    f.close()
+    sys.stderr.write("error: %s is not a snapshot.\n" % filename)
+    sys.exit(1)
+
+  def Entries():
+    with f:
+      for line in f:
+        path, inode, size, mtime_ns, content_hash = line.rstrip("\n").split("\t")
+        yield SnapshotEntry(path, int(inode), int(size), int(mtime_ns),
+                            None if content_hash == "-" else content_hash)
+
+  return base_dir, Entries()
+
+
+def DiffSnapshots(first, second):
+  """Diffs two snapshots returned by ReadSnapshot(), in a single pass over both.
+
+  A file is touched if it was added, or if its inode, size or mtime changed.
+
+  Returns:
+    Filenames of the touched files, sorted by timestamp
+    Filenames of the removed files
+    Filenames of the touched files whose contents changed, if both snapshots have hashes
+  """
+  first_base_dir, first_entries = first
+  second_base_dir, second_entries = second
+  touched = []
+  removed = []
+  changed = []
+  missing = SnapshotEntry(None, None, None, None, None)
+
+  first_entry = next(first_entries, missing)
+  second_entry = next(second_entries, missing)
+  while first_entry.path is not None or second_entry.path is not None:
+    if second_entry.path is None or (first_entry.path is not None
+                                     and first_entry.path < second_entry.path):
+      removed.append(os.path.sep.join((first_base_dir, first_entry.path)))
+      first_entry = next(first_entries, missing)
+      continue
+
+    filename = os.path.sep.join((second_base_dir, second_entry.path))
+    if first_entry.path == second_entry.path:
+      if first_entry[1:4] != second_entry[1:4]:
+        touched.append(TouchedFile(filename, second_entry.mtime_ns))
+        if (first_entry.hash and second_entry.hash
+            and first_entry.hash != second_entry.hash):
+          changed.append(filename)
+      first_entry = next(first_entries, missing)
+    else:
+      # Added
+      touched.append(TouchedFile(filename, second_entry.mtime_ns))
+    second_entry = next(second_entries, missing)
+
+  return ([f.filename for f in sorted(touched, key=lambda f: f.timestamp)],
+          removed, changed)
+
+
 class FileIterator(object):
   """Object that produces an iterator containing all files in a given directory.
 
@@ -551,39 +726,21 @@ class FileIterator(object):
   def __init__(self, base_dir):
     self._base_dir = base_dir
 
+  @property
+  def base_dir(self):
+    return self._base_dir
+
   def __iter__(self):
-    return self._Iterator(self, self._base_dir)
+    for root, files in ScanTree(self._base_dir):
+      for f, _ in files:
+        full = os.path.sep.join((root, f))
+        relative = full[len(self._base_dir)+1:]
+        if self.ShouldIncludeFile(root, relative):
+          yield full, relative
 
   def ShouldIncludeFile(self, root, path):
     return False
 
-  class _Iterator(object):
-    def __init__(self, parent, base_dir):
-      self._parent = parent
-      self._base_dir = base_dir
-      self._walker = os.walk(base_dir, followlinks=False)
-      self._current_index = 0
-      self._current_dir = []
-
-    def __iter__(self):
-      return self
-
-    def __next__(self):
-      # os.walk's iterator will eventually terminate by raising StopIteration
-      while True:
-        if self._current_index >= len(self._current_dir):
-          root, dirs, files = self._walker.__next__()
-          full_paths = [os.path.sep.join((root, f)) for f in files]
-          pairs = [(f, f[len(self._base_dir)+1:]) for f in full_paths]
-          self._current_dir = [(full, relative) for full, relative in pairs
-                               if self._parent.ShouldIncludeFile(root, relative)]
-          self._current_index = 0
-          if not self._current_dir:
-            continue
-        index = self._current_index
-        self._current_index += 1
-        return self._current_dir[index]
-
 
 class OutFiles(FileIterator):
   """Object that produces an iterator containing all files in a given out directory,
@@ -622,6 +779,72 @@ class ProductFiles(FileIterator):
     return False
 
 
+class StatCache(object):
+  """The lstat() results of files, as gathered by ScanTree().
+
+  The files are not expected to change while they're being examined, so each
+  file is stat'ed at most once.
+  """
+
+  def __init__(self):
+    self._stats = {}
+
+  def Add(self, path, st):
+    self._stats[path] = st
+
+  def Clear(self):
+    self._stats.clear()
+
+  def Stat(self, path):
+    st = self._stats.get(path)
+    if st is None:
+      st = os.stat(path, follow_symlinks=False)
+      self._stats[path] = st
+    return st
+
+
+STAT_CACHE = StatCache()
+
+
+def ScanTree(top, skip_dirs=()):
+  """Walks the directory tree under top, without following symlinks.
+
+  Like os.walk, but with os.scandir, so that the files are stat'ed once, and the
+  results recorded in STAT_CACHE.
+
+  Args:
+    top - the directory to walk
+    skip_dirs - names of the directories directly under top to skip
+
+  Yields:
+    A tuple of the directory path, and a list of (name, lstat result) tuples for
+    the files (i.e. non-directories) in it.
+  """
+  pending = [top]
+  while pending:
+    root = pending.pop()
+    files = []
+    subdirs = []
+    try:
+      with os.scandir(root) as entries:
+        for entry in entries:
+          if entry.is_dir(follow_symlinks=False):
+            if root != top or entry.name not in skip_dirs:
+              subdirs.append(entry.path)
+          else:
+            try:
+              st = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+              continue
+            STAT_CACHE.Add(entry.path, st)
+            files.append((entry.name, st))
+    except OSError:
+      # Like os.walk, ignore the directories that can't be read.
+      continue
+    yield root, files
+    pending.extend(reversed(subdirs))
+
+
 class TouchedFile(object):
   """A file in the out directory with a timestamp."""
   def __init__(self, filename, timestamp):
@@ -629,14 +852,6 @@ class TouchedFile(object):
     self.timestamp = timestamp
 
 
-def RemoveItemsFromList(haystack, needles):
-  for needle in needles:
-    try:
-      haystack.remove(needle)
-    except ValueError:
-      pass
-
-
 class Printer(object):
   def __init__(self):
     self.printed_anything = False
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 
+import collections
 import getpass
 import logging
 import multiprocessing.connection
@@ -34,6 +35,8 @@ from watchdog.observers import Observer
 LOG_SOURCE = 2524
 DEFAULT_FLUSH_INTERVAL_SECONDS = 5
 DEFAULT_SINGLE_EVENTS_SIZE_THRESHOLD = 100
+# Max number of directories whose git project status is cached.
+GIT_PROJECT_CACHE_SIZE = 4096
 
 
 class ClearcutEventHandler(PatternMatchingEventHandler):
@@ -58,9 +61,28 @@ class ClearcutEventHandler(PatternMatchingEventHandler):
     self.host_name = platform.node()
     self.source_root = os.environ.get("ANDROID_BUILD_TOP", "")
 
+    # Single edit events are only kept up to single_events_size_threshold,
+    # after that only the number of events is counted.
     self.pending_events = []
+    self._num_pending_events = 0
+    self._first_pending_event_time = None
     self._scheduled_log_thread = None
     self._pending_events_lock = threading.Lock()
+    # LRU cache of directory (relative to the monitoring path) to whether it
+    # is under a git project.
+    self._git_project_cache = collections.OrderedDict()
+
+  def dispatch(self, event: FileSystemEvent):
+    # Directory events are ignored by the pattern matching, but creating or
+    # deleting a .git directory changes whether its parent is a git project.
+    if event.is_directory and event.event_type in ("created", "deleted", "moved"):
+      try:
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+          if path and os.path.basename(path) == ".git":
+            self._update_git_project_cache(pathlib.Path(path))
+      except Exception:
+        logging.exception("Failed to update git project cache.")
+    super().dispatch(event)
 
   def on_moved(self, event: FileSystemEvent):
     self._log_edit_event(event, edit_event_pb2.EditEvent.MOVE)
@@ -90,6 +112,11 @@ class ClearcutEventHandler(PatternMatchingEventHandler):
     try:
       event_time = time.time()
 
+      if edit_type != edit_event_pb2.EditEvent.MODIFY:
+        self._update_git_project_cache(pathlib.Path(event.src_path))
+        if getattr(event, "dest_path", ""):
+          self._update_git_project_cache(pathlib.Path(event.dest_path))
+
       if self._is_hidden_file(pathlib.Path(event.src_path)):
         logging.debug("ignore hidden file: %s.", event.src_path)
         return
@@ -103,18 +130,27 @@ class ClearcutEventHandler(PatternMatchingEventHandler):
 
       logging.info("%s: %s", event.event_type, event.src_path)
 
-      event_proto = edit_event_pb2.EditEvent(
-          user_name=self.user_name,
-          host_name=self.host_name,
-          source_root=self.source_root,
-      )
-      event_proto.single_edit_event.CopyFrom(
-          edit_event_pb2.EditEvent.SingleEditEvent(
-              file_path=event.src_path, edit_type=edit_type
-          )
-      )
       with self._pending_events_lock:
-        self.pending_events.append((event_proto, event_time))
+        if not self._num_pending_events:
+          self._first_pending_event_time = event_time
+        self._num_pending_events += 1
+        # Too many events to send them one by one, they will be sent as an
+        # aggregated event so only their number is kept.
+        if self._num_pending_events > self.single_events_size_threshold:
+          self.pending_events.clear()
+        else:
+          event_proto = edit_event_pb2.EditEvent(
+              user_name=self.user_name,
+              host_name=self.host_name,
+              source_root=self.source_root,
+          )
+          event_proto.single_edit_event.CopyFrom(
+              edit_event_pb2.EditEvent.SingleEditEvent(
+                  file_path=event.src_path, edit_type=edit_type
+              )
+          )
+          self.pending_events.append((event_proto, event_time))
+
         if not self._scheduled_log_thread:
           logging.debug(
               "Scheduling thread to run in %d seconds", self.flush_interval_sec
@@ -135,25 +171,72 @@ class ClearcutEventHandler(PatternMatchingEventHandler):
 
   def _is_under_git_project(self, file_path: pathlib.Path) -> bool:
     root_path = pathlib.Path(self.root_monitoring_path).resolve()
-    return any(
-        root_path.joinpath(dir).joinpath('.git').exists()
-        for dir in file_path.relative_to(root_path).parents
+    return self._is_dir_under_git_project(
+        file_path.relative_to(root_path).parent
     )
 
+  def _is_dir_under_git_project(self, rel_dir: pathlib.Path) -> bool:
+    """Checks if a directory relative to the monitoring path or any of its
+    parents has a .git, using and filling the git project cache."""
+    root_path = pathlib.Path(self.root_monitoring_path).resolve()
+    uncached_dirs = []
+    is_under_git_project = False
+    for dir in [rel_dir, *rel_dir.parents]:
+      cached = self._git_project_cache.get(dir)
+      if cached is not None:
+        self._git_project_cache.move_to_end(dir)
+        is_under_git_project = cached
+        break
+      uncached_dirs.append(dir)
+      if root_path.joinpath(dir).joinpath('.git').exists():
+        is_under_git_project = True
+        break
+
+    for dir in uncached_dirs:
+      self._git_project_cache[dir] = is_under_git_project
+    while len(self._git_project_cache) > GIT_PROJECT_CACHE_SIZE:
+      self._git_project_cache.popitem(last=False)
+    return is_under_git_project
+
+  def _update_git_project_cache(self, file_path: pathlib.Path):
+    """Invalidates the cached status of the directory that has a .git in
+    file_path and its sub directories, if the .git was created or deleted."""
+    root_path = pathlib.Path(self.root_monitoring_path).resolve()
+    parts = file_path.relative_to(root_path).parts
+    if '.git' not in parts:
+      return
+    git_project_dir = pathlib.Path(*parts[:parts.index('.git')])
+    is_under_git_project = root_path.joinpath(git_project_dir).joinpath(
+        '.git'
+    ).exists() or (
+        git_project_dir != git_project_dir.parent
+        and self._is_dir_under_git_project(git_project_dir.parent)
+    )
+    if self._git_project_cache.get(git_project_dir) == is_under_git_project:
+      return
+
+    logging.debug("git project changed in %s", git_project_dir)
+    for dir in list(self._git_project_cache):
+      if dir == git_project_dir or git_project_dir in dir.parents:
+        del self._git_project_cache[dir]
+    self._git_project_cache[git_project_dir] = is_under_git_project
+
   def _log_clearcut_events(self):
     with self._pending_events_lock:
       self._scheduled_log_thread = None
       edit_events = self.pending_events
+      pending_events_size = self._num_pending_events
+      first_event_time = self._first_pending_event_time
       self.pending_events = []
+      self._num_pending_events = 0
 
-    pending_events_size = len(edit_events)
     if pending_events_size > self.single_events_size_threshold:
       logging.info(
           "got %d events in %d seconds, sending aggregated events instead",
           pending_events_size,
           self.flush_interval_sec,
       )
-      aggregated_event_time = edit_events[0][1]
+      aggregated_event_time = first_event_time
       aggregated_event_proto = edit_event_pb2.EditEvent(
           user_name=self.user_name,
           host_name=self.host_name,
@@ -27,6 +27,11 @@ import unittest
 from atest.proto import clientanalytics_pb2
 from edit_monitor import edit_monitor
 from proto import edit_event_pb2
+from watchdog.events import DirCreatedEvent
+from watchdog.events import DirDeletedEvent
+from watchdog.events import FileCreatedEvent
+from watchdog.events import FileDeletedEvent
+from watchdog.events import FileModifiedEvent
 
 
 class EditMonitorTest(unittest.TestCase):
@@ -246,6 +251,103 @@ class EditMonitorTest(unittest.TestCase):
     logged_events = self._get_logged_events()
     self.assertEqual(len(logged_events), 0)
 
+  def test_git_project_cache_updated_on_git_change(self):
+    fake_cclient = FakeClearcutClient(
+        log_output_file=self.log_event_dir.joinpath('logs.output')
+    )
+    event_handler = edit_monitor.ClearcutEventHandler(
+        str(self.root_monitoring_path.resolve()), 100, 5, cclient=fake_cclient
+    )
+    project_dir = self.root_monitoring_path.resolve().joinpath('project')
+    project_dir.mkdir()
+    test_file = project_dir.joinpath('test.txt')
+    test_file.touch()
+    git_file = project_dir.joinpath('.git')
+
+    # Not a git project yet.
+    event_handler.on_modified(FileModifiedEvent(str(test_file)))
+    # Becomes a git project.
+    git_file.touch()
+    event_handler.on_created(FileCreatedEvent(str(git_file)))
+    event_handler.on_modified(FileModifiedEvent(str(test_file)))
+    # No longer a git project.
+    git_file.unlink()
+    event_handler.on_deleted(FileDeletedEvent(str(git_file)))
+    event_handler.on_modified(FileModifiedEvent(str(test_file)))
+    event_handler.flushall()
+
+    logged_events = self._get_logged_events()
+    self.assertEqual(len(logged_events), 1)
+    self.assertEqual(
+        str(test_file),
+        edit_event_pb2.EditEvent.FromString(
+            logged_events[0].source_extension
+        ).single_edit_event.file_path,
+    )
+
+  def test_git_project_cache_updated_on_git_dir_change(self):
+    fake_cclient = FakeClearcutClient(
+        log_output_file=self.log_event_dir.joinpath('logs.output')
+    )
+    event_handler = edit_monitor.ClearcutEventHandler(
+        str(self.root_monitoring_path.resolve()), 100, 5, cclient=fake_cclient
+    )
+    project_dir = self.root_monitoring_path.resolve().joinpath('project')
+    project_dir.mkdir()
+    test_file = project_dir.joinpath('test.txt')
+    test_file.touch()
+    git_dir = project_dir.joinpath('.git')
+
+    # Not a git project yet.
+    event_handler.dispatch(FileModifiedEvent(str(test_file)))
+    # Becomes a git project.
+    git_dir.mkdir()
+    event_handler.dispatch(DirCreatedEvent(str(git_dir)))
+    git_dir.joinpath('HEAD').touch()
+    event_handler.dispatch(FileCreatedEvent(str(git_dir.joinpath('HEAD'))))
+    event_handler.dispatch(FileModifiedEvent(str(test_file)))
+    # No longer a git project. The deletion of the file in .git is seen while
+    # the .git directory still exists.
+    git_dir.joinpath('HEAD').unlink()
+    event_handler.dispatch(FileDeletedEvent(str(git_dir.joinpath('HEAD'))))
+    git_dir.rmdir()
+    event_handler.dispatch(DirDeletedEvent(str(git_dir)))
+    event_handler.dispatch(FileModifiedEvent(str(test_file)))
+    event_handler.flushall()
+
+    logged_events = self._get_logged_events()
+    self.assertEqual(len(logged_events), 1)
+    self.assertEqual(
+        str(test_file),
+        edit_event_pb2.EditEvent.FromString(
+            logged_events[0].source_extension
+        ).single_edit_event.file_path,
+    )
+
+  def test_pending_events_bounded_during_event_flood(self):
+    self.root_monitoring_path.joinpath('.git').touch()
+    fake_cclient = FakeClearcutClient(
+        log_output_file=self.log_event_dir.joinpath('logs.output')
+    )
+    event_handler = edit_monitor.ClearcutEventHandler(
+        str(self.root_monitoring_path.resolve()), 100, 5, cclient=fake_cclient
+    )
+    test_file = self.root_monitoring_path.resolve().joinpath('test.txt')
+
+    for _ in range(1000):
+      event_handler.on_modified(FileModifiedEvent(str(test_file)))
+      self.assertLessEqual(len(event_handler.pending_events), 5)
+    event_handler.flushall()
+
+    logged_events = self._get_logged_events()
+    self.assertEqual(len(logged_events), 1)
+    self.assertEqual(
+        edit_event_pb2.EditEvent.AggregatedEditEvent(num_edits=1000),
+        edit_event_pb2.EditEvent.FromString(
+            logged_events[0].source_extension
+        ).aggregated_edit_event,
+    )
+
   def _start_test_edit_monitor_process(
       self, cclient
   ) -> multiprocessing.Process:
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compute checksums of files in parallel, with an optional cache that is kept across runs.
+
+Files are read in chunks by a pool of threads. The cache is a JSON file that stores the inode, size, mtime
+and checksum of each file, so a file is only read again if one of them changed. It only keeps the files that
+were looked up by the last run.
+"""
+
+import concurrent.futures
+import hashlib
+import json
+import os
+import time
+
+CHUNK_SIZE = 1024 * 1024
+# hashlib releases the GIL while hashing large chunks, so threads hash files in parallel.
+MAX_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+# Files modified this recently before they are hashed are not cached, because a later change to them could
+# keep the same mtime on file systems with coarse timestamps.
+RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+
+def hash_file(file_path, algorithm='sha1', follow_symlinks=True):
+  """Return the hex digest of a file. A symlink is hashed by its target path if follow_symlinks is False."""
+  h = hashlib.new(algorithm)
+  if not follow_symlinks and os.path.islink(file_path):
+    h.update(os.readlink(file_path).encode('utf-8'))
+  else:
+    with open(file_path, 'rb') as f:
+      while chunk := f.read(CHUNK_SIZE):
+        h.update(chunk)
+  return h.hexdigest()
+
+
+class FileChecksums:
+  """Checksums of files, computed in parallel and cached in cache_file if it is given."""
+
+  def __init__(self, cache_file=None, algorithm='sha1', follow_symlinks=True, max_workers=MAX_WORKERS):
+    self._cache_file = cache_file
+    self._algorithm = algorithm
+    self._follow_symlinks = follow_symlinks
+    self._max_workers = max_workers
+    # file path -> [inode, size, mtime_ns, checksum]
+    self._cache = {}
+    self._modified = False
+    # The files looked up by this run, which are kept in the cache file.
+    self._used = set()
+    if cache_file and os.path.exists(cache_file):
+      try:
+        with open(cache_file, encoding='utf-8') as f:
+          data = json.load(f)
+      except (OSError, ValueError):
+        data = {}
+      if data.get('algorithm') == algorithm and data.get('follow_symlinks') == follow_symlinks:
+        self._cache = data.get('files', {})
+
+  def _stat_key(self, file_path):
+    st = os.stat(file_path, follow_symlinks=self._follow_symlinks)
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+  def get_checksums(self, file_paths):
+    """Return {file path: hex digest} of the files, hashing those that are not cached in parallel."""
+    start_ns = time.time_ns()
+    file_paths = list(dict.fromkeys(file_paths))
+    self._used.update(file_paths)
+    checksums = {}
+    keys = {}
+    for file_path in file_paths:
+      key = self._stat_key(file_path)
+      cached = self._cache.get(file_path)
+      if cached and cached[:3] == key:
+        checksums[file_path] = cached[3]
+      else:
+        keys[file_path] = key
+
+    def hash_one(file_path):
+      return hash_file(file_path, self._algorithm, self._follow_symlinks)
+
+    if len(keys) > 1 and self._max_workers > 1:
+      with concurrent.futures.ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+        results = list(executor.map(hash_one, keys))
+    else:
+      results = [hash_one(file_path) for file_path in keys]
+
+    for (file_path, key), checksum in zip(keys.items(), results):
+      checksums[file_path] = checksum
+      if self._cache_file and key[2] < start_ns - RACY_WINDOW_NS:
+        self._cache[file_path] = key + [checksum]
+        self._modified = True
+    return {file_path: checksums[file_path] for file_path in file_paths}
+
+  def get_checksum(self, file_path):
+    return self.get_checksums([file_path])[file_path]
+
+  def save(self):
+    """Write the cache to cache_file, if it changed. The files that were not looked up are dropped."""
+    if not self._cache_file:
+      return
+    files = {file_path: entry for file_path, entry in self._cache.items() if file_path in self._used}
+    if not self._modified and len(files) == len(self._cache):
+      return
+    self._cache = files
+    data = {
+        'algorithm': self._algorithm,
+        'follow_symlinks': self._follow_symlinks,
+        'files': files,
+    }
+    tmp_file = self._cache_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+      json.dump(data, f)
+    os.replace(tmp_file, self._cache_file)
+    self._modified = False
@@ -25,47 +25,68 @@ Generate the Android notice files, including both text and html files.
 """
 from collections import defaultdict
 import argparse
-import hashlib
+import collections
+import concurrent.futures
 import itertools
 import os
 import os.path
 import re
-import struct
 import sys
 
-MD5_BLOCKSIZE = 1024 * 1024
-HTML_ESCAPE_TABLE = {
-    b"&": b"&amp;",
-    b'"': b"&quot;",
-    b"'": b"&apos;",
-    b">": b"&gt;",
-    b"<": b"&lt;",
-    }
-
-def md5sum(filename):
-    """Calculate an MD5 of the file given by FILENAME,
-    and return hex digest as a string.
+import file_checksums
+
+# Pairs of characters and entities, in the order they must be replaced so
+# that the ampersands of the entities are not escaped again.
+HTML_ESCAPE_TABLE = (
+    (b"&", b"&amp;"),
+    (b'"', b"&quot;"),
+    (b"'", b"&apos;"),
+    (b">", b"&gt;"),
+    (b"<", b"&lt;"),
+    )
+
+# Number of notice files read ahead of the one being written.
+READ_AHEAD = 64
+
+def md5sums(filenames, cache_file=None):
+    """Calculate the MD5s of the files given by FILENAMES in parallel,
+    and return a dict of hex digests as strings.
     Output should be compatible with md5sum command"""
 
-    f = open(filename, "rb")
-    sum = hashlib.md5()
-    while 1:
-        block = f.read(MD5_BLOCKSIZE)
-        if not block:
-            break
-        sum.update(block)
-    f.close()
-    return sum.hexdigest()
+    checksums = file_checksums.FileChecksums(cache_file, algorithm='md5')
+    sums = checksums.get_checksums(filenames)
+    checksums.save()
+    return sums
 
 
 def html_escape(text):
     """Produce entities within text."""
-    # Using for i in text doesn't work since i will be an int, not a byte.
-    # There are multiple ways to solve this, but the most performant way
-    # to iterate over a byte array is to use unpack. Using the
-    # for i in range(len(text)) and using that to get a byte using array
-    # slices is twice as slow as this method.
-    return b"".join(HTML_ESCAPE_TABLE.get(i,i) for i in struct.unpack(str(len(text)) + 'c', text))
+    # Each replace() scans the whole text in C, which is much faster than
+    # looking up the entity of every byte in Python.
+    for char, entity in HTML_ESCAPE_TABLE:
+        if char in text:
+            text = text.replace(char, entity)
+    return text
+
+def read_notice_files(filenames, escape=False):
+    """Yield the contents of the files in FILENAMES in order, HTML escaped if
+    ESCAPE is set. The files are read and escaped by a pool of threads ahead
+    of the caller, which writes the output while they are read."""
+
+    def read(filename):
+        with open(filename, "rb") as notice_file:
+            text = notice_file.read()
+        return html_escape(text) if escape else text
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=file_checksums.MAX_WORKERS) as executor:
+        pending = collections.deque()
+        for filename in filenames:
+            pending.append(executor.submit(read, filename))
+            if len(pending) > READ_AHEAD:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
 HTML_OUTPUT_CSS=b"""
 <style type="text/css">
@@ -114,7 +135,8 @@ def combine_notice_files_html(file_hash, input_dirs, output_filename):
     output_file.write(b"</div><!-- table of contents -->\n")
     # Output the individual notice file lists
     output_file.write(b'<table cellpadding="0" cellspacing="0" border="0">\n')
-    for value in file_hash:
+    notices = read_notice_files((value[0] for value in file_hash), escape=True)
+    for value, notice in zip(file_hash, notices):
         output_file.write(b'<tr id="id%d"><td class="same-license">\n' % id_table.get(value[0]))
         output_file.write(b'<div class="label">Notices for file(s):</div>\n')
         output_file.write(b'<div class="file-list">\n')
@@ -123,8 +145,7 @@ def combine_notice_files_html(file_hash, input_dirs, output_filename):
         output_file.write(b"</div><!-- file-list -->\n")
         output_file.write(b"\n")
         output_file.write(b'<pre class="license-text">\n')
-        with open(value[0], "rb") as notice_file:
-            output_file.write(html_escape(notice_file.read()))
+        output_file.write(notice)
         output_file.write(b"\n</pre><!-- license-text -->\n")
         output_file.write(b"</td></tr><!-- same-license -->\n\n\n\n")
 
@@ -140,16 +161,16 @@ def combine_notice_files_text(file_hash, input_dirs, output_filename, file_title
     output_file = open(output_filename, "wb")
     output_file.write(file_title.encode())
     output_file.write(b"\n")
-    for value in file_hash:
+    notices = read_notice_files(value[0] for value in file_hash)
+    for value, notice in zip(file_hash, notices):
         output_file.write(b"============================================================\n")
         output_file.write(b"Notices for file(s):\n")
         for filename in value:
             output_file.write(SRC_DIR_STRIP_RE.sub(r"\1", filename).encode())
             output_file.write(b"\n")
         output_file.write(b"------------------------------------------------------------\n")
-        with open(value[0], "rb") as notice_file:
-            output_file.write(notice_file.read())
-            output_file.write(b"\n")
+        output_file.write(notice)
+        output_file.write(b"\n")
     output_file.close()
 
 def combine_notice_files_xml(files_with_same_hash, input_dirs, output_filename):
@@ -179,17 +200,16 @@ def combine_notice_files_xml(files_with_same_hash, input_dirs, output_filename):
         output_file.write(('<file-name contentId="%s">%s</file-name>\n' % (id_table.get(filename), stripped_filename)).encode())
     output_file.write(b"\n\n")
 
-    processed_file_keys = []
-    # Output the individual notice file lists
+    # The notice of each key is output once, from its first file in sorted order
+    first_filenames = {}
     for filename in sorted_filenames:
-        file_key = id_table.get(filename)
-        if file_key in processed_file_keys:
-            continue
-        processed_file_keys.append(file_key)
+        first_filenames.setdefault(id_table.get(filename), filename)
 
+    # Output the individual notice file lists
+    notices = read_notice_files(first_filenames.values(), escape=True)
+    for file_key, notice in zip(first_filenames, notices):
         output_file.write(('<file-content contentId="%s"><![CDATA[' % file_key).encode())
-        with open(filename, "rb") as notice_file:
-            output_file.write(html_escape(notice_file.read()))
+        output_file.write(notice)
         output_file.write(b"]]></file-content>\n\n")
 
     # Finish off the file output
@@ -219,6 +239,9 @@ def get_args():
     parser.add_argument(
         '-e', '--excluded-subdirs', action='append',
         help='The sub directories which should be excluded.')
+    parser.add_argument(
+        '--checksum-cache',
+        help='The file to cache the MD5s of notice files across runs.')
     return parser.parse_args()
 
 def main(argv):
@@ -237,7 +260,7 @@ def main(argv):
 
     input_dirs = [os.path.normpath(source_dir) for source_dir in args.source_dir]
     # Find all the notice files and md5 them
-    files_with_same_hash = defaultdict(list)
+    notice_files = []
     for input_dir in input_dirs:
         for root, dir, files in os.walk(input_dir):
             for file in files:
@@ -256,9 +279,11 @@ def main(argv):
                             matched = False
                             break
                 if matched and file.endswith(".txt"):
-                    filename = os.path.join(root, file)
-                    file_md5sum = md5sum(filename)
-                    files_with_same_hash[file_md5sum].append(filename)
+                    notice_files.append(os.path.join(root, file))
+    files_with_same_hash = defaultdict(list)
+    notice_md5sums = md5sums(notice_files, args.checksum_cache)
+    for filename in notice_files:
+        files_with_same_hash[notice_md5sums[filename]].append(filename)
 
     filesets = [sorted(files_with_same_hash[md5]) for md5 in sorted(list(files_with_same_hash))]
     combine_notice_files_text(filesets, input_dirs, txt_output_file, file_title)
@@ -0,0 +1,175 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import resource
+import threading
+import time
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def _read_proc_stat(pid):
+    """Return (ppid, cpu ticks, rss bytes) of a process from /proc/PID/stat."""
+    with open(f"/proc/{pid}/stat") as f:
+        stat = f.read()
+    # The command name in parentheses can contain spaces, so split after it.
+    fields = stat[stat.rfind(")") + 2:].split()
+    ppid = int(fields[1])
+    # utime + stime of all the threads. cutime and cstime are left out, they would count
+    # the reaped children, which were sampled while they ran, a second time.
+    ticks = int(fields[11]) + int(fields[12])
+    rss = int(fields[21]) * _PAGE_SIZE
+    return ppid, ticks, rss
+
+
+def _read_proc_io(pid):
+    """Return (read bytes, write bytes) of a process from /proc/PID/io."""
+    values = {}
+    with open(f"/proc/{pid}/io") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            values[key] = int(value)
+    return values.get("read_bytes", 0), values.get("write_bytes", 0)
+
+
+def _read_context_switches():
+    """Return the number of context switches of the whole system from /proc/stat."""
+    with open("/proc/stat") as f:
+        for line in f:
+            if line.startswith("ctxt "):
+                return int(line.split()[1])
+    return 0
+
+
+class ResourceSampler():
+    """Samples the resource usage of a process and its descendants from /proc.
+
+    A thread records, every interval, the CPU utilization and the total RSS of the
+    process tree, the bytes it read and wrote, and the context switches of the system
+    in the interval. Processes that start and exit within an interval are missed by the
+    samples, but they are counted in the totals, which come from getrusage() of the
+    reaped children of this process.
+    """
+
+    def __init__(self, pid, interval_sec):
+        self._pid = pid
+        self._interval_sec = interval_sec
+        self._samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._start_ns = None
+        self._start_rusage = None
+        self._rusage = None
+
+    def Start(self):
+        self._start_ns = time.perf_counter_ns()
+        self._start_rusage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self._thread.start()
+
+    def Stop(self):
+        """Stop sampling. Must be called after the process was waited for."""
+        self._stop.set()
+        self._thread.join()
+        self._rusage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    def Samples(self):
+        return self._samples
+
+    def _process_tree(self):
+        """Return {pid: (ticks, rss)} of the process and its live descendants."""
+        children = {}
+        stats = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                ppid, ticks, rss = _read_proc_stat(entry)
+            except (OSError, ValueError, IndexError):
+                # The process exited
+                continue
+            pid = int(entry)
+            children.setdefault(ppid, []).append(pid)
+            stats[pid] = (ticks, rss)
+        tree = {}
+        to_visit = [self._pid]
+        while to_visit:
+            pid = to_visit.pop()
+            if pid in stats:
+                tree[pid] = stats[pid]
+                to_visit += children.get(pid, [])
+        return tree
+
+    def _run(self):
+        last = {}
+        last_ns = self._start_ns
+        last_context_switches = _read_context_switches()
+        while not self._stop.wait(self._interval_sec):
+            now_ns = time.perf_counter_ns()
+            ticks = 0
+            rss = 0
+            read_bytes = 0
+            write_bytes = 0
+            current = {}
+            for pid, (pid_ticks, pid_rss) in self._process_tree().items():
+                try:
+                    pid_read_bytes, pid_write_bytes = _read_proc_io(pid)
+                except OSError:
+                    pid_read_bytes, pid_write_bytes = last.get(pid, (0, 0, 0))[1:]
+                last_ticks, last_read_bytes, last_write_bytes = last.get(pid, (0, 0, 0))
+                ticks += pid_ticks - last_ticks
+                rss += pid_rss
+                read_bytes += pid_read_bytes - last_read_bytes
+                write_bytes += pid_write_bytes - last_write_bytes
+                current[pid] = (pid_ticks, pid_read_bytes, pid_write_bytes)
+            context_switches = _read_context_switches()
+            self._samples.append({
+                "time_ns": now_ns - self._start_ns,
+                "cpu_percent": round(100 * ticks / _CLK_TCK * 1e9 / (now_ns - last_ns), 1),
+                "rss_bytes": rss,
+                "read_bytes": read_bytes,
+                "write_bytes": write_bytes,
+                "context_switches": context_switches - last_context_switches,
+                "processes": len(current),
+            })
+            last = current
+            last_ns = now_ns
+            last_context_switches = context_switches
+
+    def Summary(self):
+        "Totals of the process tree, and the peaks of the samples."
+        result = {
+            "interval_sec": self._interval_sec,
+            "num_samples": len(self._samples),
+            "peak_rss_bytes": max((s["rss_bytes"] for s in self._samples), default=0),
+        }
+        if self._rusage:
+            start, end = self._start_rusage, self._rusage
+            result.update({
+                "cpu_time_ns": round((end.ru_utime + end.ru_stime
+                                      - start.ru_utime - start.ru_stime) * 1e9),
+                "block_input_ops": end.ru_inblock - start.ru_inblock,
+                "block_output_ops": end.ru_oublock - start.ru_oublock,
+                "context_switches": (end.ru_nvcsw + end.ru_nivcsw
+                                     - start.ru_nvcsw - start.ru_nivcsw),
+            })
+        return result
+
+    def Write(self, filename):
+        "Write the samples to a JSON file."
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump({"summary": self.Summary(), "samples": self._samples}, f, indent=2)
@@ -0,0 +1,113 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Statistics for comparing sets of benchmark durations
+
+import math
+import random
+import statistics
+
+# Largest number of values in both samples for which the exact distribution of the
+# Mann-Whitney U statistic is computed.
+MAX_EXACT_MANN_WHITNEY = 40
+
+
+def percentile(values, p):
+    "Return the p-th percentile of values, by the nearest-rank method"
+    values = sorted(values)
+    rank = max(1, math.ceil(len(values) * p / 100))
+    return values[rank - 1]
+
+
+def bootstrap_change_ci(baseline, candidate, confidence=0.95, iterations=10000, seed=0):
+    """Return the bootstrap confidence interval of the relative change of the median from
+    baseline to candidate, as a (low, high) tuple of fractions.
+
+    The resampling uses a fixed seed, so the same data always gives the same interval.
+    """
+    rng = random.Random(seed)
+    changes = []
+    for _ in range(iterations):
+        b = statistics.median(rng.choices(baseline, k=len(baseline)))
+        c = statistics.median(rng.choices(candidate, k=len(candidate)))
+        changes.append(c / b - 1)
+    tail = (1 - confidence) / 2 * 100
+    return percentile(changes, tail), percentile(changes, 100 - tail)
+
+
+def _ranks(values):
+    "Return the ranks of values, starting at 1, with ties given their average rank"
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+    return ranks
+
+
+def _mann_whitney_u_counts(m, n):
+    """Return the number of orderings of samples of sizes m and n that give each value of
+    the U statistic, from 0 to m * n."""
+    # counts[j][u] is the number of orderings of samples of sizes i and j with statistic u,
+    # for the current i.
+    counts = [[1] + [0] * (m * n) for _ in range(n + 1)]
+    for i in range(1, m + 1):
+        previous = counts
+        counts = [[1] + [0] * (m * n)]
+        for j in range(1, n + 1):
+            # The largest value is either from the first sample, which is then greater than
+            # all j values of the second, or from the second.
+            row = list(counts[j - 1])
+            for u in range(j, m * n + 1):
+                row[u] += previous[j][u - j]
+            counts.append(row)
+    return counts[n]
+
+
+def mann_whitney_u(x, y):
+    """Return the U statistic of x and the two-sided p-value of the Mann-Whitney U test of
+    whether x and y come from the same distribution.
+
+    The p-value is exact for small samples without ties, and from the normal approximation
+    with tie and continuity corrections otherwise.
+    """
+    m, n = len(x), len(y)
+    ranks = _ranks(list(x) + list(y))
+    u = sum(ranks[:m]) - m * (m + 1) / 2
+    has_ties = len(set(ranks)) < len(ranks)
+
+    if not has_ties and m + n <= MAX_EXACT_MANN_WHITNEY:
+        counts = _mann_whitney_u_counts(m, n)
+        total = sum(counts)
+        u = round(u)
+        p_low = sum(counts[:u + 1]) / total
+        p_high = sum(counts[u:]) / total
+        return u, min(1.0, 2 * min(p_low, p_high))
+
+    mean = m * n / 2
+    tie_counts = {}
+    for rank in ranks:
+        tie_counts[rank] = tie_counts.get(rank, 0) + 1
+    ties = sum(t ** 3 - t for t in tie_counts.values())
+    variance = m * n / 12 * ((m + n + 1) - ties / ((m + n) * (m + n - 1)))
+    if variance <= 0:
+        # All the values are equal
+        return u, 1.0
+    z = (abs(u - mean) - 0.5) / math.sqrt(variance)
+    return u, min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
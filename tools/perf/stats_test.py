@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+import math
+import unittest
+
+import stats
+
+
+def brute_force_u_counts(m, n):
+    "Return the counts of each U statistic by going through all the orderings"
+    counts = [0] * (m * n + 1)
+    for x in itertools.combinations(range(m + n), m):
+        y = [v for v in range(m + n) if v not in x]
+        counts[sum(a > b for a in x for b in y)] += 1
+    return counts
+
+
+class RanksTest(unittest.TestCase):
+    def test_no_ties(self):
+        self.assertEqual(stats._ranks([30, 10, 20]), [3, 1, 2])
+
+    def test_ties_get_average_rank(self):
+        self.assertEqual(stats._ranks([3, 1, 3, 2, 3]), [4, 1, 4, 2, 4])
+        self.assertEqual(stats._ranks([2, 1, 2, 1]), [3.5, 1.5, 3.5, 1.5])
+
+    def test_empty(self):
+        self.assertEqual(stats._ranks([]), [])
+
+
+class MannWhitneyUCountsTest(unittest.TestCase):
+    def test_known_counts(self):
+        self.assertEqual(stats._mann_whitney_u_counts(2, 2), [1, 1, 2, 1, 1])
+        self.assertEqual(stats._mann_whitney_u_counts(3, 3),
+                         [1, 1, 2, 3, 3, 3, 3, 2, 1, 1])
+
+    def test_matches_all_orderings(self):
+        for m, n in [(1, 1), (1, 4), (4, 1), (2, 5), (3, 4), (5, 5)]:
+            with self.subTest(m=m, n=n):
+                counts = stats._mann_whitney_u_counts(m, n)
+                self.assertEqual(counts, brute_force_u_counts(m, n))
+                self.assertEqual(sum(counts), math.comb(m + n, m))
+
+
+class MannWhitneyUTest(unittest.TestCase):
+    def test_exact_p_value(self):
+        self.assertEqual(stats.mann_whitney_u([1, 2, 3], [4, 5, 6]), (0, 0.1))
+        self.assertEqual(stats.mann_whitney_u([4, 5, 6], [1, 2, 3]), (9, 0.1))
+        # 64 of the 210 orderings have a U of 15 or more.
+        u, p = stats.mann_whitney_u([1, 5, 9, 10], [2, 3, 4, 6, 7, 8])
+        self.assertEqual(u, 15)
+        self.assertAlmostEqual(p, 128 / 210)
+
+    def test_p_value_is_at_most_one(self):
+        self.assertEqual(stats.mann_whitney_u([1, 4], [2, 3]), (2, 1.0))
+
+    def test_ties_use_normal_approximation(self):
+        u, p = stats.mann_whitney_u([1, 2, 2], [2, 3, 4])
+        self.assertEqual(u, 1)
+        # The variance is 9/12 * (7 - 24/30), with the continuity correction.
+        self.assertAlmostEqual(
+            p, math.erfc(3 / math.sqrt(0.75 * 6.2) / math.sqrt(2)))
+        self.assertAlmostEqual(p, 0.16416, places=5)
+
+    def test_all_values_equal(self):
+        self.assertEqual(stats.mann_whitney_u([5, 5], [5, 5, 5]), (3, 1.0))
+
+    def test_large_samples_use_normal_approximation(self):
+        x = list(range(25))
+        y = list(range(25, 50))
+        u, p = stats.mann_whitney_u(x, y)
+        self.assertEqual(u, 0)
+        z = (25 * 25 / 2 - 0.5) / math.sqrt(25 * 25 * 51 / 12)
+        self.assertAlmostEqual(p, math.erfc(z / math.sqrt(2)))
+        self.assertLess(p, 1e-8)
+
+
+class BootstrapChangeCiTest(unittest.TestCase):
+    def test_constant_samples(self):
+        low, high = stats.bootstrap_change_ci([10] * 5, [12] * 5)
+        self.assertAlmostEqual(low, 0.2)
+        self.assertAlmostEqual(high, 0.2)
+
+    def test_interval_contains_change(self):
+        baseline = [100 + i for i in range(10)]
+        candidate = [120 + i for i in range(10)]
+        low, high = stats.bootstrap_change_ci(baseline, candidate)
+        self.assertLess(0.1, low)
+        self.assertLess(low, 0.2)
+        self.assertLess(0.2, high)
+        self.assertLess(high, 0.3)
+
+    def test_same_seed_gives_same_interval(self):
+        baseline = [3, 1, 4, 1, 5, 9, 2, 6]
+        candidate = [2, 7, 1, 8, 2, 8, 1, 8]
+        self.assertEqual(stats.bootstrap_change_ci(baseline, candidate),
+                         stats.bootstrap_change_ci(baseline, candidate))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -15,6 +15,7 @@
 from __future__ import print_function
 
 import array
+import contextlib
 import copy
 import functools
 import heapq
@@ -24,6 +25,7 @@ import multiprocessing
 import os
 import os.path
 import re
+import shutil
 import sys
 import threading
 import zlib
@@ -236,10 +238,17 @@ class BlockImageDiff(object):
 
   When creating a BlockImageDiff, the src image may be None, in which case the
   list of transfers produced will never read from the original image.
+
+  If a checkpoint (an ota_checkpoint.Checkpoint) is given, the computed patches
+  are saved to it, and the ones saved by a previous run are reused.
+
+  If a worker_budget (a threading.Semaphore) is given, each patch computation
+  holds it, which bounds the total number of patches being computed when
+  several BlockImageDiffs run concurrently.
   """
 
   def __init__(self, tgt, src=None, threads=None, version=4,
-               disable_imgdiff=False):
+               disable_imgdiff=False, checkpoint=None, worker_budget=None):
     if threads is None:
       threads = multiprocessing.cpu_count() // 2
       if threads == 0:
@@ -254,6 +263,8 @@ class BlockImageDiff(object):
     self.touched_src_sha1 = None
     self.disable_imgdiff = disable_imgdiff
     self.imgdiff_stats = ImgdiffStats() if not disable_imgdiff else None
+    self.checkpoint = checkpoint
+    self.worker_budget = worker_budget
 
     assert version in (3, 4)
 
@@ -388,12 +399,15 @@ class BlockImageDiff(object):
       total = 0
       while target_blocks:
         blocks_to_write = target_blocks.first(blocks_limit)
-        out.append("%s %s\n" % (style, blocks_to_write.to_string_raw()))
+        out.write("%s %s\n" % (style, blocks_to_write.to_string_raw()))
         total += blocks_to_write.size()
         target_blocks = target_blocks.subtract(blocks_to_write)
       return total
 
-    out = []
+    # The header and the leading erase command depend on the whole list. The
+    # commands are streamed to a temp file as they are generated, and then
+    # copied after the header, instead of being held in memory.
+    body_file = common.MakeTempFile(prefix="transfer-list-")
     total = 0
 
     # In BBOTA v3+, it uses the hash of the stashed blocks as the stash slot
@@ -403,173 +417,178 @@ class BlockImageDiff(object):
     stashed_blocks = 0
     max_stashed_blocks = 0
 
-    for xf in self.transfers:
+    # Each stash is hashed once, and looked up by its raw id when used.
+    stash_sha1s = {}
 
-      for _, sr in xf.stash_before:
-        sh = self.src.RangeSha1(sr)
-        if sh in stashes:
-          stashes[sh] += 1
-        else:
-          stashes[sh] = 1
-          stashed_blocks += sr.size()
-          self.touched_src_ranges = self.touched_src_ranges.union(sr)
-          out.append("stash %s %s\n" % (sh, sr.to_string_raw()))
+    with open(body_file, "w") as out:
+      for xf in self.transfers:
 
-      if stashed_blocks > max_stashed_blocks:
-        max_stashed_blocks = stashed_blocks
+        for stash_raw_id, sr in xf.stash_before:
+          sh = self.src.RangeSha1(sr)
+          stash_sha1s[stash_raw_id] = sh
+          if sh in stashes:
+            stashes[sh] += 1
+          else:
+            stashes[sh] = 1
+            stashed_blocks += sr.size()
+            self.touched_src_ranges = self.touched_src_ranges.union(sr)
+            out.write("stash %s %s\n" % (sh, sr.to_string_raw()))
+
+        if stashed_blocks > max_stashed_blocks:
+          max_stashed_blocks = stashed_blocks
+
+        free_string = []
+        free_size = 0
+
+        #   <# blocks> <src ranges>
+        #     OR
+        #   <# blocks> <src ranges> <src locs> <stash refs...>
+        #     OR
+        #   <# blocks> - <stash refs...>
+
+        size = xf.src_ranges.size()
+        src_str_buffer = [str(size)]
+
+        unstashed_src_ranges = xf.src_ranges
+        mapped_stashes = []
+        for stash_raw_id, sr in xf.use_stash:
+          unstashed_src_ranges = unstashed_src_ranges.subtract(sr)
+          sh = stash_sha1s[stash_raw_id]
+          sr = xf.src_ranges.map_within(sr)
+          mapped_stashes.append(sr)
+          assert sh in stashes
+          src_str_buffer.append("%s:%s" % (sh, sr.to_string_raw()))
+          stashes[sh] -= 1
+          if stashes[sh] == 0:
+            free_string.append("free %s\n" % (sh,))
+            free_size += sr.size()
+            stashes.pop(sh)
+
+        if unstashed_src_ranges:
+          src_str_buffer.insert(1, unstashed_src_ranges.to_string_raw())
+          if xf.use_stash:
+            mapped_unstashed = xf.src_ranges.map_within(unstashed_src_ranges)
+            src_str_buffer.insert(2, mapped_unstashed.to_string_raw())
+            mapped_stashes.append(mapped_unstashed)
+            self.AssertPartition(RangeSet(data=(0, size)), mapped_stashes)
+        else:
+          src_str_buffer.insert(1, "-")
+          self.AssertPartition(RangeSet(data=(0, size)), mapped_stashes)
 
-      free_string = []
-      free_size = 0
+        src_str = " ".join(src_str_buffer)
 
-      #   <# blocks> <src ranges>
-      #     OR
-      #   <# blocks> <src ranges> <src locs> <stash refs...>
-      #     OR
-      #   <# blocks> - <stash refs...>
+        # version 3+:
+        #   zero <rangeset>
+        #   new <rangeset>
+        #   erase <rangeset>
+        #   bsdiff patchstart patchlen srchash tgthash <tgt rangeset> <src_str>
+        #   imgdiff patchstart patchlen srchash tgthash <tgt rangeset> <src_str>
+        #   move hash <tgt rangeset> <src_str>
 
-      size = xf.src_ranges.size()
-      src_str_buffer = [str(size)]
+        tgt_size = xf.tgt_ranges.size()
 
-      unstashed_src_ranges = xf.src_ranges
-      mapped_stashes = []
-      for _, sr in xf.use_stash:
-        unstashed_src_ranges = unstashed_src_ranges.subtract(sr)
-        sh = self.src.RangeSha1(sr)
-        sr = xf.src_ranges.map_within(sr)
-        mapped_stashes.append(sr)
-        assert sh in stashes
-        src_str_buffer.append("%s:%s" % (sh, sr.to_string_raw()))
-        stashes[sh] -= 1
-        if stashes[sh] == 0:
-          free_string.append("free %s\n" % (sh,))
-          free_size += sr.size()
-          stashes.pop(sh)
-
-      if unstashed_src_ranges:
-        src_str_buffer.insert(1, unstashed_src_ranges.to_string_raw())
-        if xf.use_stash:
-          mapped_unstashed = xf.src_ranges.map_within(unstashed_src_ranges)
-          src_str_buffer.insert(2, mapped_unstashed.to_string_raw())
-          mapped_stashes.append(mapped_unstashed)
-          self.AssertPartition(RangeSet(data=(0, size)), mapped_stashes)
-      else:
-        src_str_buffer.insert(1, "-")
-        self.AssertPartition(RangeSet(data=(0, size)), mapped_stashes)
-
-      src_str = " ".join(src_str_buffer)
-
-      # version 3+:
-      #   zero <rangeset>
-      #   new <rangeset>
-      #   erase <rangeset>
-      #   bsdiff patchstart patchlen srchash tgthash <tgt rangeset> <src_str>
-      #   imgdiff patchstart patchlen srchash tgthash <tgt rangeset> <src_str>
-      #   move hash <tgt rangeset> <src_str>
-
-      tgt_size = xf.tgt_ranges.size()
-
-      if xf.style == "new":
-        assert xf.tgt_ranges
-        assert tgt_size == WriteSplitTransfers(out, xf.style, xf.tgt_ranges)
-        total += tgt_size
-      elif xf.style == "move":
-        assert xf.tgt_ranges
-        assert xf.src_ranges.size() == tgt_size
-        if xf.src_ranges != xf.tgt_ranges:
+        if xf.style == "new":
+          assert xf.tgt_ranges
+          assert tgt_size == WriteSplitTransfers(out, xf.style, xf.tgt_ranges)
+          total += tgt_size
+        elif xf.style == "move":
+          assert xf.tgt_ranges
+          assert xf.src_ranges.size() == tgt_size
+          if xf.src_ranges != xf.tgt_ranges:
+            # take into account automatic stashing of overlapping blocks
+            if xf.src_ranges.overlaps(xf.tgt_ranges):
+              temp_stash_usage = stashed_blocks + xf.src_ranges.size()
+              if temp_stash_usage > max_stashed_blocks:
+                max_stashed_blocks = temp_stash_usage
+
+            self.touched_src_ranges = self.touched_src_ranges.union(
+                xf.src_ranges)
+
+            out.write("%s %s %s %s\n" % (
+                xf.style,
+                xf.tgt_sha1,
+                xf.tgt_ranges.to_string_raw(), src_str))
+            total += tgt_size
+        elif xf.style in ("bsdiff", "imgdiff"):
+          assert xf.tgt_ranges
+          assert xf.src_ranges
           # take into account automatic stashing of overlapping blocks
           if xf.src_ranges.overlaps(xf.tgt_ranges):
             temp_stash_usage = stashed_blocks + xf.src_ranges.size()
             if temp_stash_usage > max_stashed_blocks:
               max_stashed_blocks = temp_stash_usage
 
-          self.touched_src_ranges = self.touched_src_ranges.union(
-              xf.src_ranges)
+          self.touched_src_ranges = self.touched_src_ranges.union(xf.src_ranges)
 
-          out.append("%s %s %s %s\n" % (
+          out.write("%s %d %d %s %s %s %s\n" % (
               xf.style,
+              xf.patch_start, xf.patch_len,
+              xf.src_sha1,
               xf.tgt_sha1,
               xf.tgt_ranges.to_string_raw(), src_str))
           total += tgt_size
-      elif xf.style in ("bsdiff", "imgdiff"):
-        assert xf.tgt_ranges
-        assert xf.src_ranges
-        # take into account automatic stashing of overlapping blocks
-        if xf.src_ranges.overlaps(xf.tgt_ranges):
-          temp_stash_usage = stashed_blocks + xf.src_ranges.size()
-          if temp_stash_usage > max_stashed_blocks:
-            max_stashed_blocks = temp_stash_usage
-
-        self.touched_src_ranges = self.touched_src_ranges.union(xf.src_ranges)
-
-        out.append("%s %d %d %s %s %s %s\n" % (
-            xf.style,
-            xf.patch_start, xf.patch_len,
-            xf.src_sha1,
-            xf.tgt_sha1,
-            xf.tgt_ranges.to_string_raw(), src_str))
-        total += tgt_size
-      elif xf.style == "zero":
-        assert xf.tgt_ranges
-        to_zero = xf.tgt_ranges.subtract(xf.src_ranges)
-        assert WriteSplitTransfers(out, xf.style, to_zero) == to_zero.size()
-        total += to_zero.size()
-      else:
-        raise ValueError("unknown transfer style '%s'\n" % xf.style)
-
-      if free_string:
-        out.append("".join(free_string))
-        stashed_blocks -= free_size
-
-      if common.OPTIONS.cache_size is not None:
-        # Validation check: abort if we're going to need more stash space than
-        # the allowed size (cache_size * threshold). There are two purposes
-        # of having a threshold here. a) Part of the cache may have been
-        # occupied by some recovery logs. b) It will buy us some time to deal
-        # with the oversize issue.
-        cache_size = common.OPTIONS.cache_size
-        stash_threshold = common.OPTIONS.stash_threshold
-        max_allowed = cache_size * stash_threshold
-        assert max_stashed_blocks * self.tgt.blocksize <= max_allowed, \
-               'Stash size %d (%d * %d) exceeds the limit %d (%d * %.2f)' % (
-                   max_stashed_blocks * self.tgt.blocksize, max_stashed_blocks,
-                   self.tgt.blocksize, max_allowed, cache_size,
-                   stash_threshold)
-
-    self.touched_src_sha1 = self.src.RangeSha1(self.touched_src_ranges)
-
-    # Zero out extended blocks as a workaround for bug 20881595.
-    if self.tgt.extended:
-      assert (WriteSplitTransfers(out, "zero", self.tgt.extended) ==
-              self.tgt.extended.size())
-      total += self.tgt.extended.size()
-
-    # We erase all the blocks on the partition that a) don't contain useful
-    # data in the new image; b) will not be touched by dm-verity. Out of those
-    # blocks, we erase the ones that won't be used in this update at the
-    # beginning of an update. The rest would be erased at the end. This is to
-    # work around the eMMC issue observed on some devices, which may otherwise
-    # get starving for clean blocks and thus fail the update. (b/28347095)
-    all_tgt = RangeSet(data=(0, self.tgt.total_blocks))
-    all_tgt_minus_extended = all_tgt.subtract(self.tgt.extended)
-    new_dontcare = all_tgt_minus_extended.subtract(self.tgt.care_map)
-
-    erase_first = new_dontcare.subtract(self.touched_src_ranges)
-    if erase_first:
-      out.insert(0, "erase %s\n" % (erase_first.to_string_raw(),))
-
-    erase_last = new_dontcare.subtract(erase_first)
-    if erase_last:
-      out.append("erase %s\n" % (erase_last.to_string_raw(),))
-
-    out.insert(0, "%d\n" % (self.version,))   # format version number
-    out.insert(1, "%d\n" % (total,))
-    # v3+: the number of stash slots is unused.
-    out.insert(2, "0\n")
-    out.insert(3, str(max_stashed_blocks) + "\n")
+        elif xf.style == "zero":
+          assert xf.tgt_ranges
+          to_zero = xf.tgt_ranges.subtract(xf.src_ranges)
+          assert WriteSplitTransfers(out, xf.style, to_zero) == to_zero.size()
+          total += to_zero.size()
+        else:
+          raise ValueError("unknown transfer style '%s'\n" % xf.style)
+
+        if free_string:
+          out.write("".join(free_string))
+          stashed_blocks -= free_size
+
+        if common.OPTIONS.cache_size is not None:
+          # Validation check: abort if we're going to need more stash space than
+          # the allowed size (cache_size * threshold). There are two purposes
+          # of having a threshold here. a) Part of the cache may have been
+          # occupied by some recovery logs. b) It will buy us some time to deal
+          # with the oversize issue.
+          cache_size = common.OPTIONS.cache_size
+          stash_threshold = common.OPTIONS.stash_threshold
+          max_allowed = cache_size * stash_threshold
+          assert max_stashed_blocks * self.tgt.blocksize <= max_allowed, \
+                 'Stash size %d (%d * %d) exceeds the limit %d (%d * %.2f)' % (
+                     max_stashed_blocks * self.tgt.blocksize,
+                     max_stashed_blocks, self.tgt.blocksize, max_allowed,
+                     cache_size, stash_threshold)
+
+      self.touched_src_sha1 = self.src.RangeSha1(self.touched_src_ranges)
+
+      # Zero out extended blocks as a workaround for bug 20881595.
+      if self.tgt.extended:
+        assert (WriteSplitTransfers(out, "zero", self.tgt.extended) ==
+                self.tgt.extended.size())
+        total += self.tgt.extended.size()
+
+      # We erase all the blocks on the partition that a) don't contain useful
+      # data in the new image; b) will not be touched by dm-verity. Out of those
+      # blocks, we erase the ones that won't be used in this update at the
+      # beginning of an update. The rest would be erased at the end. This is to
+      # work around the eMMC issue observed on some devices, which may otherwise
+      # get starving for clean blocks and thus fail the update. (b/28347095)
+      all_tgt = RangeSet(data=(0, self.tgt.total_blocks))
+      all_tgt_minus_extended = all_tgt.subtract(self.tgt.extended)
+      new_dontcare = all_tgt_minus_extended.subtract(self.tgt.care_map)
+
+      erase_first = new_dontcare.subtract(self.touched_src_ranges)
+
+      erase_last = new_dontcare.subtract(erase_first)
+      if erase_last:
+        out.write("erase %s\n" % (erase_last.to_string_raw(),))
 
     with open(prefix + ".transfer.list", "w") as f:
-      for i in out:
-        f.write(i)
+      f.write("%d\n" % (self.version,))   # format version number
+      f.write("%d\n" % (total,))
+      # v3+: the number of stash slots is unused.
+      f.write("0\n")
+      f.write(str(max_stashed_blocks) + "\n")
+      if erase_first:
+        f.write("erase %s\n" % (erase_first.to_string_raw(),))
+      with open(body_file) as body:
+        shutil.copyfileobj(body, f)
+    os.remove(body_file)
 
     self._max_stashed_size = max_stashed_blocks * self.tgt.blocksize
     OPTIONS = common.OPTIONS
@@ -711,14 +730,14 @@ class BlockImageDiff(object):
           tgt_size = xf.tgt_ranges.size() * self.tgt.blocksize
           logger.info(
               "%10d %10d (%6.2f%%) %7s %s %s", tgt_size, tgt_size, 100.0,
-              xf.style, xf.tgt_name, str(xf.tgt_ranges))
+              xf.style, xf.tgt_name, xf.tgt_ranges)
 
         elif xf.style == "new":
           self.tgt.WriteRangeDataToFd(xf.tgt_ranges, new_f)
           tgt_size = xf.tgt_ranges.size() * self.tgt.blocksize
           logger.info(
               "%10d %10d (%6.2f%%) %7s %s %s", tgt_size, tgt_size, 100.0,
-              xf.style, xf.tgt_name, str(xf.tgt_ranges))
+              xf.style, xf.tgt_name, xf.tgt_ranges)
 
         elif xf.style == "diff":
           # We can't compare src and tgt directly because they may have
@@ -741,7 +760,7 @@ class BlockImageDiff(object):
                   100.0, xf.style,
                   xf.tgt_name if xf.tgt_name == xf.src_name else (
                       xf.tgt_name + " (from " + xf.src_name + ")"),
-                  str(xf.tgt_ranges), str(xf.src_ranges))
+                  xf.tgt_ranges, xf.src_ranges)
           else:
             if xf.patch_info:
               # We have already generated the patch (e.g. during split of large
@@ -757,16 +776,21 @@ class BlockImageDiff(object):
         else:
           assert False, "unknown style " + xf.style
 
-    patches = self.ComputePatchesForInputList(diff_queue, False)
-
+    # Write each patch as soon as it (and the ones before it) are computed, so
+    # that we don't hold the whole set of patches in memory. The patches are
+    # still laid out in the order of diff_queue, to keep the output
+    # deterministic.
     offset = 0
     with open(prefix + ".patch.dat", "wb") as patch_fd:
-      for index, patch_info, _ in patches:
+      def WritePatch(index, patch_info, _):
+        nonlocal offset
         xf = self.transfers[index]
         xf.patch_len = len(patch_info.content)
         xf.patch_start = offset
         offset += xf.patch_len
         patch_fd.write(patch_info.content)
+        # Only the offset and length are needed from now on.
+        xf.patch_info = None
 
         tgt_size = xf.tgt_ranges.size() * self.tgt.blocksize
         logger.info(
@@ -776,6 +800,8 @@ class BlockImageDiff(object):
                 xf.tgt_name + " (from " + xf.src_name + ")"),
             xf.tgt_ranges, xf.src_ranges)
 
+      self.ComputePatchesForInputList(diff_queue, False, WritePatch)
+
   def AssertSha1Good(self):
     """Check the SHA-1 of the src & tgt blocks in the transfer list.
 
@@ -1102,16 +1128,21 @@ class BlockImageDiff(object):
           b.goes_before[a] = size
           a.goes_after[b] = size
 
-  def ComputePatchesForInputList(self, diff_queue, compress_target):
+  def ComputePatchesForInputList(self, diff_queue, compress_target,
+                                 patch_callback=None):
     """Returns a list of patch information for the input list of transfers.
 
       Args:
         diff_queue: a list of transfers with style 'diff'
         compress_target: If True, compresses the target ranges of each
             transfers; and save the size.
+        patch_callback: If set, called with each (transfer order, patch_info,
+            compressed_size) as soon as the patch and all the ones before it
+            in diff_queue are computed. The results are then not accumulated.
 
       Returns:
-        A list of (transfer order, patch_info, compressed_size) tuples.
+        A list of (transfer order, patch_info, compressed_size) tuples, or an
+        empty list if patch_callback is set.
     """
 
     if not diff_queue:
@@ -1126,6 +1157,22 @@ class BlockImageDiff(object):
     patches = [None] * diff_total
     error_messages = []
 
+    # Hand out the transfers in order, so that the results can be passed to
+    # patch_callback in order with few of them pending.
+    diff_queue = deque(diff_queue)
+    pending = {}
+    next_patch_index = 0
+
+    def emit_patch(patch_index, result):
+      nonlocal next_patch_index
+      if patch_callback is None:
+        patches[patch_index] = result
+        return
+      pending[patch_index] = result
+      while next_patch_index in pending:
+        patch_callback(*pending.pop(next_patch_index))
+        next_patch_index += 1
+
     # Using multiprocessing doesn't give additional benefits, due to the
     # pattern of the code. The diffing work is done by subprocess.call, which
     # already runs in a separate process (not affected much by the GIL -
@@ -1134,57 +1181,85 @@ class BlockImageDiff(object):
     # reopening the image file (SparseImage) in the worker processes. Doing
     # neither of them further improves the performance.
     lock = threading.Lock()
+    worker_budget = self.worker_budget or contextlib.nullcontext()
+    # Unexpected exceptions of the workers, e.g. from patch_callback, which are
+    # raised again once all the workers are done.
+    worker_exceptions = []
 
     def diff_worker():
+      try:
+        diff_transfers()
+      except Exception as e:  # pylint: disable=broad-except
+        with lock:
+          worker_exceptions.append(e)
+
+    def diff_transfers():
       while True:
         with lock:
-          if not diff_queue:
+          # Stop early upon errors, as we're going to exit.
+          if not diff_queue or worker_exceptions:
             return
-          xf_index, imgdiff, patch_index = diff_queue.pop()
+          xf_index, imgdiff, patch_index = diff_queue.popleft()
           xf = self.transfers[xf_index]
 
-        message = []
-        compressed_size = None
-
-        patch_info = xf.patch_info
-        if not patch_info:
-          src_file = common.MakeTempFile(prefix="src-")
-          with open(src_file, "wb") as fd:
-            self.src.WriteRangeDataToFd(xf.src_ranges, fd)
-
-          tgt_file = common.MakeTempFile(prefix="tgt-")
-          with open(tgt_file, "wb") as fd:
-            self.tgt.WriteRangeDataToFd(xf.tgt_ranges, fd)
-
-          try:
-            patch_info = compute_patch(src_file, tgt_file, imgdiff)
-          except ValueError as e:
-            message.append(
-                "Failed to generate %s for %s: tgt=%s, src=%s:\n%s" % (
-                    "imgdiff" if imgdiff else "bsdiff",
-                    xf.tgt_name if xf.tgt_name == xf.src_name else
-                    xf.tgt_name + " (from " + xf.src_name + ")",
-                    xf.tgt_ranges, xf.src_ranges, e.message))
-
-        if compress_target:
-          tgt_data = self.tgt.ReadRangeSet(xf.tgt_ranges)
-          try:
-            # Compresses with the default level
-            compress_obj = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
-            compressed_data = (compress_obj.compress(b"".join(tgt_data))
-                               + compress_obj.flush())
-            compressed_size = len(compressed_data)
-          except zlib.error as e:
-            message.append(
-                "Failed to compress the data in target range {} for {}:\n"
-                "{}".format(xf.tgt_ranges, xf.tgt_name, e.message))
+        # Bound the number of patches being computed across all the
+        # BlockImageDiff instances that share the budget.
+        with worker_budget:
+          message = []
+          compressed_size = None
+
+          patch_info = xf.patch_info
+          # The patches are keyed by the hashes of their source and target
+          # data.
+          checkpoint_key = "%s-%s-%s" % (
+              xf.src_sha1, xf.tgt_sha1, "imgdiff" if imgdiff else "bsdiff")
+          if not patch_info and self.checkpoint:
+            content = self.checkpoint.LoadPatch(checkpoint_key)
+            if content is not None:
+              patch_info = PatchInfo(imgdiff, content)
+
+          if not patch_info:
+            src_file = common.MakeTempFile(prefix="src-")
+            with open(src_file, "wb") as fd:
+              self.src.WriteRangeDataToFd(xf.src_ranges, fd)
+
+            tgt_file = common.MakeTempFile(prefix="tgt-")
+            with open(tgt_file, "wb") as fd:
+              self.tgt.WriteRangeDataToFd(xf.tgt_ranges, fd)
+
+            try:
+              patch_info = compute_patch(src_file, tgt_file, imgdiff)
+              if self.checkpoint:
+                self.checkpoint.SavePatch(checkpoint_key, patch_info.content)
+            except ValueError as e:
+              message.append(
+                  "Failed to generate %s for %s: tgt=%s, src=%s:\n%s" % (
+                      "imgdiff" if imgdiff else "bsdiff",
+                      xf.tgt_name if xf.tgt_name == xf.src_name else
+                      xf.tgt_name + " (from " + xf.src_name + ")",
+                      xf.tgt_ranges, xf.src_ranges, e.message))
+
+          if compress_target:
+            tgt_data = self.tgt.ReadRangeSet(xf.tgt_ranges)
+            try:
+              # Compresses with the default level
+              compress_obj = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+              compressed_data = (compress_obj.compress(b"".join(tgt_data))
+                                 + compress_obj.flush())
+              compressed_size = len(compressed_data)
+            except zlib.error as e:
+              message.append(
+                  "Failed to compress the data in target range {} for {}:\n"
+                  "{}".format(xf.tgt_ranges, xf.tgt_name, e.message))
 
         if message:
           with lock:
             error_messages.extend(message)
 
         with lock:
-          patches[patch_index] = (xf_index, patch_info, compressed_size)
+          # Skip the remaining results upon errors, as we're going to exit.
+          if not error_messages and not worker_exceptions:
+            emit_patch(patch_index, (xf_index, patch_info, compressed_size))
 
     threads = [threading.Thread(target=diff_worker)
                for _ in range(self.threads)]
@@ -1193,12 +1268,17 @@ class BlockImageDiff(object):
     while threads:
       threads.pop().join()
 
+    if worker_exceptions:
+      raise worker_exceptions[0]
+
     if error_messages:
       logger.error('ERROR:')
       logger.error('\n'.join(error_messages))
       logger.error('\n\n\n')
       sys.exit(1)
 
+    if patch_callback is not None:
+      return []
     return patches
 
   def SelectAndConvertDiffTransfersToNew(self, violated_stash_blocks):
@@ -37,16 +37,32 @@ Usage:  check_target_file_signatures [flags] target_files
       Dump the certificate information for both packages in comparison
       mode (this output is normally suppressed).
 
+  --worker_threads <int>
+      Number of worker threads used to load the APKs. Defaults to half of the
+      available CPUs.
+
+  --use_external_tools
+      Always run apksigner and aapt2 on extracted APKs, instead of reading the
+      APK Signing Block and the binary AndroidManifest.xml in-process.
+
 """
 
 from __future__ import print_function
 
+import concurrent.futures
+import copy
+import gzip
+import hashlib
+import io
 import logging
+import multiprocessing
 import os
 import os.path
 import re
+import struct
 import subprocess
 import sys
+import threading
 import zipfile
 
 import common
@@ -64,6 +80,8 @@ OPTIONS = common.OPTIONS
 OPTIONS.text = False
 OPTIONS.compare_with = None
 OPTIONS.local_cert_dirs = ("vendor", "build")
+OPTIONS.worker_threads = max(multiprocessing.cpu_count() // 2, 1)
+OPTIONS.use_external_tools = False
 
 PROBLEMS = []
 PROBLEM_PREFIX = []
@@ -144,47 +162,353 @@ class CertDB(object):
 ALL_CERTS = CertDB()
 
 
-def CertFromPKCS7(data, filename):
+def CertFromPKCS7(data, filename, add_problem=None):
   """Read the cert out of a PKCS#7-format file (which is what is
-  stored in a signed .apk)."""
-  Push(filename + ":")
-  try:
-    p = common.Run(["openssl", "pkcs7",
-                    "-inform", "DER",
-                    "-outform", "PEM",
-                    "-print_certs"],
-                   stdin=subprocess.PIPE,
-                   stdout=subprocess.PIPE,
-                   universal_newlines=False)
-    out, err = p.communicate(data)
-    if err and not err.strip():
-      AddProblem("error reading cert:\n" + err.decode())
-      return None
+  stored in a signed .apk).
+
+  Problems are reported through |add_problem| (prefixed with |filename|) if
+  given, or through AddProblem() otherwise."""
+
+  def Report(msg):
+    if add_problem:
+      add_problem(filename + ": " + msg)
+      return
+    Push(filename + ":")
+    try:
+      AddProblem(msg)
+    finally:
+      Pop()
 
-    cert = common.ParseCertificate(out.decode())
-    if not cert:
-      AddProblem("error parsing cert output")
+  p = common.Run(["openssl", "pkcs7",
+                  "-inform", "DER",
+                  "-outform", "PEM",
+                  "-print_certs"],
+                 stdin=subprocess.PIPE,
+                 stdout=subprocess.PIPE,
+                 universal_newlines=False)
+  out, err = p.communicate(data)
+  if err and not err.strip():
+    Report("error reading cert:\n" + err.decode())
+    return None
+
+  cert = common.ParseCertificate(out.decode())
+  if not cert:
+    Report("error parsing cert output")
+    return None
+  return cert
+
+
+# Magic and block IDs of the APK Signing Block, see
+# https://source.android.com/docs/security/features/apksigning/v2.
+APK_SIG_BLOCK_MAGIC = b"APK Sig Block 42"
+APK_SIGNATURE_SCHEME_V2_BLOCK_ID = 0x7109871a
+APK_SIGNATURE_SCHEME_V3_BLOCK_ID = 0xf05368c0
+APK_SIGNATURE_SCHEME_V31_BLOCK_ID = 0x1b93ad61
+
+ZIP_EOCD_MAGIC = b"PK\x05\x06"
+ZIP_EOCD_SIZE = 22
+
+
+def _ReadLengthPrefixed(data, offset):
+  """Returns the uint32 length-prefixed slice at |offset|, and the offset
+  following it."""
+  (length,) = struct.unpack_from("<I", data, offset)
+  start = offset + 4
+  if start + length > len(data):
+    raise ValueError("Length-prefixed value out of bounds")
+  return data[start:start + length], start + length
+
+
+def _ReadLengthPrefixedSequence(data):
+  """Yields the uint32 length-prefixed items stored back to back in |data|."""
+  offset = 0
+  while offset < len(data):
+    item, offset = _ReadLengthPrefixed(data, offset)
+    yield item
+
+
+def FindApkSigningBlock(data):
+  """Returns a dict of the ID-value pairs in the APK Signing Block of |data|.
+
+  Returns None if |data| doesn't have an APK Signing Block (e.g. it's only
+  signed with the JAR signature scheme)."""
+  eocd_search_start = max(0, len(data) - ZIP_EOCD_SIZE - 0xffff)
+  eocd = data.rfind(ZIP_EOCD_MAGIC, eocd_search_start)
+  if eocd < 0 or eocd + ZIP_EOCD_SIZE > len(data):
+    return None
+  (cd_offset,) = struct.unpack_from("<I", data, eocd + 16)
+  if cd_offset < 32 or cd_offset > eocd:
+    return None
+  if data[cd_offset - 16:cd_offset] != APK_SIG_BLOCK_MAGIC:
+    return None
+
+  # The block is framed by its size (excluding the leading size field itself)
+  # on both ends.
+  (block_size,) = struct.unpack_from("<Q", data, cd_offset - 24)
+  block_start = cd_offset - block_size - 8
+  if block_start < 0:
+    return None
+  (leading_size,) = struct.unpack_from("<Q", data, block_start)
+  if leading_size != block_size:
+    return None
+
+  pairs = {}
+  offset = block_start + 8
+  pairs_end = cd_offset - 24
+  while offset + 12 <= pairs_end:
+    pair_size, block_id = struct.unpack_from("<QI", data, offset)
+    value_start = offset + 12
+    offset += 8 + pair_size
+    if pair_size < 4 or offset > pairs_end:
       return None
-    return cert
-  finally:
-    Pop()
+    pairs[block_id] = data[value_start:offset]
+  return pairs
+
+
+def _ReadSignersCerts(block):
+  """Returns the DER certificate of each signer in a v2/v3 signature block."""
+  certs = []
+  signers, _ = _ReadLengthPrefixed(block, 0)
+  for signer in _ReadLengthPrefixedSequence(signers):
+    signed_data, _ = _ReadLengthPrefixed(signer, 0)
+    # signed data: digests, certificates, ...
+    _, offset = _ReadLengthPrefixed(signed_data, 0)
+    certificates, _ = _ReadLengthPrefixed(signed_data, offset)
+    for cert in _ReadLengthPrefixedSequence(certificates):
+      # The first certificate is the one of the signer; the rest (if any) are
+      # the intermediate ones.
+      certs.append(bytes(cert))
+      break
+  return certs
+
+
+def ReadSigningBlockCerts(data):
+  """Returns the signer certificates found in the APK Signing Block of |data|.
+
+  Mirrors what `apksigner verify --print-certs` reports: the v3.1 and v3
+  signers if present, or the v2 ones otherwise. Returns None if there is no
+  APK Signing Block, or no v2+ signature in it."""
+  pairs = FindApkSigningBlock(data)
+  if not pairs:
+    return None
+  certs = []
+  for block_id in (APK_SIGNATURE_SCHEME_V31_BLOCK_ID,
+                   APK_SIGNATURE_SCHEME_V3_BLOCK_ID):
+    if block_id in pairs:
+      certs.extend(_ReadSignersCerts(pairs[block_id]))
+  if not certs and APK_SIGNATURE_SCHEME_V2_BLOCK_ID in pairs:
+    certs = _ReadSignersCerts(pairs[APK_SIGNATURE_SCHEME_V2_BLOCK_ID])
+  return certs or None
+
+
+def _ReadDerElement(data, offset):
+  """Returns (tag, value_start, value_end) of the DER element at |offset|."""
+  tag = data[offset]
+  length = data[offset + 1]
+  offset += 2
+  if length & 0x80:
+    num_bytes = length & 0x7f
+    length = int.from_bytes(data[offset:offset + num_bytes], "big")
+    offset += num_bytes
+  if offset + length > len(data):
+    raise ValueError("DER element out of bounds")
+  return tag, offset, offset + length
+
+
+def CertFromPKCS7InProcess(data):
+  """Returns the first DER certificate of a PKCS#7 SignedData blob, or None.
+
+  Equivalent to CertFromPKCS7(), without forking openssl."""
+  # ContentInfo ::= SEQUENCE { contentType, [0] EXPLICIT SignedData }
+  _, start, _ = _ReadDerElement(data, 0)
+  _, _, offset = _ReadDerElement(data, start)
+  tag, start, _ = _ReadDerElement(data, offset)
+  if tag != 0xa0:
+    return None
+  # SignedData ::= SEQUENCE { version, digestAlgorithms, contentInfo,
+  #                           [0] IMPLICIT certificates OPTIONAL, ... }
+  _, offset, _ = _ReadDerElement(data, start)
+  for _ in range(3):
+    _, _, offset = _ReadDerElement(data, offset)
+  tag, start, end = _ReadDerElement(data, offset)
+  if tag != 0xa0 or start == end:
+    return None
+  _, _, cert_end = _ReadDerElement(data, start)
+  return bytes(data[start:cert_end])
+
+
+# Chunk types and attribute IDs of the binary XML format used by the compiled
+# AndroidManifest.xml, see frameworks/base/libs/androidfw/include/androidfw/
+# ResourceTypes.h.
+RES_STRING_POOL_TYPE = 0x0001
+RES_XML_TYPE = 0x0003
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+RES_STRING_POOL_UTF8_FLAG = 1 << 8
+RES_NO_INDEX = 0xffffffff
+
+ANDROID_NAMESPACE = "http://schemas.android.com/apk/res/android"
+ANDROID_ATTR_SHARED_USER_ID = 0x0101000b
+
+
+def _ReadStringPool(data, chunk_start, header_size):
+  (string_count, _, flags, strings_start) = struct.unpack_from(
+      "<IIII", data, chunk_start + 8)
+  offsets = struct.unpack_from(
+      "<%dI" % string_count, data, chunk_start + header_size)
+  strings_start += chunk_start
+  utf8 = flags & RES_STRING_POOL_UTF8_FLAG
+
+  strings = []
+  for offset in offsets:
+    pos = strings_start + offset
+    if utf8:
+      # The length in characters, followed by the length in bytes; each is
+      # encoded in one or two bytes.
+      for _ in range(2):
+        length = data[pos]
+        pos += 1
+        if length & 0x80:
+          length = ((length & 0x7f) << 8) | data[pos]
+          pos += 1
+      strings.append(bytes(data[pos:pos + length]).decode(
+          "utf-8", errors="replace"))
+    else:
+      (length,) = struct.unpack_from("<H", data, pos)
+      pos += 2
+      if length & 0x8000:
+        (low,) = struct.unpack_from("<H", data, pos)
+        length = ((length & 0x7fff) << 16) | low
+        pos += 2
+      strings.append(bytes(data[pos:pos + length * 2]).decode(
+          "utf-16-le", errors="replace"))
+  return strings
+
+
+def ParseBinaryManifest(data):
+  """Returns the string attributes of a compiled AndroidManifest.xml.
+
+  Returns a list of (name, value) tuples for the attributes that carry a raw
+  string value, in document order, with the names spelled as
+  `aapt2 dump xmltree` would (e.g. "package", "android:sharedUserId").
+  """
+  (chunk_type, header_size, _) = struct.unpack_from("<HHI", data, 0)
+  if chunk_type != RES_XML_TYPE:
+    raise ValueError("Not a binary XML file")
+
+  strings = []
+  resource_ids = ()
+  attributes = []
+  offset = header_size
+  while offset + 8 <= len(data):
+    (chunk_type, header_size, chunk_size) = struct.unpack_from(
+        "<HHI", data, offset)
+    if chunk_size < 8:
+      raise ValueError("Invalid chunk size %d" % chunk_size)
+    if chunk_type == RES_STRING_POOL_TYPE and not strings:
+      strings = _ReadStringPool(data, offset, header_size)
+    elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+      resource_ids = struct.unpack_from(
+          "<%dI" % ((chunk_size - header_size) // 4), data,
+          offset + header_size)
+    elif chunk_type == RES_XML_START_ELEMENT_TYPE:
+      ext = offset + header_size
+      (attribute_start, attribute_size, attribute_count) = struct.unpack_from(
+          "<HHH", data, ext + 8)
+      for i in range(attribute_count):
+        (ns, name, raw_value) = struct.unpack_from(
+            "<III", data, ext + attribute_start + i * attribute_size)
+        if raw_value == RES_NO_INDEX:
+          continue
+        if name < len(resource_ids) and (
+            resource_ids[name] == ANDROID_ATTR_SHARED_USER_ID):
+          attr_name = "android:sharedUserId"
+        elif ns != RES_NO_INDEX and strings[ns] == ANDROID_NAMESPACE:
+          attr_name = "android:" + strings[name]
+        else:
+          attr_name = strings[name]
+        attributes.append((attr_name, strings[raw_value]))
+    offset += chunk_size
+  return attributes
 
 
 class APK(object):
 
   def __init__(self, full_filename, filename):
+    """Loads the certs and manifest info of an APK.
+
+    Problems and cert subjects are only recorded on the object, so that it can
+    be loaded from a worker thread. Call Publish() to report them.
+
+    Args:
+      full_filename: The path of the APK to inspect with the external tools,
+          or None to leave it to ReadFromData().
+      filename: The name of the APK as displayed in the reports.
+    """
     self.filename = filename
     self.cert_digests = frozenset()
     self.shared_uid = None
     self.package = None
+    # Maps the cert digests to their subjects (or None, to be read from the
+    # DER certificate in cert_data upon Publish()).
+    self.cert_subjects = {}
+    self.cert_data = {}
+    self.problems = []
 
-    Push(filename+":")
-    try:
+    if full_filename:
       self.RecordCerts(full_filename)
       self.ReadManifest(full_filename)
+
+  def AddProblem(self, msg):
+    self.problems.append(msg)
+
+  def Publish(self):
+    """Adds the certs to ALL_CERTS and reports the problems found."""
+    for digest, subject in sorted(self.cert_subjects.items()):
+      if subject is None and ALL_CERTS.Get(digest) is None:
+        subject = GetCertSubject(self.cert_data[digest])
+      ALL_CERTS.Add(digest, subject)
+
+    Push(self.filename + ":")
+    try:
+      for msg in self.problems:
+        AddProblem(msg)
     finally:
       Pop()
 
+  def ReadFromData(self, data):
+    """Reads the certs and manifest info in-process from the APK content.
+
+    Returns False if the APK can't be handled in-process, in which case the
+    external tools should be used instead."""
+    try:
+      certs = ReadSigningBlockCerts(data)
+      with zipfile.ZipFile(io.BytesIO(data)) as apk:
+        if certs is None:
+          certs = []
+          for info in apk.infolist():
+            if (info.filename.startswith("META-INF/") and
+                    info.filename.endswith((".DSA", ".RSA"))):
+              cert = CertFromPKCS7InProcess(apk.read(info.filename))
+              if cert is None:
+                return False
+              certs.append(cert)
+        attributes = ParseBinaryManifest(apk.read("AndroidManifest.xml"))
+    except (ValueError, IndexError, KeyError, struct.error,
+            zipfile.BadZipFile):
+      return False
+
+    if not certs:
+      self.AddProblem("No signature found")
+    else:
+      for cert in certs:
+        digest = common.sha1(cert).hexdigest()
+        self.cert_subjects.setdefault(digest, None)
+        self.cert_data[digest] = cert
+      self.cert_digests = frozenset(self.cert_subjects)
+    self.SetManifestAttributes(attributes, self.filename)
+    return True
+
   def ReadCertsDeprecated(self, full_filename):
     print("reading certs in deprecated way for {}".format(full_filename))
     cert_digests = set()
@@ -194,15 +518,15 @@ class APK(object):
         if (filename.startswith("META-INF/") and
                 info.filename.endswith((".DSA", ".RSA"))):
           pkcs7 = apk.read(filename)
-          cert = CertFromPKCS7(pkcs7, filename)
+          cert = CertFromPKCS7(pkcs7, filename, self.AddProblem)
           if not cert:
             continue
           cert_sha1 = common.sha1(cert).hexdigest()
           cert_subject = GetCertSubject(cert)
-          ALL_CERTS.Add(cert_sha1, cert_subject)
+          self.cert_subjects[cert_sha1] = cert_subject
           cert_digests.add(cert_sha1)
     if not cert_digests:
-      AddProblem("No signature found")
+      self.AddProblem("No signature found")
       return
     self.cert_digests = frozenset(cert_digests)
 
@@ -237,7 +561,7 @@ class APK(object):
       else:
         certs_info.update({signer: {key.strip(): val.strip()}})
     if not certs_info:
-      AddProblem("Failed to parse cert info")
+      self.AddProblem("Failed to parse cert info")
       return
 
     cert_digests = set()
@@ -245,9 +569,9 @@ class APK(object):
       subject = props.get("certificate DN")
       digest = props.get("certificate SHA-1 digest")
       if not subject or not digest:
-        AddProblem("Failed to parse cert subject or digest")
+        self.AddProblem("Failed to parse cert subject or digest")
         return
-      ALL_CERTS.Add(digest, subject)
+      self.cert_subjects[digest] = subject
       cert_digests.add(digest)
     self.cert_digests = frozenset(cert_digests)
 
@@ -257,28 +581,84 @@ class APK(object):
                    stdout=subprocess.PIPE)
     manifest, err = p.communicate()
     if err:
-      AddProblem("failed to read manifest " + full_filename)
+      self.AddProblem("failed to read manifest " + full_filename)
       return
 
-    self.shared_uid = None
-    self.package = None
-
+    attributes = []
     for line in manifest.split("\n"):
       line = line.strip()
       m = re.search(r'A: (\S*?)(?:\(0x[0-9a-f]+\))?="(.*?)" \(Raw', line)
       if m:
-        name = m.group(1)
-        if name == "android:sharedUserId":
-          if self.shared_uid is not None:
-            AddProblem("multiple sharedUserId declarations " + full_filename)
-          self.shared_uid = m.group(2)
-        elif name == "package":
-          if self.package is not None:
-            AddProblem("multiple package declarations " + full_filename)
-          self.package = m.group(2)
+        attributes.append((m.group(1), m.group(2)))
+    self.SetManifestAttributes(attributes, full_filename)
+
+  def SetManifestAttributes(self, attributes, full_filename):
+    """Records the package and sharedUserId from the manifest attributes."""
+    self.shared_uid = None
+    self.package = None
+
+    for name, value in attributes:
+      if name == "android:sharedUserId":
+        if self.shared_uid is not None:
+          self.AddProblem("multiple sharedUserId declarations " + full_filename)
+        self.shared_uid = value
+      elif name == "package":
+        if self.package is not None:
+          self.AddProblem("multiple package declarations " + full_filename)
+        self.package = value
 
     if self.package is None:
-      AddProblem("no package declaration " + full_filename)
+      self.AddProblem("no package declaration " + full_filename)
+
+
+# The loaded APKs, keyed by the SHA-256 digest of their content. This avoids
+# parsing the same APK again when comparing against another target_files.
+APK_CACHE = {}
+APK_CACHE_LOCK = threading.Lock()
+
+
+def LoadApk(input_zip, entry, filename, compressed_extension=None):
+  """Loads an APK from an entry of the input target_files.
+
+  The APK is parsed in-process from memory whenever possible. It's only
+  extracted to a temp file for the external tools as a fallback.
+
+  Args:
+    input_zip: The input target_files ZipFile (already open).
+    entry: The ZipInfo of the (possibly compressed) APK entry.
+    filename: The name of the APK as displayed in the reports.
+    compressed_extension: The extension of compressed APKs, if any.
+
+  Returns:
+    An APK object, yet to be published.
+  """
+  data = input_zip.read(entry)
+  if compressed_extension and entry.filename.endswith(compressed_extension):
+    data = gzip.decompress(data)
+
+  digest = hashlib.sha256(data).hexdigest()
+  with APK_CACHE_LOCK:
+    cached = APK_CACHE.get(digest)
+  if cached:
+    apk = copy.copy(cached)
+    apk.filename = filename
+    return apk
+
+  apk = APK(None, filename)
+  if OPTIONS.use_external_tools or not apk.ReadFromData(data):
+    full_filename = common.MakeTempFile(
+        prefix="apk-", suffix=os.path.splitext(filename)[1])
+    with open(full_filename, "wb") as f:
+      f.write(data)
+    del data
+    try:
+      apk = APK(full_filename, filename)
+    finally:
+      os.remove(full_filename)
+
+  with APK_CACHE_LOCK:
+    APK_CACHE[digest] = apk
+  return apk
 
 
 class TargetFiles(object):
@@ -293,45 +673,47 @@ class TargetFiles(object):
     # First read the APK certs file to figure out whether there are compressed
     # APKs in the archive. If we do have compressed APKs in the archive, then we
     # must decompress them individually before we perform any analysis.
+    apk_extensions = ('.apk', '.apex')
 
-    # This is the list of wildcards of files we extract from |filename|.
-    apk_extensions = ['*.apk', '*.apex']
-
-    with zipfile.ZipFile(filename, "r") as input_zip:
+    with zipfile.ZipFile(filename, "r", allowZip64=True) as input_zip:
       self.certmap, compressed_extension = common.ReadApkCerts(input_zip)
-    if compressed_extension:
-      apk_extensions.append('*.apk' + compressed_extension)
-
-    d = common.UnzipTemp(filename, apk_extensions)
+      if compressed_extension:
+        apk_extensions += ('.apk' + compressed_extension,)
+
+      entries = [info for info in input_zip.infolist()
+                 if info.filename.endswith(apk_extensions)]
+      # See common.UnzipToDir() for the zip64 header offsets (b/283033491).
+      for entry in entries:
+        if entry.header_offset == 0xFFFFFFFF:
+          if len(entry.extra) % 8 == 0:
+            entry.header_offset = int.from_bytes(entry.extra[-12:-4], "little")
+          else:
+            entry.header_offset = int.from_bytes(entry.extra[-8:], "little")
+
+      # Load the APKs with a bounded pool, which also bounds the number of
+      # APKs held in memory at once.
+      with concurrent.futures.ThreadPoolExecutor(
+          max_workers=OPTIONS.worker_threads) as executor:
+        futures = []
+        for entry in entries:
+          displayname = entry.filename
+          if compressed_extension and displayname.endswith(
+              compressed_extension):
+            displayname = displayname[:-len(compressed_extension)]
+          futures.append(executor.submit(
+              LoadApk, input_zip, entry, displayname, compressed_extension))
+        loaded = [future.result() for future in futures]
+
+    # Report in a deterministic order, regardless of the loading order.
     self.apks = {}
     self.apks_by_basename = {}
-    for dirpath, _, filenames in os.walk(d):
-      for fn in filenames:
-        # Decompress compressed APKs before we begin processing them.
-        if compressed_extension and fn.endswith(compressed_extension):
-          # First strip the compressed extension from the file.
-          uncompressed_fn = fn[:-len(compressed_extension)]
-
-          # Decompress the compressed file to the output file.
-          common.Gunzip(os.path.join(dirpath, fn),
-                        os.path.join(dirpath, uncompressed_fn))
-
-          # Finally, delete the compressed file and use the uncompressed file
-          # for further processing. Note that the deletion is not strictly
-          # required, but is done here to ensure that we're not using too much
-          # space in the temporary directory.
-          os.remove(os.path.join(dirpath, fn))
-          fn = uncompressed_fn
-
-        if fn.endswith(('.apk', '.apex')):
-          fullname = os.path.join(dirpath, fn)
-          displayname = fullname[len(d)+1:]
-          apk = APK(fullname, displayname)
-          self.apks[apk.filename] = apk
-          self.apks_by_basename[os.path.basename(apk.filename)] = apk
-          if apk.package:
-            self.max_pkg_len = max(self.max_pkg_len, len(apk.package))
-          self.max_fn_len = max(self.max_fn_len, len(apk.filename))
+    for apk in sorted(loaded, key=lambda apk: apk.filename):
+      apk.Publish()
+      self.apks[apk.filename] = apk
+      self.apks_by_basename[os.path.basename(apk.filename)] = apk
+      if apk.package:
+        self.max_pkg_len = max(self.max_pkg_len, len(apk.package))
+      self.max_fn_len = max(self.max_fn_len, len(apk.filename))
 
   def CheckSharedUids(self):
     """Look for any instances where packages signed with different
@@ -466,6 +848,10 @@ def main(argv):
       OPTIONS.local_cert_dirs = [i.strip() for i in a.split(",")]
     elif o in ("-t", "--text"):
       OPTIONS.text = True
+    elif o == "--worker_threads":
+      OPTIONS.worker_threads = int(a)
+    elif o == "--use_external_tools":
+      OPTIONS.use_external_tools = True
     else:
       return False
     return True
@@ -473,7 +859,9 @@ def main(argv):
   args = common.ParseOptions(argv, __doc__,
                              extra_opts="c:l:t",
                              extra_long_opts=["compare_with=",
-                                              "local_cert_dirs="],
+                                              "local_cert_dirs=",
+                                              "worker_threads=",
+                                              "use_external_tools"],
                              extra_option_handler=option_handler)
 
   if len(args) != 1:
@@ -47,6 +47,7 @@ from hashlib import sha1, sha256
 import images
 import sparse_img
 from blockimgdiff import BlockImageDiff
+from rangelib import RangeSet
 
 logger = logging.getLogger(__name__)
 
@@ -96,6 +97,8 @@ class Options(object):
     self.source_info_dict = None
     self.target_info_dict = None
     self.worker_threads = None
+    # Where to persist the intermediate results of the OTA generation.
+    self.checkpoint_dir = None
     # Stash size cannot exceed cache_size * threshold.
     self.cache_size = None
     self.stash_threshold = 0.8
@@ -3379,7 +3382,7 @@ def ComputeDifferences(diffs):
 
 class BlockDifference(object):
   def __init__(self, partition, tgt, src=None, check_first_block=False,
-               version=None, disable_imgdiff=False):
+               version=None, disable_imgdiff=False, worker_budget=None):
     self.tgt = tgt
     self.src = src
     self.partition = partition
@@ -3393,14 +3396,41 @@ class BlockDifference(object):
     assert version >= 3
     self.version = version
 
-    b = BlockImageDiff(tgt, src, threads=OPTIONS.worker_threads,
-                       version=self.version,
-                       disable_imgdiff=self.disable_imgdiff)
+    # ota_checkpoint imports this module, so it's only imported when needed.
+    import ota_checkpoint
+
     self.path = os.path.join(MakeTempDir(), partition)
-    b.Compute(self.path)
-    self._required_cache = b.max_stashed_size
-    self.touched_src_ranges = b.touched_src_ranges
-    self.touched_src_sha1 = b.touched_src_sha1
+    checkpoint = ota_checkpoint.GetCheckpoint()
+    metadata = None
+    if checkpoint:
+      checkpoint_key = self._GetCheckpointKey()
+      metadata = checkpoint.LoadTransfers(checkpoint_key, self.path)
+
+    if metadata:
+      logger.info("Reusing the saved block difference for %s", partition)
+      self._required_cache = metadata["max_stashed_size"]
+      self.touched_src_ranges = RangeSet()
+      if metadata["touched_src_ranges"]:
+        self.touched_src_ranges = RangeSet.parse_raw(
+            metadata["touched_src_ranges"])
+      self.touched_src_sha1 = metadata["touched_src_sha1"]
+    else:
+      b = BlockImageDiff(tgt, src, threads=OPTIONS.worker_threads,
+                         version=self.version,
+                         disable_imgdiff=self.disable_imgdiff,
+                         checkpoint=checkpoint,
+                         worker_budget=worker_budget)
+      b.Compute(self.path)
+      self._required_cache = b.max_stashed_size
+      self.touched_src_ranges = b.touched_src_ranges
+      self.touched_src_sha1 = b.touched_src_sha1
+      if checkpoint:
+        checkpoint.SaveTransfers(checkpoint_key, self.path, {
+            "max_stashed_size": self._required_cache,
+            "touched_src_ranges": (self.touched_src_ranges.to_string_raw()
+                                   if self.touched_src_ranges else ""),
+            "touched_src_sha1": self.touched_src_sha1,
+        })
 
     # On devices with dynamic partitions, for new partitions,
     # src is None but OPTIONS.source_info_dict is not.
@@ -3437,6 +3467,37 @@ class BlockDifference(object):
   def required_cache(self):
     return self._required_cache
 
+  def _GetCheckpointKey(self):
+    """Returns the key of the BlockImageDiff outputs in the checkpoint.
+
+    It covers the content and the layout of both images, as well as the
+    options that affect the outputs.
+    """
+    def ImageInfo(image):
+      if image is None:
+        return None
+      return {
+          "sha1": image.TotalSha1(include_clobbered_blocks=True),
+          "total_blocks": image.total_blocks,
+          "care_map": str(image.care_map),
+          "clobbered_blocks": str(image.clobbered_blocks),
+          "extended": str(image.extended),
+          "file_map": sorted(
+              (name, str(ranges), sorted(ranges.extra))
+              for name, ranges in image.file_map.items()),
+      }
+
+    key = json.dumps({
+        "partition": self.partition,
+        "tgt": ImageInfo(self.tgt),
+        "src": ImageInfo(self.src),
+        "version": self.version,
+        "disable_imgdiff": self.disable_imgdiff,
+        "cache_size": OPTIONS.cache_size,
+        "stash_threshold": OPTIONS.stash_threshold,
+    }, sort_keys=True)
+    return sha256(key.encode()).hexdigest()
+
   def WriteScript(self, script, output_zip, progress=None,
                   write_verify_script=False):
     if not self.src:
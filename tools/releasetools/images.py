@@ -11,8 +11,8 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific
 
+import mmap
 import os
-import threading
 from hashlib import sha1
 
 from rangelib import RangeSet
@@ -149,6 +149,9 @@ class DataImage(Image):
 class FileImage(Image):
   """An image wrapped around a raw image file."""
 
+  # Number of blocks read at once when scanning or reading the image.
+  WINDOW_BLOCKS = 256
+
   def __init__(self, path):
     self.path = path
     self.blocksize = 4096
@@ -157,27 +160,14 @@ class FileImage(Image):
 
     if self._file_size % self.blocksize != 0:
       raise ValueError("Size of file %s must be multiple of %d bytes, but is %d"
-                       % self.path, self.blocksize, self._file_size)
+                       % (self.path, self.blocksize, self._file_size))
 
     self.total_blocks = self._file_size // self.blocksize
     self.care_map = RangeSet(data=(0, self.total_blocks))
     self.clobbered_blocks = RangeSet()
     self.extended = RangeSet()
 
-    self.generator_lock = threading.Lock()
-
-    zero_blocks = []
-    nonzero_blocks = []
-    reference = '\0' * self.blocksize
-
-    for i in range(self.total_blocks):
-      d = self._file.read(self.blocksize)
-      if d == reference:
-        zero_blocks.append(i)
-        zero_blocks.append(i+1)
-      else:
-        nonzero_blocks.append(i)
-        nonzero_blocks.append(i+1)
+    zero_blocks, nonzero_blocks = self._ScanZeroBlocks()
 
     assert zero_blocks or nonzero_blocks
 
@@ -190,14 +180,61 @@ class FileImage(Image):
   def __del__(self):
     self._file.close()
 
+  def _ScanZeroBlocks(self):
+    """Splits the image into runs of zero and nonzero blocks.
+
+    The image is mapped and compared a window at a time, so that all-zero (or
+    all-nonzero) windows cost a single comparison.
+
+    Returns:
+      A (zero_blocks, nonzero_blocks) tuple of flat lists of [start, end)
+      block pairs, suitable to construct RangeSets from.
+    """
+    runs = ([], [])
+    if self.total_blocks == 0:
+      return runs
+
+    blocksize = self.blocksize
+    zero_block = b'\0' * blocksize
+    zero_window = b'\0' * (blocksize * self.WINDOW_BLOCKS)
+
+    # The kind (0 for zero, 1 for nonzero) and start of the current run.
+    run_kind = None
+    run_start = 0
+
+    def EndRun(kind, block):
+      # Closes the current run at |block| if the kind changes there.
+      nonlocal run_kind, run_start
+      if kind != run_kind:
+        if run_kind is not None:
+          runs[run_kind].extend((run_start, block))
+        run_kind, run_start = kind, block
+
+    with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+      for window_start in range(0, self.total_blocks, self.WINDOW_BLOCKS):
+        window_end = min(window_start + self.WINDOW_BLOCKS, self.total_blocks)
+        window = mm[window_start * blocksize:window_end * blocksize]
+        if window == zero_window[:len(window)]:
+          EndRun(0, window_start)
+          continue
+        for i in range(window_end - window_start):
+          block = window[i * blocksize:(i + 1) * blocksize]
+          EndRun(0 if block == zero_block else 1, window_start + i)
+
+    runs[run_kind].extend((run_start, self.total_blocks))
+    return runs
+
   def _GetRangeData(self, ranges):
-    # Use a lock to protect the generator so that we will not run two
-    # instances of this generator on the same object simultaneously.
-    with self.generator_lock:
-      for s, e in ranges:
-        self._file.seek(s * self.blocksize)
-        for _ in range(s, e):
-          yield self._file.read(self.blocksize)
+    # Use positional reads that don't share the file offset, so that the data
+    # can be read from multiple threads simultaneously.
+    fd = self._file.fileno()
+    for s, e in ranges:
+      for window_start in range(s, e, self.WINDOW_BLOCKS):
+        window_end = min(window_start + self.WINDOW_BLOCKS, e)
+        data = os.pread(fd, (window_end - window_start) * self.blocksize,
+                        window_start * self.blocksize)
+        for i in range(0, len(data), self.blocksize):
+          yield data[i:i + self.blocksize]
 
   def RangeSha1(self, ranges):
     h = sha1()
@@ -13,12 +13,15 @@
 # limitations under the License.
 
 import collections
+import concurrent.futures
 import logging
 import os
+import threading
 import zipfile
 
 import common
 import edify_generator
+import ota_checkpoint
 import verity_utils
 from check_target_files_vintf import CheckVintfIfTrebleEnabled, HasPartition
 from common import OPTIONS
@@ -32,11 +35,19 @@ def GetBlockDifferences(target_zip, source_zip, target_info, source_info,
                         device_specific):
   """Returns a ordered dict of block differences with partition name as key."""
 
-  def GetIncrementalBlockDifferenceForPartition(name):
-    if not HasPartition(source_zip, name):
-      raise RuntimeError(
-          "can't generate incremental that adds {}".format(name))
+  # The partitions are computed concurrently, and share one budget of worker
+  # threads for computing the patches.
+  worker_threads = OPTIONS.worker_threads or 1
+  worker_budget = threading.BoundedSemaphore(worker_threads)
 
+  def GetFullBlockDifferenceForPartition(name):
+    tgt = common.GetUserImage(name, OPTIONS.input_tmp, target_zip,
+                              info_dict=target_info,
+                              reset_file_map=True)
+    return common.BlockDifference(name, tgt, src=None,
+                                  worker_budget=worker_budget)
+
+  def GetIncrementalBlockDifferenceForPartition(name):
     partition_src = common.GetUserImage(name, OPTIONS.source_tmp, source_zip,
                                         info_dict=source_info,
                                         allow_shared_blocks=allow_shared_blocks)
@@ -54,7 +65,8 @@ def GetBlockDifferences(target_zip, source_zip, target_info, source_info,
     return common.BlockDifference(name, partition_tgt, partition_src,
                                   check_first_block,
                                   version=blockimgdiff_version,
-                                  disable_imgdiff=True)
+                                  disable_imgdiff=True,
+                                  worker_budget=worker_budget)
 
   if source_zip:
     # See notes in common.GetUserImage()
@@ -65,23 +77,30 @@ def GetBlockDifferences(target_zip, source_zip, target_info, source_info,
             "blockimgdiff_versions", "1").split(","))
     assert blockimgdiff_version >= 3
 
-  block_diff_dict = collections.OrderedDict()
   partition_names = ["system", "vendor", "product", "odm", "system_ext",
                      "vendor_dlkm", "odm_dlkm", "system_dlkm"]
-  for partition in partition_names:
-    if not HasPartition(target_zip, partition):
-      continue
-    # Full OTA update.
-    if not source_zip:
-      tgt = common.GetUserImage(partition, OPTIONS.input_tmp, target_zip,
-                                info_dict=target_info,
-                                reset_file_map=True)
-      block_diff_dict[partition] = common.BlockDifference(partition, tgt,
-                                                          src=None)
+  partition_names = [partition for partition in partition_names
+                     if HasPartition(target_zip, partition)]
+  if source_zip:
     # Incremental OTA update.
-    else:
-      block_diff_dict[partition] = GetIncrementalBlockDifferenceForPartition(
-          partition)
+    for partition in partition_names:
+      if not HasPartition(source_zip, partition):
+        raise RuntimeError(
+            "can't generate incremental that adds {}".format(partition))
+    get_block_difference = GetIncrementalBlockDifferenceForPartition
+  else:
+    # Full OTA update.
+    get_block_difference = GetFullBlockDifferenceForPartition
+
+  # The results are collected in the order of partition_names, regardless of
+  # the order in which they finish, so that the generated script is stable.
+  block_diff_dict = collections.OrderedDict()
+  with concurrent.futures.ThreadPoolExecutor(
+      max_workers=min(len(partition_names), worker_threads) or 1) as executor:
+    futures = [executor.submit(get_block_difference, partition)
+               for partition in partition_names]
+    for partition, future in zip(partition_names, futures):
+      block_diff_dict[partition] = future.result()
   assert "system" in block_diff_dict
 
   # Get the block diffs from the device specific script. If there is a
@@ -538,6 +557,15 @@ endif;
                    needed_property_files, package_key=OPTIONS.package_key)
 
 
+def _UnzipTargetFiles(target_file):
+  """Unzips the target-files, reusing the checkpointed extraction if any."""
+  checkpoint = ota_checkpoint.GetCheckpoint()
+  # The "foo.zip+bar.zip" form isn't checkpointed.
+  if checkpoint and os.path.isfile(target_file):
+    return checkpoint.ExtractTargetFiles(target_file, UNZIP_PATTERN)
+  return common.UnzipTemp(target_file, UNZIP_PATTERN)
+
+
 def GenerateNonAbOtaPackage(target_file, output_file, source_file=None):
   """Generates a non-A/B OTA package."""
   # Check the loaded info dicts first.
@@ -560,7 +588,7 @@ def GenerateNonAbOtaPackage(target_file, output_file, source_file=None):
   else:
     if not os.path.isdir(target_file):
       logger.info("unzipping target target-files...")
-      OPTIONS.input_tmp = common.UnzipTemp(target_file, UNZIP_PATTERN)
+      OPTIONS.input_tmp = _UnzipTargetFiles(target_file)
     else:
       OPTIONS.input_tmp = target_file
       tmpfile = common.MakeTempFile(suffix=".zip")
@@ -598,8 +626,7 @@ def GenerateNonAbOtaPackage(target_file, output_file, source_file=None):
   # Generate an incremental OTA.
   else:
     logger.info("unzipping source target-files...")
-    OPTIONS.source_tmp = common.UnzipTemp(
-        OPTIONS.incremental_source, UNZIP_PATTERN)
+    OPTIONS.source_tmp = _UnzipTargetFiles(OPTIONS.incremental_source)
     with zipfile.ZipFile(target_file) as input_zip, \
             zipfile.ZipFile(source_file) as source_zip:
       WriteBlockIncrementalOTAPackage(
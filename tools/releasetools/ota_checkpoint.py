@@ -0,0 +1,249 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Persists the intermediate results of the OTA generation.
+
+A checkpoint directory holds the work that is expensive to redo, so that an
+interrupted ota_from_target_files run can be resumed by running it again with
+the same inputs and the same --checkpoint_dir:
+
+  extracted/<fingerprint>/  The extracted target-files, for each input.
+  transfers/<key>/          The BlockImageDiff outputs for each partition.
+  patches/<key>             The bsdiff/imgdiff patches, for each pair of
+                            source and target data.
+
+Entries are keyed by the digests of their inputs, and written atomically along
+with the digests of their content, which are verified before reuse. Invalid
+entries are discarded and computed again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+
+import common
+
+logger = logging.getLogger(__name__)
+
+# The name of the file that describes a completed directory entry.
+MANIFEST_NAME = "checkpoint.json"
+
+# The outputs of BlockImageDiff.Compute().
+TRANSFERS_SUFFIXES = (".transfer.list", ".new.dat", ".patch.dat")
+
+
+def _Sha256File(path):
+  h = hashlib.sha256()
+  with open(path, "rb") as f:
+    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+      h.update(chunk)
+  return h.hexdigest()
+
+
+def _Sha256Json(value):
+  return hashlib.sha256(
+      json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def _ReplaceDir(src, dst):
+  """Moves the directory |src| to |dst|, replacing any existing one."""
+  if os.path.exists(dst):
+    shutil.rmtree(dst)
+  os.rename(src, dst)
+
+
+def InputFingerprint(path):
+  """Returns a digest that identifies a target-files zip or directory.
+
+  For zips, the digest covers the names, sizes and CRCs of all the entries, so
+  it's computed from the central directory without reading the content.
+  """
+  path = os.path.abspath(path)
+  if os.path.isdir(path):
+    entries = []
+    for root, _, files in os.walk(path):
+      for name in sorted(files):
+        st = os.stat(os.path.join(root, name))
+        entries.append((os.path.relpath(os.path.join(root, name), path),
+                        st.st_size, st.st_mtime_ns))
+    return _Sha256Json(sorted(entries))
+
+  with zipfile.ZipFile(path, allowZip64=True) as input_zip:
+    return _Sha256Json([(info.filename, info.file_size, info.CRC)
+                        for info in input_zip.infolist()])
+
+
+class Checkpoint(object):
+  """A checkpoint directory, see the module docstring for the layout."""
+
+  def __init__(self, directory):
+    self.directory = os.path.abspath(directory)
+    for subdir in ("extracted", "transfers", "patches"):
+      os.makedirs(os.path.join(self.directory, subdir), exist_ok=True)
+
+  def _MakeStagingDir(self, subdir):
+    # Stage the entries within the checkpoint directory, so that they can be
+    # renamed into place atomically.
+    return tempfile.mkdtemp(prefix=".staging-",
+                            dir=os.path.join(self.directory, subdir))
+
+  @staticmethod
+  def _WriteManifest(directory, metadata):
+    """Records the files in |directory| along with |metadata|."""
+    files = {}
+    for root, _, filenames in os.walk(directory):
+      for name in filenames:
+        path = os.path.join(root, name)
+        files[os.path.relpath(path, directory)] = {
+            "size": os.path.getsize(path),
+            "sha256": _Sha256File(path),
+        }
+    with open(os.path.join(directory, MANIFEST_NAME), "w") as f:
+      json.dump({"files": files, "metadata": metadata}, f, sort_keys=True)
+
+  @staticmethod
+  def _ReadManifest(directory, verify_content):
+    """Returns the metadata of a completed entry, or None if it's invalid.
+
+    The files are always checked for presence and size; their digests are only
+    verified if |verify_content| is True.
+    """
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+      return None
+    try:
+      with open(manifest_path) as f:
+        manifest = json.load(f)
+      for name, info in manifest["files"].items():
+        path = os.path.join(directory, name)
+        if (not os.path.isfile(path) or
+            os.path.getsize(path) != info["size"]):
+          logger.warning("Checkpoint file %s is missing or truncated", path)
+          return None
+        if verify_content and _Sha256File(path) != info["sha256"]:
+          logger.warning("Checkpoint file %s is corrupted", path)
+          return None
+      return manifest["metadata"]
+    except (ValueError, KeyError, OSError):
+      logger.warning("Invalid checkpoint manifest %s", manifest_path)
+      return None
+
+  def ExtractTargetFiles(self, target_file, patterns):
+    """Extracts |target_file|, or reuses a previous extraction.
+
+    Args:
+      target_file: The target-files zip.
+      patterns: The patterns to extract, as in common.UnzipTemp().
+
+    Returns:
+      The directory with the extracted files. It's owned by the checkpoint
+      and must not be modified.
+    """
+    fingerprint = _Sha256Json([InputFingerprint(target_file), patterns])
+    extracted_dir = os.path.join(self.directory, "extracted", fingerprint)
+    # The extracted images are large, so only their sizes are checked upon
+    # reuse. Their content was checked against the zip CRCs on extraction.
+    if self._ReadManifest(extracted_dir, verify_content=False) is not None:
+      logger.info("Reusing the extracted %s from %s", target_file,
+                  extracted_dir)
+      return extracted_dir
+
+    logger.info("Extracting %s to %s", target_file, extracted_dir)
+    staging_dir = self._MakeStagingDir("extracted")
+    common.UnzipToDir(target_file, staging_dir, patterns)
+    self._WriteManifest(staging_dir, {"input": os.path.abspath(target_file)})
+    _ReplaceDir(staging_dir, extracted_dir)
+    return extracted_dir
+
+  def LoadTransfers(self, key, prefix):
+    """Restores the saved BlockImageDiff outputs for |key| to |prefix|.
+
+    The outputs are linked (or copied) to <prefix>.transfer.list,
+    <prefix>.new.dat and <prefix>.patch.dat. They must not be modified, since
+    the links share their content with the saved outputs.
+
+    Returns:
+      The metadata saved along with the outputs, or None if there are no valid
+      outputs for |key|.
+    """
+    transfers_dir = os.path.join(self.directory, "transfers", key)
+    metadata = self._ReadManifest(transfers_dir, verify_content=True)
+    if metadata is None:
+      return None
+    for suffix in TRANSFERS_SUFFIXES:
+      saved = os.path.join(transfers_dir, "transfers" + suffix)
+      try:
+        os.link(saved, prefix + suffix)
+      except OSError:
+        shutil.copyfile(saved, prefix + suffix)
+    return metadata
+
+  def SaveTransfers(self, key, prefix, metadata):
+    """Saves the BlockImageDiff outputs at |prefix| for |key|."""
+    staging_dir = self._MakeStagingDir("transfers")
+    for suffix in TRANSFERS_SUFFIXES:
+      shutil.copyfile(prefix + suffix,
+                      os.path.join(staging_dir, "transfers" + suffix))
+    self._WriteManifest(staging_dir, metadata)
+    _ReplaceDir(staging_dir, os.path.join(self.directory, "transfers", key))
+
+  def _PatchPath(self, key):
+    return os.path.join(self.directory, "patches", key)
+
+  def LoadPatch(self, key):
+    """Returns the content of the saved patch for |key|, or None."""
+    path = self._PatchPath(key)
+    try:
+      with open(path + ".sha256") as f:
+        digest = f.read().strip()
+      with open(path, "rb") as f:
+        content = f.read()
+    except OSError:
+      return None
+    if hashlib.sha256(content).hexdigest() != digest:
+      logger.warning("Checkpoint patch %s is corrupted", path)
+      return None
+    return content
+
+  def SavePatch(self, key, content):
+    """Saves a patch. Safe to call from multiple threads."""
+    path = self._PatchPath(key)
+    # The digest is written last, which marks the patch as complete.
+    for target, data, mode in (
+        (path, content, "wb"),
+        (path + ".sha256", hashlib.sha256(content).hexdigest(), "w")):
+      fd, staging = tempfile.mkstemp(prefix=".staging-",
+                                     dir=os.path.dirname(path))
+      with os.fdopen(fd, mode) as f:
+        f.write(data)
+      os.replace(staging, target)
+
+
+_checkpoint = None
+
+
+def GetCheckpoint():
+  """Returns the Checkpoint for OPTIONS.checkpoint_dir, or None if not set."""
+  global _checkpoint
+  checkpoint_dir = common.OPTIONS.checkpoint_dir
+  if not checkpoint_dir:
+    return None
+  if (_checkpoint is None or
+      _checkpoint.directory != os.path.abspath(checkpoint_dir)):
+    _checkpoint = Checkpoint(checkpoint_dir)
+  return _checkpoint
@@ -139,6 +139,12 @@ Non-A/B OTA specific options
       Verify the checksums of the updated system and vendor (if any) partitions.
       Non-A/B incremental OTAs only.
 
+  --checkpoint_dir <dir>
+      Persist the extracted target-files, the per-partition transfer lists and
+      the computed patches in the given directory. Rerunning with the same
+      inputs and checkpoint dir resumes an interrupted run instead of starting
+      over.
+
   -2  (--two_step)
       Generate a 'two-step' OTA package, where recovery is updated first, so
       that any changes made to the system partition are done using the new
@@ -856,11 +862,39 @@ def SupportsMainlineGkiUpdates(target_file):
   return pattern.search(output) is not None
 
 
-def ExtractOrCopyTargetFiles(target_file):
+def ExtractOrCopyTargetFiles(target_file, partitions=None):
   if os.path.isdir(target_file):
-    return CopyTargetFilesDir(target_file)
+    return CopyTargetFilesDir(target_file, partitions)
   else:
-    return ExtractTargetFiles(target_file)
+    return ExtractTargetFiles(target_file, partitions)
+
+
+def GetPayloadPartitions(info_dict, excluded_partitions=()):
+  """Returns the partitions whose images the A/B payload generation reads.
+
+  Only these images need to be extracted from the target files; the others
+  would be dropped (e.g. by --partial) before being read.
+
+  Args:
+    info_dict: The info dict of the target files.
+    excluded_partitions: The partitions to leave out, e.g. the source
+        partitions that are updated with full OTA.
+
+  Returns:
+    A set of partition names, or None if all the images may be needed.
+  """
+  ab_partitions = [partition for partition in info_dict.get("ab_partitions", [])
+                   if partition]
+  if not ab_partitions:
+    return None
+  partitions = set(ab_partitions)
+  if OPTIONS.partial:
+    partitions &= set(OPTIONS.partial)
+  partitions -= set(excluded_partitions)
+  # The custom images are renamed to their partition names later.
+  partitions.update(os.path.splitext(custom_image)[0]
+                    for custom_image in OPTIONS.custom_images.values())
+  return partitions
 
 
 def ValidateCompressionParam(target_info):
@@ -883,9 +917,17 @@ def GenerateAbOtaPackage(target_file, output_file, source_file=None):
   ValidateCompressionParam(target_info)
   vabc_compression_param = target_info.vabc_compression_param
 
-  target_file = ExtractOrCopyTargetFiles(target_file)
+  # Only extract the images that the payload generation needs. The secondary
+  # payload is generated from all the target images.
+  target_partitions = None
+  if not OPTIONS.include_secondary:
+    target_partitions = GetPayloadPartitions(OPTIONS.info_dict)
+  target_file = ExtractOrCopyTargetFiles(target_file, target_partitions)
   if source_file is not None:
-    source_file = ExtractOrCopyTargetFiles(source_file)
+    source_file = ExtractOrCopyTargetFiles(
+        source_file,
+        GetPayloadPartitions(OPTIONS.source_info_dict,
+                             OPTIONS.full_ota_partitions or ()))
   # Stage the output zip package for package signing.
   if not OPTIONS.no_signing:
     staging_file = common.MakeTempFile(suffix='.zip')
@@ -1247,6 +1289,8 @@ def main(argv):
       OPTIONS.include_secondary = True
     elif o == "--no_signing":
       OPTIONS.no_signing = True
+    elif o == "--checkpoint_dir":
+      OPTIONS.checkpoint_dir = a
     elif o == "--verify":
       OPTIONS.verify = True
     elif o == "--block":
@@ -1368,6 +1412,7 @@ def main(argv):
                                  "oem_settings=",
                                  "oem_no_mount",
                                  "verify",
+                                 "checkpoint_dir=",
                                  "stash_threshold=",
                                  "log_diff=",
                                  "extracted_input_target_files=",
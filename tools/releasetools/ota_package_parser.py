@@ -14,12 +14,50 @@
 # limitations under the License.
 
 import argparse
+import collections
+import csv
+import io
+import json
 import logging
 import sys
 import traceback
 import zipfile
 
-from rangelib import RangeSet
+BLOCK_SIZE = 4096
+
+
+def ParseRawRanges(raw):
+  """Parses a range set in the raw transfer list format (e.g. "4,10,20,30,40").
+
+  Returns:
+    A tuple of the block numbers, where each pair is a half-open range.
+  """
+  values = [int(value) for value in raw.split(",")]
+  assert values[0] == len(values) - 1 and values[0] % 2 == 0, \
+      "invalid range set: {}".format(raw)
+  return tuple(values[1:])
+
+
+def RangesSize(ranges):
+  return sum(ranges[1::2]) - sum(ranges[0::2])
+
+
+def RangesOverlap(ranges, other):
+  """Returns whether two parsed range sets overlap.
+
+  The range sets in transfer lists are written in ascending order, which
+  allows a single pass over both of them.
+  """
+  i = j = 0
+  while i < len(ranges) and j < len(other):
+    if ranges[i + 1] <= other[j]:
+      i += 2
+    elif other[j + 1] <= ranges[i]:
+      j += 2
+    else:
+      return True
+  return False
+
 
 class Stash(object):
   """Build a map to track stashed blocks during update simulation."""
@@ -33,33 +71,214 @@ class Stash(object):
 
   def StashBlocks(self, SHA1, blocks):
     if SHA1 in self.stash_map:
-      logging.info("already stashed {}: {}".format(SHA1, blocks))
-      return
-    self.blocks_stashed += blocks.size()
-    self.current_stash_size += blocks.size()
+      logging.info("already stashed %s: %s", SHA1, blocks)
+      return False
+    self.blocks_stashed += blocks
+    self.current_stash_size += blocks
     self.max_stash_needed = max(self.current_stash_size, self.max_stash_needed)
     self.stash_map[SHA1] = blocks
+    return True
 
   def FreeBlocks(self, SHA1):
-    assert self.stash_map.has_key(SHA1), "stash {} not found".format(SHA1)
-    self.current_stash_size -= self.stash_map[SHA1].size()
+    assert SHA1 in self.stash_map, "stash {} not found".format(SHA1)
+    self.current_stash_size -= self.stash_map[SHA1]
     del self.stash_map[SHA1]
 
   def HandleOverlapBlocks(self, SHA1, blocks):
-    self.StashBlocks(SHA1, blocks)
-    self.overlap_blocks_stashed += blocks.size()
-    self.FreeBlocks(SHA1)
+    # An explicit stash of the same blocks is used as is, and kept.
+    if self.StashBlocks(SHA1, blocks):
+      self.overlap_blocks_stashed += blocks
+      self.FreeBlocks(SHA1)
+
+
+# The I/O of one transfer list command, in blocks. stash_occupancy is the
+# number of blocks held in the stash after the command.
+TimelineEntry = collections.namedtuple(
+    "TimelineEntry",
+    ["partition", "index", "command", "blocks_written", "source_blocks_read",
+     "stash_blocks_read", "blocks_stashed", "stash_occupancy"])
+
+
+class TransferListSimulator(object):
+  """Simulates the commands of a transfer list, one line at a time.
+
+  The transfer list is never held in memory as a whole, and the range sets are
+  only sized and compared, so large transfer lists are simulated in a single
+  pass.
+
+  Attributes:
+    blocks_written: The blocks written to the partition.
+    source_blocks_read: The blocks read from the partition by move, diff and
+        stash commands.
+    stash_blocks_read: The blocks read from the stash by move and diff
+        commands.
+    blocks_reused: The target blocks produced from source data (i.e. by move
+        and diff commands), as opposed to new and zero commands.
+    timeline: The TimelineEntry of each command, if record_timeline is True.
+  """
+
+  def __init__(self, partition, record_timeline=False):
+    self.partition = partition
+    self.record_timeline = record_timeline
+    self.version = None
+    self.expected_blocks_written = None
+    self.expected_max_stash_needed = None
+    self.stash = Stash()
+    self.commands = collections.Counter()
+    self.blocks_written = 0
+    self.source_blocks_read = 0
+    self.stash_blocks_read = 0
+    self.blocks_reused = 0
+    self.timeline = []
+
+  def Run(self, lines):
+    """Simulates the transfer list given as an iterable of lines."""
+    lines = iter(lines)
+    header = [next(lines, "").strip() for _ in range(4)]
+    assert all(header), "{} transfer list is too short; it expects at least " \
+        "4 lines".format(self.partition)
+    self.version = int(header[0])
+    assert self.version >= 3
+    self.expected_blocks_written = int(header[1])
+    self.expected_max_stash_needed = int(header[3])
+
+    for index, line in enumerate(lines):
+      line = line.strip()
+      if not line:
+        continue
+      try:
+        self.SimulateCommand(index, line)
+      except:
+        logging.error("failed to parse command in: %s", line)
+        raise
+
+  def _ReadSource(self, source_hash, target_ranges, source_spec):
+    """Accounts for the source of a move or diff command.
+
+    Args:
+      source_hash: The hash of the source blocks.
+      target_ranges: The parsed target range set of the command.
+      source_spec: The command arguments that describe the source, i.e.
+          <src_blk_count> <src_range> [<src_loc> <stash_id>:<stash_range> ...]
+          or <src_blk_count> - <stash_id>:<stash_range> ...
+
+    Returns:
+      A tuple of the blocks read from the partition, and from the stash.
+    """
+    assert len(source_spec) >= 2, "command format error: {}".format(
+        " ".join(source_spec))
+    source_blocks = 0
+    if source_spec[1] != "-":
+      source_ranges = ParseRawRanges(source_spec[1])
+      source_blocks = RangesSize(source_ranges)
+      # The updater stashes the source blocks that overlap with the target,
+      # so that the command can be resumed.
+      if RangesOverlap(target_ranges, source_ranges):
+        self.stash.HandleOverlapBlocks(source_hash, source_blocks)
+      stash_refs = source_spec[3:]
+    else:
+      stash_refs = source_spec[2:]
+
+    stash_blocks = 0
+    for stash_ref in stash_refs:
+      _, stash_range = stash_ref.split(":", 1)
+      stash_blocks += RangesSize(ParseRawRanges(stash_range))
+    return source_blocks, stash_blocks
+
+  def SimulateCommand(self, index, line):
+    cmd_list = line.split(" ")
+    cmd_name = cmd_list[0]
+    blocks_written = source_blocks = stash_blocks = blocks_stashed = 0
+    if cmd_name in ("new", "zero"):
+      assert len(cmd_list) == 2, "command format error: {}".format(line)
+      blocks_written = RangesSize(ParseRawRanges(cmd_list[1]))
+    elif cmd_name == "erase":
+      assert len(cmd_list) == 2, "command format error: {}".format(line)
+    elif cmd_name == "move":
+      # Example:  move <onehash> <tgt_range> <src_blk_count> <src_range>
+      # [<loc_range> <stashed_blocks>]
+      assert len(cmd_list) >= 5, "command format error: {}".format(line)
+      target_ranges = ParseRawRanges(cmd_list[2])
+      blocks_written = RangesSize(target_ranges)
+      source_blocks, stash_blocks = self._ReadSource(
+          cmd_list[1], target_ranges, cmd_list[3:])
+      self.blocks_reused += blocks_written
+    elif cmd_name in ("bsdiff", "imgdiff"):
+      # Example:  bsdiff <offset> <len> <src_hash> <tgt_hash> <tgt_range>
+      # <src_blk_count> <src_range> [<loc_range> <stashed_blocks>]
+      assert len(cmd_list) >= 8, "command format error: {}".format(line)
+      target_ranges = ParseRawRanges(cmd_list[5])
+      blocks_written = RangesSize(target_ranges)
+      source_blocks, stash_blocks = self._ReadSource(
+          cmd_list[3], target_ranges, cmd_list[6:])
+      self.blocks_reused += blocks_written
+    elif cmd_name == "stash":
+      assert len(cmd_list) == 3, "command format error: {}".format(line)
+      stash_size = RangesSize(ParseRawRanges(cmd_list[2]))
+      if self.stash.StashBlocks(cmd_list[1], stash_size):
+        source_blocks = blocks_stashed = stash_size
+    elif cmd_name == "free":
+      assert len(cmd_list) == 2, "command format error: {}".format(line)
+      self.stash.FreeBlocks(cmd_list[1])
+    else:
+      raise ValueError("unknown command: {}".format(cmd_name))
+
+    self.commands[cmd_name] += 1
+    self.blocks_written += blocks_written
+    self.source_blocks_read += source_blocks
+    self.stash_blocks_read += stash_blocks
+    if self.record_timeline:
+      self.timeline.append(TimelineEntry(
+          self.partition, index, cmd_name, blocks_written, source_blocks,
+          stash_blocks, blocks_stashed, self.stash.current_stash_size))
+
+  @property
+  def write_amplification(self):
+    """The blocks written to the partition and the stash, per target block."""
+    if not self.blocks_written:
+      return 0.0
+    return float(self.blocks_written + self.stash.blocks_stashed) / \
+        self.blocks_written
+
+  @property
+  def source_reuse(self):
+    """The fraction of the target blocks produced from source data."""
+    if not self.blocks_written:
+      return 0.0
+    return float(self.blocks_reused) / self.blocks_written
+
+  def GetSummary(self):
+    return {
+        "partition": self.partition,
+        "version": self.version,
+        "commands": dict(self.commands),
+        "blocks_written": self.blocks_written,
+        "expected_blocks_written": self.expected_blocks_written,
+        "max_stash_needed": self.stash.max_stash_needed,
+        "expected_max_stash_needed": self.expected_max_stash_needed,
+        "blocks_stashed": self.stash.blocks_stashed,
+        "overlap_blocks_stashed": self.stash.overlap_blocks_stashed,
+        "source_blocks_read": self.source_blocks_read,
+        "stash_blocks_read": self.stash_blocks_read,
+        "blocks_reused": self.blocks_reused,
+        "write_amplification": self.write_amplification,
+        "source_reuse": self.source_reuse,
+    }
 
 
 class OtaPackageParser(object):
   """Parse a block-based OTA package."""
 
-  def __init__(self, package):
+  TRANSFER_LIST_SUFFIX = ".transfer.list"
+
+  def __init__(self, package, record_timeline=False):
     self.package = package
+    self.record_timeline = record_timeline
     self.new_data_size = 0
     self.patch_data_size = 0
     self.block_written = 0
     self.block_stashed = 0
+    self.simulators = []
 
   @staticmethod
   def GetSizeString(size):
@@ -72,78 +291,52 @@ class OtaPackageParser(object):
         return "{:.1f}{}".format(size / base, units)
       base *= 1024
 
+  def GetPartitions(self):
+    """Returns the partitions with a transfer list, system and vendor first."""
+    partitions = [name[:-len(self.TRANSFER_LIST_SUFFIX)]
+                  for name in self.package.namelist()
+                  if name.endswith(self.TRANSFER_LIST_SUFFIX)]
+    order = {"system": 0, "vendor": 1}
+    return sorted(partitions, key=lambda p: (order.get(p, 2), p))
+
   def ParseTransferList(self, name):
     """Simulate the transfer commands and calculate the amout of I/O."""
 
-    logging.info("\nSimulating commands in '{}':".format(name))
-    lines = self.package.read(name).strip().splitlines()
-    assert len(lines) >= 4, "{} is too short; Transfer list expects at least" \
-        "4 lines, it has {}".format(name, len(lines))
-    assert int(lines[0]) >= 3
-    logging.info("(version: {})".format(lines[0]))
-
-    blocks_written = 0
-    my_stash = Stash()
-    for line in lines[4:]:
-      cmd_list = line.strip().split(" ")
-      cmd_name = cmd_list[0]
-      try:
-        if cmd_name == "new" or cmd_name == "zero":
-          assert len(cmd_list) == 2, "command format error: {}".format(line)
-          target_range = RangeSet.parse_raw(cmd_list[1])
-          blocks_written += target_range.size()
-        elif cmd_name == "move":
-          # Example:  move <onehash> <tgt_range> <src_blk_count> <src_range>
-          # [<loc_range> <stashed_blocks>]
-          assert len(cmd_list) >= 5, "command format error: {}".format(line)
-          target_range = RangeSet.parse_raw(cmd_list[2])
-          blocks_written += target_range.size()
-          if cmd_list[4] == '-':
-            continue
-          SHA1 = cmd_list[1]
-          source_range = RangeSet.parse_raw(cmd_list[4])
-          if target_range.overlaps(source_range):
-            my_stash.HandleOverlapBlocks(SHA1, source_range)
-        elif cmd_name == "bsdiff" or cmd_name == "imgdiff":
-          # Example:  bsdiff <offset> <len> <src_hash> <tgt_hash> <tgt_range>
-          # <src_blk_count> <src_range> [<loc_range> <stashed_blocks>]
-          assert len(cmd_list) >= 8, "command format error: {}".format(line)
-          target_range = RangeSet.parse_raw(cmd_list[5])
-          blocks_written += target_range.size()
-          if cmd_list[7] == '-':
-            continue
-          source_SHA1 = cmd_list[3]
-          source_range = RangeSet.parse_raw(cmd_list[7])
-          if target_range.overlaps(source_range):
-            my_stash.HandleOverlapBlocks(source_SHA1, source_range)
-        elif cmd_name == "stash":
-          assert len(cmd_list) == 3, "command format error: {}".format(line)
-          SHA1 = cmd_list[1]
-          source_range = RangeSet.parse_raw(cmd_list[2])
-          my_stash.StashBlocks(SHA1, source_range)
-        elif cmd_name == "free":
-          assert len(cmd_list) == 2, "command format error: {}".format(line)
-          SHA1 = cmd_list[1]
-          my_stash.FreeBlocks(SHA1)
-      except:
-        logging.error("failed to parse command in: " + line)
-        raise
+    logging.info("\nSimulating commands in '%s':", name)
+    simulator = TransferListSimulator(
+        name[:-len(self.TRANSFER_LIST_SUFFIX)], self.record_timeline)
+    with self.package.open(name) as f:
+      simulator.Run(io.TextIOWrapper(f, encoding="utf-8"))
+    logging.info("(version: %d)", simulator.version)
+    self.simulators.append(simulator)
+
+    self.block_written += simulator.blocks_written
+    self.block_stashed += simulator.stash.blocks_stashed
 
-    self.block_written += blocks_written
-    self.block_stashed += my_stash.blocks_stashed
+    logging.info("blocks written: %d  (expected: %d)",
+                 simulator.blocks_written, simulator.expected_blocks_written)
+    logging.info("max blocks stashed simultaneously: %d  (expected: %d)",
+                 simulator.stash.max_stash_needed,
+                 simulator.expected_max_stash_needed)
+    logging.info("total blocks stashed: %d", simulator.stash.blocks_stashed)
+    logging.info("blocks stashed implicitly: %d",
+                 simulator.stash.overlap_blocks_stashed)
+    logging.info("blocks read from source: %d  (from stash: %d)",
+                 simulator.source_blocks_read, simulator.stash_blocks_read)
+    logging.info("write amplification: %.2f", simulator.write_amplification)
+    logging.info("source block reuse: %.1f%%", 100 * simulator.source_reuse)
 
-    logging.info("blocks written: {}  (expected: {})".format(
-        blocks_written, lines[1]))
-    logging.info("max blocks stashed simultaneously: {}  (expected: {})".
-        format(my_stash.max_stash_needed, lines[3]))
-    logging.info("total blocks stashed: {}".format(my_stash.blocks_stashed))
-    logging.info("blocks stashed implicitly: {}".format(
-        my_stash.overlap_blocks_stashed))
+  def GetDataInfo(self, partition, suffix):
+    """Returns the ZipInfo of the new or patch data, which may be compressed."""
+    for name in (partition + suffix, partition + suffix + ".br"):
+      if name in self.package.namelist():
+        return self.package.getinfo(name)
+    raise AssertionError("{}{} not found".format(partition, suffix))
 
   def PrintDataInfo(self, partition):
-    logging.info("\nReading data info for {} partition:".format(partition))
-    new_data = self.package.getinfo(partition + ".new.dat")
-    patch_data = self.package.getinfo(partition + ".patch.dat")
+    logging.info("\nReading data info for %s partition:", partition)
+    new_data = self.GetDataInfo(partition, ".new.dat")
+    patch_data = self.GetDataInfo(partition, ".patch.dat")
     logging.info("{:<40}{:<40}".format(new_data.filename, patch_data.filename))
     logging.info("{:<40}{:<40}".format(
           "compress_type: " + str(new_data.compress_type),
@@ -161,19 +354,16 @@ class OtaPackageParser(object):
     self.patch_data_size += patch_data.file_size
 
   def AnalyzePartition(self, partition):
-    assert partition in ("system", "vendor")
-    assert partition + ".new.dat" in self.package.namelist()
-    assert partition + ".patch.dat" in self.package.namelist()
-    assert partition + ".transfer.list" in self.package.namelist()
+    assert partition + self.TRANSFER_LIST_SUFFIX in self.package.namelist()
 
     self.PrintDataInfo(partition)
-    self.ParseTransferList(partition + ".transfer.list")
+    self.ParseTransferList(partition + self.TRANSFER_LIST_SUFFIX)
 
   def PrintMetadata(self):
     metadata_path = "META-INF/com/android/metadata"
     logging.info("\nMetadata info:")
     metadata_info = {}
-    for line in self.package.read(metadata_path).strip().splitlines():
+    for line in self.package.read(metadata_path).decode().strip().splitlines():
       index = line.find("=")
       metadata_info[line[0 : index].strip()] = line[index + 1:].strip()
     assert metadata_info.get("ota-type") == "BLOCK"
@@ -187,14 +377,13 @@ class OtaPackageParser(object):
   def Analyze(self):
     logging.info("Analyzing ota package: " + self.package.filename)
     self.PrintMetadata()
-    assert "system.new.dat" in self.package.namelist()
-    self.AnalyzePartition("system")
-    if "vendor.new.dat" in self.package.namelist():
-      self.AnalyzePartition("vendor")
+    partitions = self.GetPartitions()
+    assert "system" in partitions
+    for partition in partitions:
+      self.AnalyzePartition(partition)
 
     #TODO Add analysis of other partitions(e.g. bootloader, boot, radio)
 
-    BLOCK_SIZE = 4096
     logging.info("\nOTA package analyzed:")
     logging.info("new data size (uncompressed): " +
         OtaPackageParser.GetSizeString(self.new_data_size))
@@ -205,10 +394,38 @@ class OtaPackageParser(object):
     logging.info("total data stashed: " +
         OtaPackageParser.GetSizeString(self.block_stashed * BLOCK_SIZE))
 
+  def WriteJson(self, output):
+    """Writes the summary and the timeline of each partition as JSON."""
+    result = {
+        "package": self.package.filename,
+        "block_size": BLOCK_SIZE,
+        "new_data_size": self.new_data_size,
+        "patch_data_size": self.patch_data_size,
+        "partitions": [],
+    }
+    for simulator in self.simulators:
+      summary = simulator.GetSummary()
+      if self.record_timeline:
+        summary["timeline"] = [entry._asdict()
+                               for entry in simulator.timeline]
+      result["partitions"].append(summary)
+    json.dump(result, output, indent=2)
+
+  def WriteCsv(self, output):
+    """Writes the timeline of all the partitions as CSV, one command a row."""
+    writer = csv.writer(output)
+    writer.writerow(TimelineEntry._fields)
+    for simulator in self.simulators:
+      writer.writerows(simulator.timeline)
+
 
 def main(argv):
   parser = argparse.ArgumentParser(description='Analyze an OTA package.')
   parser.add_argument("ota_package", help='Path of the OTA package.')
+  parser.add_argument("--json", help='Write the summary and the per-command '
+                      'timeline of each partition to this JSON file.')
+  parser.add_argument("--csv", help='Write the per-command timeline of all '
+                      'the partitions to this CSV file.')
   args = parser.parse_args(argv)
 
   logging_format = '%(message)s'
@@ -216,8 +433,15 @@ def main(argv):
 
   try:
     with zipfile.ZipFile(args.ota_package, 'r', allowZip64=True) as package:
-      package_parser = OtaPackageParser(package)
+      package_parser = OtaPackageParser(
+          package, record_timeline=bool(args.json or args.csv))
       package_parser.Analyze()
+    if args.json:
+      with open(args.json, "w") as output:
+        package_parser.WriteJson(output)
+    if args.csv:
+      with open(args.csv, "w", newline="") as output:
+        package_parser.WriteCsv(output)
   except:
     logging.error("Failed to read " + args.ota_package)
     traceback.print_exc()
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import copy
+import fcntl
 import itertools
 import logging
 import os
@@ -775,13 +776,42 @@ def IsZucchiniCompatible(source_file: str, target_file: str):
   return sourceEntry and targetEntry and sourceEntry == targetEntry
 
 
-def ExtractTargetFiles(path: str):
+def GetImagesUnzipPattern(partitions):
+  """Returns the patterns to extract the images of |partitions| only.
+
+  The patterns cover everything in UNZIP_PATTERN, except that the image
+  directories are restricted to the files named after |partitions| (i.e. the
+  .img and .map files).
+  """
+  image_subdirs = [subdir for subdir in TARGET_FILES_IMAGES_SUBDIR
+                   if subdir + "/*" in UNZIP_PATTERN]
+  patterns = [pattern for pattern in UNZIP_PATTERN
+              if pattern.split("/")[0] not in image_subdirs]
+  for subdir in image_subdirs:
+    patterns.extend("{}/{}.*".format(subdir, partition)
+                    for partition in sorted(partitions))
+  return patterns
+
+
+def ExtractTargetFiles(path: str, partitions=None):
+  """Extracts the target files needed by the A/B payload generation.
+
+  Args:
+    path: The target-files zip, or an extracted directory which is returned
+        as is.
+    partitions: If not None, only the images of these partitions are
+        extracted, along with the META files and the build props.
+  """
   if os.path.isdir(path):
     logger.info("target files %s is already extracted", path)
     return path
   extracted_dir = common.MakeTempDir("target_files")
   logger.info(f"Extracting target files {path} to {extracted_dir}")
-  common.UnzipToDir(path, extracted_dir, UNZIP_PATTERN + [""])
+  if partitions is None:
+    patterns = UNZIP_PATTERN + [""]
+  else:
+    patterns = GetImagesUnzipPattern(partitions)
+  common.UnzipToDir(path, extracted_dir, patterns)
   for subdir in TARGET_FILES_IMAGES_SUBDIR:
     image_dir = os.path.join(extracted_dir, subdir)
     if not os.path.exists(image_dir):
@@ -1089,7 +1119,33 @@ def Fnmatch(filename, pattersn):
   return any([fnmatch.fnmatch(filename, pat) for pat in pattersn])
 
 
-def CopyTargetFilesDir(input_dir):
+# From linux/fs.h, clones the extents of a file on filesystems that support
+# reflinks (e.g. btrfs, xfs).
+FICLONE = 0x40049409
+
+
+def CloneFile(src, dst):
+  """Copies |src| to |dst|, sharing the extents with a reflink if possible."""
+  try:
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+      fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+  except OSError:
+    shutil.copyfile(src, dst)
+  shutil.copystat(src, dst)
+  return dst
+
+
+def CopyTargetFilesDir(input_dir, partitions=None):
+  """Makes a modifiable copy of the target files needed by the A/B payload.
+
+  The non-sparse images are symlinked rather than copied, and the other files
+  are cloned where the filesystem supports it.
+
+  Args:
+    input_dir: The extracted target-files directory.
+    partitions: If not None, only the images of these partitions are included,
+        along with the META files and the build props.
+  """
   output_dir = common.MakeTempDir("target_files")
 
   def SymlinkIfNotSparse(src, dst):
@@ -1098,13 +1154,20 @@ def CopyTargetFilesDir(input_dir):
     else:
       return os.symlink(os.path.realpath(src), dst)
 
+  def IgnoreOtherImages(_, names):
+    if partitions is None:
+      return []
+    return [name for name in names
+            if os.path.splitext(name)[0] not in partitions]
+
   for subdir in TARGET_FILES_IMAGES_SUBDIR:
     if not os.path.exists(os.path.join(input_dir, subdir)):
       continue
     shutil.copytree(os.path.join(input_dir, subdir), os.path.join(
-        output_dir, subdir), dirs_exist_ok=True, copy_function=SymlinkIfNotSparse)
+        output_dir, subdir), dirs_exist_ok=True, copy_function=SymlinkIfNotSparse,
+        ignore=IgnoreOtherImages)
   shutil.copytree(os.path.join(input_dir, "META"), os.path.join(
-      output_dir, "META"), dirs_exist_ok=True)
+      output_dir, "META"), dirs_exist_ok=True, copy_function=CloneFile)
 
   for (dirpath, _, filenames) in os.walk(input_dir):
     for filename in filenames:
@@ -1116,6 +1179,9 @@ def CopyTargetFilesDir(input_dir):
           output_dir, relative_path)
       if os.path.exists(target_path):
         continue
+      if (partitions is not None and
+          relative_path.split("/")[0] in TARGET_FILES_IMAGES_SUBDIR):
+        continue
       os.makedirs(os.path.dirname(target_path), exist_ok=True)
-      shutil.copy(path, target_path)
+      CloneFile(path, target_path)
   return output_dir
@@ -33,6 +33,7 @@ class RangeSet(object):
   def __init__(self, data=None):
     self.monotonic = False
     self._extra = {}
+    self._raw_string = None
     if isinstance(data, str):
       self._parse_internal(data)
     elif data:
@@ -154,7 +155,12 @@ class RangeSet(object):
 
   def to_string_raw(self):
     assert self.data
-    return str(len(self.data)) + "," + ",".join(str(i) for i in self.data)
+    # The raw string is cached along with the data it was generated from, as
+    # the transfer list generation asks for the same RangeSets repeatedly.
+    if self._raw_string is None or self._raw_string[0] is not self.data:
+      self._raw_string = (self.data, str(len(self.data)) + "," +
+                          ",".join(str(i) for i in self.data))
+    return self._raw_string[1]
 
   def union(self, other):
     """Return a new RangeSet representing the union of this RangeSet
@@ -14,11 +14,13 @@
 # limitations under the License.
 #
 
+import concurrent.futures
 import os
 from hashlib import sha1
 
 import common
-from blockimgdiff import BlockImageDiff, HeapItem, ImgdiffStats, Transfer
+from blockimgdiff import (
+    BlockImageDiff, HeapItem, ImgdiffStats, PatchInfo, Transfer)
 from images import DataImage, EmptyImage, FileImage
 from rangelib import RangeSet
 from test_utils import ReleaseToolsTestCase
@@ -174,6 +176,28 @@ class BlockImageDiffTest(ReleaseToolsTestCase):
     common.OPTIONS.cache_size = 15 * 4096
     self.assertEqual((15, 5), block_image_diff.ReviseStashSize())
 
+  def test_ComputePatchesForInputList_callbackError(self):
+    """An exception of patch_callback in a worker thread should be raised."""
+    block_image_diff = BlockImageDiff(EmptyImage(), EmptyImage(), threads=2)
+    transfers = block_image_diff.transfers
+    for i in range(8):
+      xf = Transfer("t%d" % i, "t%d" % i, RangeSet(data=(i, i + 1)),
+                    RangeSet(data=(i, i + 1)), "t%dhash" % i, "s%dhash" % i,
+                    "diff", transfers)
+      xf.patch_info = PatchInfo(False, b"patch")
+
+    emitted = []
+
+    def patch_callback(xf_index, patch_info, compressed_size):
+      if xf_index == 3:
+        raise IOError("No space left on device")
+      emitted.append(xf_index)
+
+    with self.assertRaises(IOError):
+      block_image_diff.ComputePatchesForInputList(
+          [(i, False, i) for i in range(8)], False, patch_callback)
+    self.assertEqual([0, 1, 2], emitted)
+
   def test_FileTypeSupportedByImgdiff(self):
     self.assertTrue(
         BlockImageDiff.FileTypeSupportedByImgdiff(
@@ -308,3 +332,33 @@ class FileImageTest(ReleaseToolsTestCase):
   def test_read_all(self):
     data = b''.join(self.file.ReadRangeSet(self.file.care_map))
     self.assertEqual(self.data, data)
+
+  def test_file_map(self):
+    self.assertEqual({"__NONZERO": RangeSet("0-3")}, self.file.file_map)
+
+  def test_file_map_zero_blocks(self):
+    blocksize = self.file.blocksize
+    # Spans multiple scan windows, with runs crossing the window boundaries.
+    total_blocks = FileImage.WINDOW_BLOCKS * 2 + 3
+    data = bytearray(total_blocks * blocksize)
+    for i in [1, 2, FileImage.WINDOW_BLOCKS - 1, FileImage.WINDOW_BLOCKS,
+              total_blocks - 1]:
+      data[i * blocksize + 17] = 1
+    file_path = common.MakeTempFile()
+    with open(file_path, 'wb') as f:
+      f.write(data)
+
+    image = FileImage(file_path)
+    self.assertEqual(
+        RangeSet("0 3-254 257-513"), image.file_map["__ZERO"])
+    self.assertEqual(
+        RangeSet("1-2 255-256 514"), image.file_map["__NONZERO"])
+    self.assertEqual(sha1(data).hexdigest(), image.TotalSha1())
+
+  def test_concurrent_reads(self):
+    rs = RangeSet("0-3")
+    expected = sha1(self.data).hexdigest()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+      results = list(executor.map(
+          lambda _: self.file.RangeSha1(rs), range(16)))
+    self.assertEqual([expected] * 16, results)
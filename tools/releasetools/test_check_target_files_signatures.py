@@ -0,0 +1,113 @@
+#
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import gzip
+import os.path
+import zipfile
+
+import check_target_files_signatures
+import common
+import test_utils
+from check_target_files_signatures import (
+    APK, CertFromPKCS7InProcess, ParseBinaryManifest, ReadSigningBlockCerts,
+    TargetFiles)
+
+
+class CheckTargetFilesSignaturesTest(test_utils.ReleaseToolsTestCase):
+
+  # SHA-1 digest of the cert that signs testdata/TestApp.apk.
+  TEST_APP_CERT_DIGEST = '61ed377e85d386a8dfee6b864bd85b0bfaa5af81'
+
+  APKCERTS_TXT = (
+      'name="TestApp.apk" certificate="PRESIGNED" private_key=""\n'
+      'name="Compressed.apk" certificate="PRESIGNED" private_key="" '
+      'compressed="gz"\n')
+
+  def setUp(self):
+    self.testdata_dir = test_utils.get_testdata_dir()
+    with open(os.path.join(self.testdata_dir, 'TestApp.apk'), 'rb') as f:
+      self.test_app = f.read()
+    check_target_files_signatures.APK_CACHE.clear()
+
+  def test_ReadSigningBlockCerts(self):
+    certs = ReadSigningBlockCerts(self.test_app)
+    self.assertEqual(1, len(certs))
+    self.assertEqual(self.TEST_APP_CERT_DIGEST,
+                     common.sha1(certs[0]).hexdigest())
+
+  def test_ReadSigningBlockCerts_NoSigningBlock(self):
+    with open(os.path.join(self.testdata_dir, 'foo.apex'), 'rb') as f:
+      self.assertIsNone(ReadSigningBlockCerts(f.read()))
+
+  def test_CertFromPKCS7InProcess(self):
+    with zipfile.ZipFile(os.path.join(self.testdata_dir, 'TestApp.apk')) as z:
+      cert = CertFromPKCS7InProcess(z.read('META-INF/CERT.RSA'))
+    self.assertEqual(self.TEST_APP_CERT_DIGEST, common.sha1(cert).hexdigest())
+
+  def test_ParseBinaryManifest(self):
+    with zipfile.ZipFile(os.path.join(self.testdata_dir, 'TestApp.apk')) as z:
+      attributes = ParseBinaryManifest(z.read('AndroidManifest.xml'))
+    self.assertIn(('package', 'com.android.cts.ctsshim'), attributes)
+    self.assertIn(('android:versionName', '8.1.0-4396705'), attributes)
+
+  def test_ParseBinaryManifest_NotBinaryXml(self):
+    with self.assertRaises(ValueError):
+      ParseBinaryManifest(b'<manifest package="com.android.foo" />')
+
+  def test_APK_ReadFromData(self):
+    apk = APK(None, 'TestApp.apk')
+    self.assertTrue(apk.ReadFromData(self.test_app))
+    self.assertEqual('com.android.cts.ctsshim', apk.package)
+    self.assertIsNone(apk.shared_uid)
+    self.assertEqual({self.TEST_APP_CERT_DIGEST}, apk.cert_digests)
+    self.assertEqual([], apk.problems)
+
+  def test_APK_ReadFromData_Unsigned(self):
+    with open(os.path.join(self.testdata_dir, 'foo.apex'), 'rb') as f:
+      data = f.read()
+    apk = APK(None, 'foo.apex')
+    self.assertTrue(apk.ReadFromData(data))
+    self.assertEqual('com.android.example.apex', apk.package)
+    self.assertEqual(['No signature found'], apk.problems)
+
+  def test_APK_ReadFromData_NotAnApk(self):
+    self.assertFalse(APK(None, 'foo.apk').ReadFromData(b'not an apk'))
+
+  def _construct_target_files(self):
+    target_files = common.MakeTempFile(suffix='.zip')
+    with zipfile.ZipFile(target_files, 'w', allowZip64=True) as z:
+      z.writestr('META/apkcerts.txt', self.APKCERTS_TXT)
+      z.writestr('SYSTEM/app/TestApp/TestApp.apk', self.test_app)
+      z.writestr('SYSTEM/app/Compressed/Compressed.apk.gz',
+                 gzip.compress(self.test_app))
+    return target_files
+
+  @test_utils.SkipIfExternalToolsUnavailable()
+  def test_LoadZipFile(self):
+    target_files = TargetFiles()
+    target_files.LoadZipFile(self._construct_target_files())
+
+    self.assertEqual(
+        ['SYSTEM/app/Compressed/Compressed.apk',
+         'SYSTEM/app/TestApp/TestApp.apk'],
+        sorted(target_files.apks))
+    for apk in target_files.apks.values():
+      self.assertEqual('com.android.cts.ctsshim', apk.package)
+      self.assertEqual({self.TEST_APP_CERT_DIGEST}, apk.cert_digests)
+    self.assertIsNotNone(
+        check_target_files_signatures.ALL_CERTS.Get(self.TEST_APP_CERT_DIGEST))
+    # Both APKs have the same content, which is parsed only once.
+    self.assertEqual(1, len(check_target_files_signatures.APK_CACHE))
@@ -15,12 +15,14 @@
 #
 
 import copy
+import os
 import zipfile
 
 import common
 import test_utils
 
-from non_ab_ota import NonAbOtaPropertyFiles, WriteFingerprintAssertion
+from non_ab_ota import (
+    GetBlockDifferences, NonAbOtaPropertyFiles, WriteFingerprintAssertion)
 from test_utils import PropertyFilesTestCase
 
 
@@ -170,3 +172,46 @@ class NonAbOTATest(test_utils.ReleaseToolsTestCase):
         [('AssertSomeThumbprint', 'build-thumbprint',
           'source-build-thumbprint')],
         script_writer.lines)
+
+  class DeviceSpecific(object):
+
+    @staticmethod
+    def FullOTA_GetBlockDifferences():
+      return None
+
+  def test_GetBlockDifferences_full(self):
+    input_tmp = common.MakeTempDir()
+    os.mkdir(os.path.join(input_tmp, 'IMAGES'))
+    target_zip_path = common.MakeTempFile(suffix='.zip')
+    partitions = ['vendor', 'system', 'odm']
+    with zipfile.ZipFile(target_zip_path, 'w', allowZip64=True) as target_zip:
+      for index, partition in enumerate(partitions):
+        target_zip.writestr(partition.upper() + '/', '')
+        image = os.path.join(input_tmp, 'IMAGES', partition + '.img')
+        with open(image, 'wb') as f:
+          f.write(os.urandom(4096 * (index + 1)))
+        with open(image[:-4] + '.map', 'w') as f:
+          f.write('/{}/file 0-{}\n'.format(partition, index))
+
+    common.OPTIONS.input_tmp = input_tmp
+    common.OPTIONS.info_dict = {
+        'blockimgdiff_versions': '3,4',
+        'use_dynamic_partitions': 'true',
+        'dynamic_partition_list': ' '.join(partitions),
+    }
+    common.OPTIONS.source_info_dict = None
+    common.OPTIONS.cache_size = 4 * 4096
+    common.OPTIONS.worker_threads = 2
+    with zipfile.ZipFile(target_zip_path, allowZip64=True) as target_zip:
+      block_diff_dict = GetBlockDifferences(
+          target_zip=target_zip, source_zip=None,
+          target_info=common.OPTIONS.info_dict, source_info=None,
+          device_specific=self.DeviceSpecific())
+
+    # The partitions are listed in the fixed order, regardless of the order in
+    # which they are computed.
+    self.assertEqual(['system', 'vendor', 'odm'], list(block_diff_dict))
+    for partition in ['system', 'vendor', 'odm']:
+      block_diff = block_diff_dict[partition]
+      self.assertEqual(partition, block_diff.partition)
+      self.assertTrue(os.path.exists(block_diff.path + '.new.dat'))
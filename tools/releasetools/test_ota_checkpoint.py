@@ -0,0 +1,119 @@
+#
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import os.path
+import zipfile
+
+import common
+import ota_checkpoint
+import test_utils
+from ota_checkpoint import Checkpoint, InputFingerprint
+
+
+class CheckpointTest(test_utils.ReleaseToolsTestCase):
+
+  def setUp(self):
+    self.checkpoint = Checkpoint(common.MakeTempDir())
+    self.target_files = common.MakeTempFile(suffix='.zip')
+    with zipfile.ZipFile(self.target_files, 'w', allowZip64=True) as z:
+      z.writestr('META/misc_info.txt', 'recovery_api_version=3\n')
+      z.writestr('IMAGES/system.img', os.urandom(4096 * 4))
+      z.writestr('SYSTEM/app/Foo.apk', b'foo')
+
+  def test_InputFingerprint(self):
+    fingerprint = InputFingerprint(self.target_files)
+    self.assertEqual(fingerprint, InputFingerprint(self.target_files))
+
+    with zipfile.ZipFile(self.target_files, 'a') as z:
+      z.writestr('META/ab_partitions.txt', 'system\n')
+    self.assertNotEqual(fingerprint, InputFingerprint(self.target_files))
+
+  def test_ExtractTargetFiles(self):
+    extracted = self.checkpoint.ExtractTargetFiles(
+        self.target_files, ['IMAGES/*', 'META/*'])
+    self.assertTrue(
+        os.path.exists(os.path.join(extracted, 'IMAGES', 'system.img')))
+    self.assertFalse(os.path.exists(os.path.join(extracted, 'SYSTEM')))
+
+    # The extraction is reused, as long as it's complete.
+    marker = os.path.join(extracted, 'marker')
+    with open(marker, 'w') as f:
+      f.write('marker')
+    self.assertEqual(extracted, self.checkpoint.ExtractTargetFiles(
+        self.target_files, ['IMAGES/*', 'META/*']))
+    self.assertTrue(os.path.exists(marker))
+
+    with open(os.path.join(extracted, 'IMAGES', 'system.img'), 'r+b') as f:
+      f.truncate(4096)
+    self.assertEqual(extracted, self.checkpoint.ExtractTargetFiles(
+        self.target_files, ['IMAGES/*', 'META/*']))
+    self.assertFalse(os.path.exists(marker))
+    self.assertEqual(4096 * 4, os.path.getsize(
+        os.path.join(extracted, 'IMAGES', 'system.img')))
+
+  def _WriteTransfers(self):
+    prefix = os.path.join(common.MakeTempDir(), 'system')
+    for suffix in ota_checkpoint.TRANSFERS_SUFFIXES:
+      with open(prefix + suffix, 'w') as f:
+        f.write(suffix)
+    return prefix
+
+  def test_SaveTransfers(self):
+    prefix = self._WriteTransfers()
+    restored = os.path.join(common.MakeTempDir(), 'system')
+
+    self.assertIsNone(self.checkpoint.LoadTransfers('key', restored))
+    self.checkpoint.SaveTransfers('key', prefix, {'max_stashed_size': 4096})
+    self.assertEqual({'max_stashed_size': 4096},
+                     self.checkpoint.LoadTransfers('key', restored))
+    for suffix in ota_checkpoint.TRANSFERS_SUFFIXES:
+      with open(restored + suffix) as f:
+        self.assertEqual(suffix, f.read())
+
+  def test_LoadTransfers_Corrupted(self):
+    self.checkpoint.SaveTransfers('key', self._WriteTransfers(), {})
+
+    saved = os.path.join(self.checkpoint.directory, 'transfers', 'key',
+                         'transfers.patch.dat')
+    with open(saved, 'w') as f:
+      f.write('.PATCH.DAT')
+    self.assertIsNone(self.checkpoint.LoadTransfers(
+        'key', os.path.join(common.MakeTempDir(), 'system')))
+
+  def test_SavePatch(self):
+    self.assertIsNone(self.checkpoint.LoadPatch('src-tgt-bsdiff'))
+    self.checkpoint.SavePatch('src-tgt-bsdiff', b'patch')
+    self.assertEqual(b'patch', self.checkpoint.LoadPatch('src-tgt-bsdiff'))
+
+  def test_LoadPatch_Corrupted(self):
+    self.checkpoint.SavePatch('src-tgt-bsdiff', b'patch')
+    with open(os.path.join(self.checkpoint.directory, 'patches',
+                           'src-tgt-bsdiff'), 'wb') as f:
+      f.write(b'patc')
+    self.assertIsNone(self.checkpoint.LoadPatch('src-tgt-bsdiff'))
+
+  def test_GetCheckpoint(self):
+    common.OPTIONS.checkpoint_dir = None
+    self.assertIsNone(ota_checkpoint.GetCheckpoint())
+
+    common.OPTIONS.checkpoint_dir = self.checkpoint.directory
+    try:
+      checkpoint = ota_checkpoint.GetCheckpoint()
+      self.assertEqual(self.checkpoint.directory, checkpoint.directory)
+      self.assertIs(checkpoint, ota_checkpoint.GetCheckpoint())
+    finally:
+      common.OPTIONS.checkpoint_dir = None
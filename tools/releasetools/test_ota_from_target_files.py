@@ -25,9 +25,10 @@ import ota_metadata_pb2
 import test_utils
 from ota_utils import (
     BuildLegacyOtaMetadata, CalculateRuntimeDevicesAndFingerprints,
-    ConstructOtaApexInfo, FinalizeMetadata, GetPackageMetadata, PropertyFiles, AbOtaPropertyFiles, PayloadGenerator, StreamingPropertyFiles)
+    ConstructOtaApexInfo, CopyTargetFilesDir, ExtractTargetFiles, FinalizeMetadata, GetPackageMetadata, PropertyFiles, AbOtaPropertyFiles, PayloadGenerator, StreamingPropertyFiles)
 from ota_from_target_files import (
     _LoadOemDicts,
+    GetPayloadPartitions,
     GetTargetFilesZipForCustomImagesUpdates,
     GetTargetFilesZipForPartialUpdates,
     GetTargetFilesZipForSecondaryImages,
@@ -675,6 +676,63 @@ class OtaFromTargetFilesTest(test_utils.ReleaseToolsTestCase):
                      updated_dynamic_partitions_info)
     self.assertEqual('boot\nsystem', ab_partitions)
 
+  def test_GetPayloadPartitions(self):
+    info_dict = {'ab_partitions': ['boot', 'system', 'vendor', '']}
+    self.assertEqual({'boot', 'system', 'vendor'},
+                     GetPayloadPartitions(info_dict))
+    self.assertEqual({'boot', 'vendor'},
+                     GetPayloadPartitions(info_dict, ['system']))
+    self.assertIsNone(GetPayloadPartitions({}))
+
+  def test_GetPayloadPartitions_partial(self):
+    common.OPTIONS.partial = ['system', 'vendor']
+    common.OPTIONS.custom_images = {'oem': 'oem_test.img'}
+    try:
+      self.assertEqual(
+          {'system', 'oem_test'},
+          GetPayloadPartitions({'ab_partitions': ['boot', 'system', 'vendor']},
+                               ['vendor']))
+    finally:
+      common.OPTIONS.partial = None
+      common.OPTIONS.custom_images = {}
+
+  def test_ExtractTargetFiles_partitions(self):
+    input_file = construct_target_files(secondary=True)
+
+    extracted = ExtractTargetFiles(input_file, {'boot', 'system'})
+    self.assertTrue(
+        os.path.exists(os.path.join(extracted, 'IMAGES', 'boot.img')))
+    self.assertTrue(
+        os.path.exists(os.path.join(extracted, 'IMAGES', 'system.img')))
+    self.assertTrue(os.path.exists(
+        os.path.join(extracted, 'META', 'ab_partitions.txt')))
+    self.assertFalse(
+        os.path.exists(os.path.join(extracted, 'IMAGES', 'vendor.img')))
+    self.assertFalse(
+        os.path.exists(os.path.join(extracted, 'IMAGES', 'system_other.img')))
+    self.assertFalse(
+        os.path.exists(os.path.join(extracted, 'RADIO', 'modem.img')))
+
+  def test_CopyTargetFilesDir_partitions(self):
+    input_dir = common.UnzipTemp(construct_target_files(secondary=True))
+
+    copied = CopyTargetFilesDir(input_dir, {'boot', 'modem'})
+    self.assertTrue(os.path.islink(os.path.join(copied, 'IMAGES', 'boot.img')))
+    self.assertTrue(os.path.islink(os.path.join(copied, 'RADIO', 'modem.img')))
+    self.assertFalse(
+        os.path.exists(os.path.join(copied, 'IMAGES', 'system.img')))
+    self.assertFalse(
+        os.path.exists(os.path.join(copied, 'RADIO', 'bootloader.img')))
+
+    # The copied META files can be modified without touching the input.
+    ab_partitions = os.path.join(copied, 'META', 'ab_partitions.txt')
+    self.assertFalse(os.path.islink(ab_partitions))
+    with open(ab_partitions, 'w') as f:
+      f.write('boot')
+    self.assertEqual(
+        'boot\nsystem\nvendor\nbootloader\nmodem',
+        common.ReadFromInputFile(input_dir, 'META/ab_partitions.txt'))
+
   @test_utils.SkipIfExternalToolsUnavailable()
   def test_GetTargetFilesZipWithoutPostinstallConfig(self):
     input_file = construct_target_files()
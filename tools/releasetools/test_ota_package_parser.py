@@ -0,0 +1,129 @@
+#
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import csv
+import io
+import json
+import zipfile
+
+import common
+import test_utils
+from ota_package_parser import (
+    OtaPackageParser, ParseRawRanges, RangesOverlap, RangesSize,
+    TransferListSimulator)
+
+
+class OtaPackageParserTest(test_utils.ReleaseToolsTestCase):
+
+  TRANSFER_LIST = '\n'.join([
+      '4',
+      '24',
+      '1',
+      '4',
+      'erase 2,30,40',
+      'stash aaaa 2,0,2',
+      'move bbbb 2,2,4 2 2,3,5',
+      'bsdiff 0 10 aaaa cccc 2,10,14 4 - aaaa:2,0,2 aaaa:2,2,4',
+      'imgdiff 10 10 dddd eeee 2,14,16 3 2,20,23 2,0,2 aaaa:2,2,3',
+      'free aaaa',
+      'new 4,0,2,16,20',
+      'zero 2,20,30',
+  ])
+
+  def test_Ranges(self):
+    ranges = ParseRawRanges('4,0,2,16,20')
+    self.assertEqual((0, 2, 16, 20), ranges)
+    self.assertEqual(6, RangesSize(ranges))
+    self.assertTrue(RangesOverlap(ranges, (1, 3)))
+    self.assertTrue(RangesOverlap(ranges, (10, 17)))
+    self.assertFalse(RangesOverlap(ranges, (2, 16)))
+    self.assertFalse(RangesOverlap(ranges, (20, 30)))
+
+  def test_ParseRawRanges_invalid(self):
+    self.assertRaises(AssertionError, ParseRawRanges, '3,0,2,16')
+
+  def test_TransferListSimulator(self):
+    simulator = TransferListSimulator('system', record_timeline=True)
+    simulator.Run(self.TRANSFER_LIST.splitlines())
+
+    self.assertEqual(4, simulator.version)
+    self.assertEqual(24, simulator.blocks_written)
+    self.assertEqual(24, simulator.expected_blocks_written)
+    # The move overlaps its source blocks, which are stashed implicitly.
+    self.assertEqual(4, simulator.stash.blocks_stashed)
+    self.assertEqual(2, simulator.stash.overlap_blocks_stashed)
+    self.assertEqual(4, simulator.stash.max_stash_needed)
+    self.assertEqual(0, simulator.stash.current_stash_size)
+    self.assertEqual(2 + 2 + 3, simulator.source_blocks_read)
+    self.assertEqual(4 + 1, simulator.stash_blocks_read)
+    self.assertEqual(2 + 4 + 2, simulator.blocks_reused)
+    self.assertAlmostEqual(28.0 / 24, simulator.write_amplification)
+    self.assertAlmostEqual(8.0 / 24, simulator.source_reuse)
+
+    self.assertEqual(
+        ['erase', 'stash', 'move', 'bsdiff', 'imgdiff', 'free', 'new', 'zero'],
+        [entry.command for entry in simulator.timeline])
+    self.assertEqual([0, 2, 2, 2, 2, 0, 0, 0],
+                     [entry.stash_occupancy for entry in simulator.timeline])
+
+  def test_TransferListSimulator_unknownCommand(self):
+    simulator = TransferListSimulator('system')
+    self.assertRaises(
+        ValueError, simulator.Run, ['4', '0', '0', '0', 'foo 2,0,1'])
+
+  def _construct_package(self):
+    package = common.MakeTempFile(suffix='.zip')
+    with zipfile.ZipFile(package, 'w', allowZip64=True) as package_zip:
+      package_zip.writestr(
+          'META-INF/com/android/metadata',
+          'ota-type=BLOCK\npre-device=device\npost-build=build\n')
+      for partition in ('system', 'vendor_dlkm'):
+        package_zip.writestr(partition + '.transfer.list', self.TRANSFER_LIST)
+        package_zip.writestr(partition + '.new.dat.br', b'\0' * 10)
+        package_zip.writestr(partition + '.patch.dat', b'\0' * 20)
+    return package
+
+  def test_Analyze(self):
+    with zipfile.ZipFile(self._construct_package()) as package:
+      package_parser = OtaPackageParser(package, record_timeline=True)
+      package_parser.Analyze()
+
+    self.assertEqual(['system', 'vendor_dlkm'],
+                     [simulator.partition
+                      for simulator in package_parser.simulators])
+    self.assertEqual(48, package_parser.block_written)
+    self.assertEqual(20, package_parser.new_data_size)
+    self.assertEqual(40, package_parser.patch_data_size)
+
+    output = io.StringIO()
+    package_parser.WriteJson(output)
+    result = json.loads(output.getvalue())
+    self.assertEqual(['system', 'vendor_dlkm'],
+                     [summary['partition']
+                      for summary in result['partitions']])
+    self.assertEqual(24, result['partitions'][0]['blocks_written'])
+    self.assertEqual(8, len(result['partitions'][0]['timeline']))
+
+    output = io.StringIO()
+    package_parser.WriteCsv(output)
+    rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+    self.assertEqual(16, len(rows))
+    self.assertEqual(
+        {'partition': 'system', 'index': '2', 'command': 'move',
+         'blocks_written': '2', 'source_blocks_read': '2',
+         'stash_blocks_read': '0', 'blocks_stashed': '0',
+         'stash_occupancy': '2'},
+        rows[2])
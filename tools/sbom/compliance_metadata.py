@@ -16,94 +16,64 @@
 
 import sqlite3
 
+_SOONG_MODULE_COLUMNS = ('name, m.package, m.package as module_path, module_type as soong_module_type, built_files, '
+                         'installed_files, static_dep_files, whole_static_dep_files')
+
 class MetadataDb:
   def __init__(self, db):
-    self.conn = sqlite3.connect(':memory')
+    self.conn = sqlite3.connect(':memory:')
     self.conn.row_factory = sqlite3.Row
     with sqlite3.connect(db) as c:
       c.backup(self.conn)
     self.reorg()
+    # Maps loaded with bulk queries on first use
+    self._soong_modules_of_installed_files = None
+    self._soong_modules_of_built_files = None
+    self._module_licenses = None
+    self._package_licenses = None
+
+  def _create_split_table(self, table, columns, source):
+    """Create table from the rows of query source, whose last column has space separated values.
+
+    The table has one row for each of the values, which is in the last column of columns.
+    """
+    # The values are split by a recursive CTE, which takes the first of the remaining values in each step.
+    keys = ', '.join(columns[:-1])
+    self.conn.execute(f"create table {table} as "
+                      f"with recursive split({keys}, value, rest) as ("
+                      f"  select {keys}, '', trim(value) || ' ' from ({source}) "
+                      f"  union all "
+                      f"  select {keys}, substr(rest, 1, instr(rest, ' ') - 1), ltrim(substr(rest, instr(rest, ' ') + 1)) "
+                      f"  from split where rest != ''"
+                      f") "
+                      f"select {keys}, value as {columns[-1]} from split where value != ''")
 
   def reorg(self):
     # package_license table
-    self.conn.execute("create table package_license as "
-                      "select name as package, pkg_default_applicable_licenses as license "
-                      "from modules "
-                      "where module_type = 'package' ")
-    cursor = self.conn.execute("select package,license from package_license where license like '% %'")
-    multi_licenses_packages = cursor.fetchall()
-    cursor.close()
-    rows = []
-    for p in multi_licenses_packages:
-      licenses = p['license'].strip().split(' ')
-      for lic in licenses:
-        rows.append((p['package'], lic))
-    self.conn.executemany('insert into package_license values (?, ?)', rows)
-    self.conn.commit()
-
-    self.conn.execute("delete from package_license where license like '% %'")
-    self.conn.commit()
+    self._create_split_table('package_license', ['package', 'license'],
+                             "select name as package, pkg_default_applicable_licenses as value "
+                             "from modules "
+                             "where module_type = 'package' ")
 
     # module_license table
-    self.conn.execute("create table module_license as "
-                      "select distinct name as module, package, licenses as license "
-                      "from modules "
-                      "where licenses != '' ")
-    cursor = self.conn.execute("select module,package,license from module_license where license like '% %'")
-    multi_licenses_modules = cursor.fetchall()
-    cursor.close()
-    rows = []
-    for m in multi_licenses_modules:
-      licenses = m['license'].strip().split(' ')
-      for lic in licenses:
-        rows.append((m['module'], m['package'],lic))
-    self.conn.executemany('insert into module_license values (?, ?, ?)', rows)
-    self.conn.commit()
-
-    self.conn.execute("delete from module_license where license like '% %'")
-    self.conn.commit()
+    self._create_split_table('module_license', ['module', 'package', 'license'],
+                             "select distinct name as module, package, licenses as value "
+                             "from modules "
+                             "where licenses != '' ")
 
     # module_installed_file table
-    self.conn.execute("create table module_installed_file as "
-                      "select id as module_id, name as module_name, package, installed_files as installed_file "
-                      "from modules "
-                      "where installed_files != '' ")
-    cursor = self.conn.execute("select module_id, module_name, package, installed_file "
-                               "from module_installed_file where installed_file like '% %'")
-    multi_installed_file_modules = cursor.fetchall()
-    cursor.close()
-    rows = []
-    for m in multi_installed_file_modules:
-      installed_files = m['installed_file'].strip().split(' ')
-      for f in installed_files:
-        rows.append((m['module_id'], m['module_name'], m['package'], f))
-    self.conn.executemany('insert into module_installed_file values (?, ?, ?, ?)', rows)
-    self.conn.commit()
-
-    self.conn.execute("delete from module_installed_file where installed_file like '% %'")
-    self.conn.commit()
+    self._create_split_table('module_installed_file', ['module_id', 'module_name', 'package', 'installed_file'],
+                             "select id as module_id, name as module_name, package, installed_files as value "
+                             "from modules "
+                             "where installed_files != '' ")
 
     # module_built_file table
-    self.conn.execute("create table module_built_file as "
-                      "select id as module_id, name as module_name, package, built_files as built_file "
-                      "from modules "
-                      "where built_files != '' ")
-    cursor = self.conn.execute("select module_id, module_name, package, built_file "
-                               "from module_built_file where built_file like '% %'")
-    multi_built_file_modules = cursor.fetchall()
-    cursor.close()
-    rows = []
-    for m in multi_built_file_modules:
-      built_files = m['installed_file'].strip().split(' ')
-      for f in built_files:
-        rows.append((m['module_id'], m['module_name'], m['package'], f))
-    self.conn.executemany('insert into module_built_file values (?, ?, ?, ?)', rows)
-    self.conn.commit()
-
-    self.conn.execute("delete from module_built_file where built_file like '% %'")
+    self._create_split_table('module_built_file', ['module_id', 'module_name', 'package', 'built_file'],
+                             "select id as module_id, name as module_name, package, built_files as value "
+                             "from modules "
+                             "where built_files != '' ")
     self.conn.commit()
 
-
     # Indexes
     self.conn.execute('create index idx_modules_id on modules (id)')
     self.conn.execute('create index idx_modules_name on modules (name)')
@@ -144,61 +114,67 @@ class MetadataDb:
     return soong_modules
 
   def get_package_licenses(self, package):
-    cursor = self.conn.execute('select m.name, m.package, m.lic_license_text as license_text '
-                               'from package_license pl join modules m on pl.license = m.name '
-                               'where pl.package = ?',
-                               ('//' + package,))
-    rows = cursor.fetchall()
-    licenses = {}
-    for r in rows:
-      licenses[r['name']] = r['license_text']
-    return licenses
+    return dict(self.get_all_package_licenses().get('//' + package, {}))
 
   def get_module_licenses(self, module_name, package):
-    licenses = {}
     # If property "licenses" is defined on module
-    cursor = self.conn.execute('select m.name, m.package, m.lic_license_text as license_text '
-                               'from module_license ml join modules m on ml.license = m.name '
-                               'where ml.module = ? and ml.package = ?',
-                               (module_name, package))
-    rows = cursor.fetchall()
-    for r in rows:
-      licenses[r['name']] = r['license_text']
-    if len(licenses) > 0:
-      return licenses
+    licenses = self.get_all_module_licenses().get((module_name, package))
+    if licenses:
+      return dict(licenses)
 
     # Use default package license
-    cursor = self.conn.execute('select m.name, m.package, m.lic_license_text as license_text '
-                               'from package_license pl join modules m on pl.license = m.name '
-                               'where pl.package = ?',
-                               ('//' + package,))
-    rows = cursor.fetchall()
-    for r in rows:
-      licenses[r['name']] = r['license_text']
-    return licenses
+    return self.get_package_licenses(package)
 
   def get_soong_module_of_installed_file(self, installed_file):
-    cursor = self.conn.execute('select name, m.package, m.package as module_path, module_type as soong_module_type, built_files, installed_files, static_dep_files, whole_static_dep_files '
-                               'from modules m join module_installed_file mif on m.id = mif.module_id '
-                               'where mif.installed_file = ?',
-                               (installed_file,))
-    rows = cursor.fetchall()
-    cursor.close()
-    if rows:
-      soong_module = dict(zip(rows[0].keys(), rows[0]))
-      return soong_module
-
-    return None
+    soong_module = self.get_soong_modules_of_installed_files().get(installed_file)
+    return dict(soong_module) if soong_module else None
 
   def get_soong_module_of_built_file(self, built_file):
-    cursor = self.conn.execute('select name, m.package, m.package as module_path, module_type as soong_module_type, built_files, installed_files, static_dep_files, whole_static_dep_files '
-                               'from modules m join module_built_file mbf on m.id = mbf.module_id '
-                               'where mbf.built_file = ?',
-                               (built_file,))
-    rows = cursor.fetchall()
-    cursor.close()
-    if rows:
-      soong_module = dict(zip(rows[0].keys(), rows[0]))
-      return soong_module
+    soong_module = self.get_soong_modules_of_built_files().get(built_file)
+    return dict(soong_module) if soong_module else None
+
+  def _get_licenses_map(self, query, num_key_columns):
+    # Map the keys in the first columns of the rows of query to {license name: license text}
+    licenses_map = {}
+    for row in self.conn.execute(query):
+      key = tuple(row)[:num_key_columns] if num_key_columns > 1 else row[0]
+      licenses_map.setdefault(key, {})[row['name']] = row['license_text']
+    return licenses_map
+
+  def get_all_package_licenses(self):
+    """Return {package: {license name: license text}} of the default licenses of all packages."""
+    if self._package_licenses is None:
+      self._package_licenses = self._get_licenses_map(
+          'select pl.package, m.name, m.lic_license_text as license_text '
+          'from package_license pl join modules m on pl.license = m.name', 1)
+    return self._package_licenses
+
+  def get_all_module_licenses(self):
+    """Return {(module name, package): {license name: license text}} of all modules with property "licenses"."""
+    if self._module_licenses is None:
+      self._module_licenses = self._get_licenses_map(
+          'select ml.module, ml.package, m.name, m.lic_license_text as license_text '
+          'from module_license ml join modules m on ml.license = m.name', 2)
+    return self._module_licenses
+
+  def _get_soong_modules_map(self, table, file_column):
+    # Map each file to the first soong module of it in table
+    soong_modules = {}
+    for row in self.conn.execute(f'select f.{file_column}, {_SOONG_MODULE_COLUMNS} '
+                                 f'from {table} f join modules m on m.id = f.module_id '
+                                 f'order by f.rowid'):
+      soong_module = dict(zip(row.keys()[1:], tuple(row)[1:]))
+      soong_modules.setdefault(row[0], soong_module)
+    return soong_modules
 
-    return None
\ No newline at end of file
+  def get_soong_modules_of_installed_files(self):
+    """Return {installed file: soong module metadata} of all installed files of soong modules."""
+    if self._soong_modules_of_installed_files is None:
+      self._soong_modules_of_installed_files = self._get_soong_modules_map('module_installed_file', 'installed_file')
+    return self._soong_modules_of_installed_files
+
+  def get_soong_modules_of_built_files(self):
+    """Return {built file: soong module metadata} of all built files of soong modules."""
+    if self._soong_modules_of_built_files is None:
+      self._soong_modules_of_built_files = self._get_soong_modules_map('module_built_file', 'built_file')
+    return self._soong_modules_of_built_files
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sqlite3
+import tempfile
+import unittest
+import compliance_metadata
+
+MODULES = [
+    # id, name, package, module_type, pkg_default_applicable_licenses, licenses, lic_license_text,
+    # installed_files, built_files, static_dep_files, whole_static_dep_files
+    (1, '//external/foo', '', 'package', 'foo_license  bar_license ', '', '', '', '', '', ''),
+    (2, 'foo_license', 'external/foo', 'license', '', '', 'external/foo/LICENSE', '', '', '', ''),
+    (3, 'bar_license', 'external/foo', 'license', '', '', 'external/foo/NOTICE', '', '', '', ''),
+    (4, 'libfoo', 'external/foo', 'cc_library', '', '', '', 'out/system/lib/libfoo.so out/vendor/lib/libfoo.so',
+     'out/libfoo.so out/libfoo.a', 'out/libbar.a', ''),
+    (5, 'libbar', 'external/foo', 'cc_library_static', '', 'bar_license', '', '', 'out/libbar.a', '', ''),
+]
+
+
+class MetadataDbTest(unittest.TestCase):
+
+  def setUp(self):
+    tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(tmpdir.cleanup)
+    db_file = os.path.join(tmpdir.name, 'compliance-metadata.db')
+    with sqlite3.connect(db_file) as conn:
+      conn.execute('create table modules (id integer, name text, package text, module_type text, '
+                   'pkg_default_applicable_licenses text, licenses text, lic_license_text text, '
+                   'installed_files text, built_files text, static_dep_files text, whole_static_dep_files text)')
+      conn.executemany('insert into modules values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', MODULES)
+    self.db = compliance_metadata.MetadataDb(db_file)
+
+  def test_get_module_licenses(self):
+    self.assertEqual({'bar_license': 'external/foo/NOTICE'},
+                     self.db.get_module_licenses('libbar', 'external/foo'))
+    # Modules without property "licenses" have the default licenses of their packages
+    self.assertEqual({'foo_license': 'external/foo/LICENSE', 'bar_license': 'external/foo/NOTICE'},
+                     self.db.get_module_licenses('libfoo', 'external/foo'))
+    self.assertEqual({}, self.db.get_module_licenses('libbaz', 'external/baz'))
+
+  def test_get_soong_module_of_files(self):
+    for installed_file in ('out/system/lib/libfoo.so', 'out/vendor/lib/libfoo.so'):
+      self.assertEqual('libfoo', self.db.get_soong_module_of_installed_file(installed_file)['name'])
+    self.assertIsNone(self.db.get_soong_module_of_installed_file('out/libfoo.so'))
+
+    soong_module = self.db.get_soong_module_of_built_file('out/libbar.a')
+    self.assertEqual({
+        'name': 'libbar',
+        'package': 'external/foo',
+        'module_path': 'external/foo',
+        'soong_module_type': 'cc_library_static',
+        'built_files': 'out/libbar.a',
+        'installed_files': '',
+        'static_dep_files': '',
+        'whole_static_dep_files': '',
+    }, soong_module)
+    self.assertEqual(['out/libbar.a', 'out/libfoo.a', 'out/libfoo.so'],
+                     sorted(self.db.get_soong_modules_of_built_files()))
+
+
+if __name__ == '__main__':
+  unittest.main(verbosity=2)
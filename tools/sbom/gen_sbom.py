@@ -26,16 +26,17 @@ Usage example:
 """
 
 import argparse
+import collections
 import compliance_metadata
 import datetime
+import file_checksums
 import google.protobuf.text_format as text_format
-import hashlib
 import os
 import pathlib
-import queue
 import metadata_file_pb2
 import sbom_data
 import sbom_writers
+import sqlite3
 
 # Package type
 PKG_SOURCE = 'SOURCE'
@@ -138,6 +139,7 @@ def get_args():
   parser.add_argument('--build_version', required=True, help='The build version.')
   parser.add_argument('--product_mfr', required=True, help='The product manufacturer.')
   parser.add_argument('--json', action='store_true', default=False, help='Generated SBOM file in SPDX JSON format')
+  parser.add_argument('--checksum_cache', help='The file to cache the checksums of files across runs.')
 
   return parser.parse_args()
 
@@ -160,14 +162,87 @@ def new_license_id(license_name):
   return f'LicenseRef-{sbom_data.encode_for_spdxid(license_name)}'
 
 
-def checksum(file_path):
-  h = hashlib.sha1()
-  if os.path.islink(file_path):
-    h.update(os.readlink(file_path).encode('utf-8'))
-  else:
-    with open(file_path, 'rb') as f:
-      h.update(f.read())
-  return f'SHA1: {h.hexdigest()}'
+class StreamingSbom:
+  """Write the files and relationships of an SBOM as they are added, so they are not kept in memory.
+
+  Files are spooled by the writers in batches, after the checksums of the files in a batch are computed in
+  parallel. The relationships are stored in a temporary on-disk SQLite database, which drops the duplicates and
+  sorts them for each output format. finish() writes the output files, with the document headers, packages and
+  licenses, which are kept in doc.
+  """
+  CHECKSUM_BATCH_SIZE = 1000
+
+  def __init__(self, doc, prefix, write_json, checksum_cache):
+    self.doc = doc
+    self.checksums = file_checksums.FileChecksums(checksum_cache, follow_symlinks=False)
+    # The output is written to temporary files, which replace the output files at the end, so no invalid SBOM is
+    # left if the generation fails.
+    self.output_paths = [prefix + '.spdx']
+    if write_json:
+      self.output_paths.append(prefix + '.spdx.json')
+    self.output_files = [open(path + '.tmp', 'w', encoding='utf-8') for path in self.output_paths]
+    self.tagvalue_writer = sbom_writers.StreamingTagValueWriter(doc, self.output_files[0])
+    self.writers = [self.tagvalue_writer]
+    self.json_writer = None
+    if write_json:
+      self.json_writer = sbom_writers.StreamingJSONWriter(doc, self.output_files[1])
+      self.writers.append(self.json_writer)
+    self.pending_files = []
+    # Package id -> checksums of the files of the package, for its verification code
+    self.package_checksums = {}
+    # An empty file name is a temporary database on disk, only its page cache is kept in memory.
+    self.relationships = sqlite3.connect('')
+    self.relationships.execute('CREATE TABLE relationships (id1 TEXT, relationship TEXT, id2 TEXT, '
+                               'UNIQUE (id1, relationship, id2))')
+
+  def add_file(self, file, file_path=None, package=None):
+    """Add a file, whose checksum is computed from file_path if it is given. The file must not change after."""
+    self.pending_files.append((file, file_path, package))
+    if len(self.pending_files) >= self.CHECKSUM_BATCH_SIZE:
+      self.write_pending_files()
+
+  def write_pending_files(self):
+    sha1s = self.checksums.get_checksums(file_path for _, file_path, _ in self.pending_files if file_path)
+    for file, file_path, package in self.pending_files:
+      if file_path:
+        file.checksum = f'SHA1: {sha1s[file_path]}'
+      package_id = None
+      if package:
+        package_id = package.id
+        package.file_ids.append(file.id)
+        self.package_checksums.setdefault(package_id, []).append(file.checksum.split(': ')[1])
+      for writer in self.writers:
+        writer.add_file(file, package_id)
+    self.pending_files = []
+
+  def add_relationship(self, rel):
+    self.relationships.execute('INSERT OR IGNORE INTO relationships VALUES (?, ?, ?)',
+                               (rel.id1, rel.relationship, rel.id2))
+
+  def has_relationship(self, rel):
+    return self.relationships.execute('SELECT 1 FROM relationships WHERE id1 = ? AND relationship = ? AND id2 = ?',
+                                      (rel.id1, rel.relationship, rel.id2)).fetchone() is not None
+
+  def get_relationships(self, order):
+    """Yield the relationships sorted by an SQL expression, like the sort_relationships() of the writers."""
+    # The rowid keeps the order in which relationships with the same key were added, like a stable sort.
+    for id1, relationship, id2 in self.relationships.execute(
+        f'SELECT id1, relationship, id2 FROM relationships ORDER BY {order}, rowid'):
+      yield sbom_data.Relationship(id1=id1, relationship=relationship, id2=id2)
+
+  def finish(self):
+    self.write_pending_files()
+    self.checksums.save()
+    for package in self.doc.packages:
+      if package.id in self.package_checksums:
+        package.verification_code = sbom_data.generate_verification_code(self.package_checksums[package.id])
+    self.tagvalue_writer.finish(self.doc, self.get_relationships('id2 || id1'), self.has_relationship)
+    if self.json_writer:
+      self.json_writer.finish(self.doc, self.get_relationships('relationship || id2 || id1'))
+    self.relationships.close()
+    for output_file, path in zip(self.output_files, self.output_paths):
+      output_file.close()
+      os.replace(output_file.name, path)
 
 
 def is_soong_prebuilt_module(file_metadata):
@@ -477,28 +552,28 @@ def report_metadata_file(metadata_file_path, installed_file_metadata, report):
 
 
 # If a file is from a source fork or prebuilt fork package, add its package information to SBOM
-def add_package_of_file(file_id, file_metadata, doc, report):
+def add_package_of_file(file_id, file_metadata, sbom, report):
   metadata_file_path = get_metadata_file_path(file_metadata)
   report_metadata_file(metadata_file_path, file_metadata, report)
 
   external_doc_ref, pkgs, rels, licenses = get_sbom_fragments(file_metadata, metadata_file_path)
   if len(pkgs) > 0:
     if external_doc_ref:
-      doc.add_external_ref(external_doc_ref)
+      sbom.doc.add_external_ref(external_doc_ref)
     for p in pkgs:
-      doc.add_package(p)
+      sbom.doc.add_package(p)
     for rel in rels:
-      doc.add_relationship(rel)
+      sbom.add_relationship(rel)
     fork_package_id = pkgs[0].id  # The first package should be the source/prebuilt fork package
-    doc.add_relationship(sbom_data.Relationship(id1=file_id,
-                                                relationship=sbom_data.RelationshipType.GENERATED_FROM,
-                                                id2=fork_package_id))
+    sbom.add_relationship(sbom_data.Relationship(id1=file_id,
+                                                 relationship=sbom_data.RelationshipType.GENERATED_FROM,
+                                                 id2=fork_package_id))
     for license in licenses:
-      doc.add_license(license)
+      sbom.doc.add_license(license)
 
 
 # Add STATIC_LINK relationship for static dependencies of a file
-def add_static_deps_of_file(file_id, file_metadata, doc):
+def add_static_deps_of_file(file_id, file_metadata, sbom):
   if not file_metadata['static_dep_files'] and not file_metadata['whole_static_dep_files']:
     return
   static_dep_files = []
@@ -509,16 +584,15 @@ def add_static_deps_of_file(file_id, file_metadata, doc):
 
   for dep_file in static_dep_files:
     # Static libs are not shipped on devices, so names are derived from .intermediates paths.
-    doc.add_relationship(sbom_data.Relationship(id1=file_id,
-                                                relationship=sbom_data.RelationshipType.STATIC_LINK,
-                                                id2=new_file_id(
-                                                  dep_file.removeprefix(args.soong_out + '/.intermediates/'))))
+    sbom.add_relationship(sbom_data.Relationship(id1=file_id,
+                                                 relationship=sbom_data.RelationshipType.STATIC_LINK,
+                                                 id2=new_file_id(
+                                                   dep_file.removeprefix(args.soong_out + '/.intermediates/'))))
 
 
-def add_licenses_of_file(file_id, file_metadata, doc):
+def add_licenses_of_file(file, file_metadata, sbom):
   lics = db.get_module_licenses(file_metadata.get('name', ''), file_metadata['module_path'])
   if lics:
-    file = next(f for f in doc.files if file_id == f.id)
     for license_name, license_files in lics.items():
       if not license_files:
         continue
@@ -528,44 +602,41 @@ def add_licenses_of_file(file_id, file_metadata, doc):
         license_text = get_license_text(license_files.split(' '))
         licenses_text[license_name] = license_text
 
-      doc.add_license(sbom_data.License(id=license_id, name=license_name, text=licenses_text[license_name]))
+      sbom.doc.add_license(sbom_data.License(id=license_id, name=license_name, text=licenses_text[license_name]))
 
 
 def get_all_transitive_static_dep_files_of_installed_files(installed_files_metadata, db, report):
-  # Find all transitive static dep files of all installed files
-  q = queue.Queue()
+  # Find all transitive static dep files of all installed files, by a traversal of the graph of built files
+  soong_modules_of_built_files = db.get_soong_modules_of_built_files()
+
+  def get_static_dep_files(metadata):
+    static_dep_files = []
+    for key in ('static_dep_files', 'whole_static_dep_files'):
+      if metadata[key]:
+        static_dep_files += metadata[key].split(' ')
+    return static_dep_files
+
+  to_visit = collections.deque()
   for installed_file_metadata in installed_files_metadata:
-    if installed_file_metadata['static_dep_files']:
-      for f in installed_file_metadata['static_dep_files'].split(' '):
-        q.put(f)
-    if installed_file_metadata['whole_static_dep_files']:
-      for f in installed_file_metadata['whole_static_dep_files'].split(' '):
-        q.put(f)
-
-  all_static_dep_files = {}
-  while not q.empty():
-    dep_file = q.get()
+    to_visit += get_static_dep_files(installed_file_metadata)
+
+  all_static_dep_files = set()
+  while to_visit:
+    dep_file = to_visit.popleft()
     if dep_file in all_static_dep_files:
       # It has been processed
       continue
 
-    all_static_dep_files[dep_file] = True
-    soong_module = db.get_soong_module_of_built_file(dep_file)
+    all_static_dep_files.add(dep_file)
+    soong_module = soong_modules_of_built_files.get(dep_file)
     if not soong_module:
       # This should not happen, add to report[ISSUE_NO_MODULE_FOUND_FOR_STATIC_DEP]
-      report[ISSUE_NO_MODULE_FOUND_FOR_STATIC_DEP].append(f)
+      report[ISSUE_NO_MODULE_FOUND_FOR_STATIC_DEP].append(dep_file)
       continue
 
-    if soong_module['static_dep_files']:
-      for f in soong_module['static_dep_files'].split(' '):
-        if f not in all_static_dep_files:
-          q.put(f)
-    if soong_module['whole_static_dep_files']:
-      for f in soong_module['whole_static_dep_files'].split(' '):
-        if f not in all_static_dep_files:
-          q.put(f)
+    to_visit += (f for f in get_static_dep_files(soong_module) if f not in all_static_dep_files)
 
-  return sorted(all_static_dep_files.keys())
+  return sorted(all_static_dep_files)
 
 
 def main():
@@ -605,6 +676,15 @@ def main():
                                         supplier='Organization: ' + args.product_mfr,
                                         declared_license_ids=[sbom_data.SPDXID_LICENSE_APACHE]))
 
+  # The files and relationships are written to the output files as they are added
+  doc.created = datetime.datetime.now(tz=datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+  prefix = args.output_file
+  if prefix.endswith('.spdx'):
+    prefix = prefix.removesuffix('.spdx')
+  elif prefix.endswith('.spdx.json'):
+    prefix = prefix.removesuffix('.spdx.json')
+  sbom = StreamingSbom(doc, prefix, args.json, args.checksum_cache)
+
   # Report on some issues and information
   report = {
       ISSUE_NO_METADATA: [],
@@ -620,8 +700,9 @@ def main():
   installed_files_metadata = db.get_installed_files()
 
   # Find which Soong module an installed file is from and merge metadata from Make and Soong
+  soong_modules_of_installed_files = db.get_soong_modules_of_installed_files()
   for installed_file_metadata in installed_files_metadata:
-    soong_module = db.get_soong_module_of_installed_file(installed_file_metadata['installed_file'])
+    soong_module = soong_modules_of_installed_files.get(installed_file_metadata['installed_file'])
     if soong_module:
       # Merge soong metadata to make metadata
       installed_file_metadata.update(soong_module)
@@ -647,19 +728,16 @@ def main():
       continue
 
     file_id = new_file_id(installed_file)
-    sha1 = checksum(build_output_path)
-    f = sbom_data.File(id=file_id, name=installed_file, checksum=sha1)
-    doc.files.append(f)
-    product_package.file_ids.append(file_id)
+    f = sbom_data.File(id=file_id, name=installed_file, checksum=None)
 
     if is_source_package(installed_file_metadata) or is_prebuilt_package(installed_file_metadata):
-      add_package_of_file(file_id, installed_file_metadata, doc, report)
+      add_package_of_file(file_id, installed_file_metadata, sbom, report)
 
     elif module_path or installed_file_metadata['is_platform_generated']:
       # File from PLATFORM package
-      doc.add_relationship(sbom_data.Relationship(id1=file_id,
-                                                  relationship=sbom_data.RelationshipType.GENERATED_FROM,
-                                                  id2=sbom_data.SPDXID_PLATFORM))
+      sbom.add_relationship(sbom_data.Relationship(id1=file_id,
+                                                   relationship=sbom_data.RelationshipType.GENERATED_FROM,
+                                                   id2=sbom_data.SPDXID_PLATFORM))
       if installed_file_metadata['is_platform_generated']:
         f.concluded_license_ids = [sbom_data.SPDXID_LICENSE_APACHE]
 
@@ -668,30 +746,31 @@ def main():
       src_path = product_copy_files.split(':')[0]
       # So far product_copy_files are copied from directory system, kernel, hardware, frameworks and device,
       # so process them as files from PLATFORM package
-      doc.add_relationship(sbom_data.Relationship(id1=file_id,
-                                                  relationship=sbom_data.RelationshipType.GENERATED_FROM,
-                                                  id2=sbom_data.SPDXID_PLATFORM))
+      sbom.add_relationship(sbom_data.Relationship(id1=file_id,
+                                                   relationship=sbom_data.RelationshipType.GENERATED_FROM,
+                                                   id2=sbom_data.SPDXID_PLATFORM))
       if installed_file_metadata['license_text']:
         if installed_file_metadata['license_text'] == 'build/soong/licenses/LICENSE':
           f.concluded_license_ids = [sbom_data.SPDXID_LICENSE_APACHE]
 
     elif installed_file.endswith('.fsv_meta'):
-      doc.add_relationship(sbom_data.Relationship(id1=file_id,
-                                                  relationship=sbom_data.RelationshipType.GENERATED_FROM,
-                                                  id2=sbom_data.SPDXID_PLATFORM))
+      sbom.add_relationship(sbom_data.Relationship(id1=file_id,
+                                                   relationship=sbom_data.RelationshipType.GENERATED_FROM,
+                                                   id2=sbom_data.SPDXID_PLATFORM))
       f.concluded_license_ids = [sbom_data.SPDXID_LICENSE_APACHE]
 
     elif kernel_module_copy_files.startswith('ANDROID-GEN'):
       # For the four files generated for _dlkm, _ramdisk partitions
-      doc.add_relationship(sbom_data.Relationship(id1=file_id,
-                                                  relationship=sbom_data.RelationshipType.GENERATED_FROM,
-                                                  id2=sbom_data.SPDXID_PLATFORM))
+      sbom.add_relationship(sbom_data.Relationship(id1=file_id,
+                                                   relationship=sbom_data.RelationshipType.GENERATED_FROM,
+                                                   id2=sbom_data.SPDXID_PLATFORM))
 
     # Process static dependencies of the installed file
-    add_static_deps_of_file(file_id, installed_file_metadata, doc)
+    add_static_deps_of_file(file_id, installed_file_metadata, sbom)
 
     # Add licenses of the installed file
-    add_licenses_of_file(file_id, installed_file_metadata, doc)
+    add_licenses_of_file(f, installed_file_metadata, sbom)
+    sbom.add_file(f, build_output_path, product_package)
 
   # Add all static library files to SBOM
   for dep_file in get_all_transitive_static_dep_files_of_installed_files(installed_files_metadata, db, report):
@@ -699,39 +778,26 @@ def main():
     file_id = new_file_id(filepath)
     # SHA1 of empty string. Sometimes .a files might not be built.
     sha1 = 'SHA1: da39a3ee5e6b4b0d3255bfef95601890afd80709'
-    if os.path.islink(dep_file) or os.path.isfile(dep_file):
-      sha1 = checksum(dep_file)
-    doc.files.append(sbom_data.File(id=file_id,
-                                    name=filepath,
-                                    checksum=sha1))
+    f = sbom_data.File(id=file_id, name=filepath, checksum=sha1)
     file_metadata = {
         'installed_file': dep_file,
         'is_prebuilt_make_module': False
     }
     file_metadata.update(db.get_soong_module_of_built_file(dep_file))
-    add_package_of_file(file_id, file_metadata, doc, report)
+    add_package_of_file(file_id, file_metadata, sbom, report)
 
     # Add relationships for static deps of static libraries
-    add_static_deps_of_file(file_id, file_metadata, doc)
+    add_static_deps_of_file(file_id, file_metadata, sbom)
 
     # Add licenses of the static lib
-    add_licenses_of_file(file_id, file_metadata, doc)
+    add_licenses_of_file(f, file_metadata, sbom)
+    if os.path.islink(dep_file) or os.path.isfile(dep_file):
+      sbom.add_file(f, dep_file)
+    else:
+      sbom.add_file(f)
 
   # Save SBOM records to output file
-  doc.generate_packages_verification_code()
-  doc.created = datetime.datetime.now(tz=datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
-  prefix = args.output_file
-  if prefix.endswith('.spdx'):
-    prefix = prefix.removesuffix('.spdx')
-  elif prefix.endswith('.spdx.json'):
-    prefix = prefix.removesuffix('.spdx.json')
-
-  output_file = prefix + '.spdx'
-  with open(output_file, 'w', encoding="utf-8") as file:
-    sbom_writers.TagValueWriter.write(doc, file)
-  if args.json:
-    with open(prefix + '.spdx.json', 'w', encoding="utf-8") as file:
-      sbom_writers.JSONWriter.write(doc, file)
+  sbom.finish()
 
   save_report(prefix + '-gen-report.txt', report)
 
@@ -26,8 +26,8 @@ Usage example:
 import argparse
 import csv
 import datetime
+import file_checksums
 import google.protobuf.text_format as text_format
-import hashlib
 import os
 import metadata_file_pb2
 import sbom_data
@@ -134,6 +134,7 @@ def get_args():
   parser.add_argument('--json', action='store_true', default=False, help='Generated SBOM file in SPDX JSON format')
   parser.add_argument('--unbundled_apk', action='store_true', default=False, help='Generate SBOM for unbundled APKs')
   parser.add_argument('--unbundled_apex', action='store_true', default=False, help='Generate SBOM for unbundled APEXs')
+  parser.add_argument('--checksum_cache', help='The file to cache the checksums of files across runs.')
 
   return parser.parse_args()
 
@@ -152,14 +153,13 @@ def new_file_id(file_path):
   return f'SPDXRef-{sbom_data.encode_for_spdxid(file_path)}'
 
 
-def checksum(file_path):
-  h = hashlib.sha1()
-  if os.path.islink(file_path):
-    h.update(os.readlink(file_path).encode('utf-8'))
-  else:
-    with open(file_path, 'rb') as f:
-      h.update(f.read())
-  return f'SHA1: {h.hexdigest()}'
+def set_checksums(files_and_paths):
+  """Set the checksums of (sbom_data.File, file path) pairs. The files are hashed in parallel."""
+  checksums = file_checksums.FileChecksums(args.checksum_cache, follow_symlinks=False)
+  sha1s = checksums.get_checksums(file_path for _, file_path in files_and_paths)
+  for file, file_path in files_and_paths:
+    file.checksum = f'SHA1: {sha1s[file_path]}'
+  checksums.save()
 
 
 def is_soong_prebuilt_module(file_metadata):
@@ -440,6 +440,8 @@ def generate_sbom_for_unbundled_apk():
     doc = sbom_data.Document(name=args.build_version,
                              namespace=f'https://www.google.com/sbom/spdx/android/{args.build_version}',
                              creators=['Organization: ' + args.product_mfr])
+    # The checksums of the files are computed together after the scan.
+    files_to_checksum = []
     for installed_file_metadata in reader:
       installed_file = installed_file_metadata['installed_file']
       if args.output_file != installed_file_metadata['build_output_path'] + '.spdx.json':
@@ -454,7 +456,8 @@ def generate_sbom_for_unbundled_apk():
       file_id = new_file_id(installed_file)
       file = sbom_data.File(id=file_id,
                             name=installed_file,
-                            checksum=checksum(installed_file_metadata['build_output_path']))
+                            checksum=None)
+      files_to_checksum.append((file, installed_file_metadata['build_output_path']))
       relationship = sbom_data.Relationship(id1=file_id,
                                             relationship=sbom_data.RelationshipType.GENERATED_FROM,
                                             id2=package_id)
@@ -465,6 +468,8 @@ def generate_sbom_for_unbundled_apk():
       doc.created = datetime.datetime.now(tz=datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
       break
 
+  set_checksums(files_to_checksum)
+
   with open(args.output_file, 'w', encoding='utf-8') as file:
     sbom_writers.JSONWriter.write(doc, file)
   fragment_file = args.output_file.removesuffix('.spdx.json') + '-fragment.spdx'
@@ -523,6 +528,8 @@ def main():
   }
 
   # Scan the metadata in CSV file and create the corresponding package and file records in SPDX
+  # The checksums of the files are computed together after the scan.
+  files_to_checksum = []
   with open(args.metadata, newline='') as sbom_metadata_file:
     reader = csv.DictReader(sbom_metadata_file)
     for installed_file_metadata in reader:
@@ -546,11 +553,10 @@ def main():
       # As a workaround, use the following SHA1 checksum for static libraries created by Soong, if .a files could not be
       # located correctly because Soong doesn't report the information to Make.
       sha1 = 'SHA1: da39a3ee5e6b4b0d3255bfef95601890afd80709'  # SHA1 of empty string
+      file = sbom_data.File(id=file_id, name=installed_file, checksum=sha1)
       if os.path.islink(build_output_path) or os.path.isfile(build_output_path):
-        sha1 = checksum(build_output_path)
-      doc.files.append(sbom_data.File(id=file_id,
-                                      name=installed_file,
-                                      checksum=sha1))
+        files_to_checksum.append((file, build_output_path))
+      doc.files.append(file)
 
       if not is_static_lib:
         if not args.unbundled_apex:
@@ -610,6 +616,8 @@ def main():
                                                       relationship=sbom_data.RelationshipType.STATIC_LINK,
                                                       id2=new_file_id(lib + '.a')))
 
+  set_checksums(files_to_checksum)
+
   if args.unbundled_apex:
     doc.describes = doc.files[0].id
 
@@ -109,6 +109,41 @@ class License:
   name: str
 
 
+class _ListIndex:
+  """Positions of the items of a list by key, kept up to date with appends.
+
+  Items appended to the list since the last lookup are indexed on the next
+  lookup, so callers can keep appending to the list directly. The list is
+  indexed again if it is replaced, or if the last indexed item moved.
+  """
+
+  def __init__(self, key):
+    self._key = key
+    self._items = None
+    self._num_indexed = 0
+    self._last_item = None
+    self._positions = {}
+
+  def positions(self, items):
+    """Return {key: [positions of the items with the key]} of items."""
+    if (items is not self._items or len(items) < self._num_indexed or
+        (self._num_indexed and items[self._num_indexed - 1] is not self._last_item)):
+      self._items = items
+      self._num_indexed = 0
+      self._positions = {}
+    for i in range(self._num_indexed, len(items)):
+      self._positions.setdefault(self._key(items[i]), []).append(i)
+    self._num_indexed = len(items)
+    if items:
+      self._last_item = items[-1]
+    return self._positions
+
+  def get(self, items, key):
+    """Return the first item with the key in items, or None."""
+    positions = self.positions(items).get(key)
+    return items[positions[0]] if positions else None
+
+
 @dataclass
 class Document:
   name: str
@@ -123,12 +158,20 @@ class Document:
   relationships: List[Relationship] = field(default_factory=list)
   licenses: List[License] = field(default_factory=list)
 
+  def __post_init__(self):
+    # Indexes of the lists above, to find items by their IDs without scanning the lists.
+    self._external_ref_index = _ListIndex(lambda ref: ref.uri)
+    self._package_index = _ListIndex(lambda p: p.id)
+    self._file_index = _ListIndex(lambda f: f.id)
+    self._relationship_index = _ListIndex(lambda r: r)
+    self._license_index = _ListIndex(lambda l: l.id)
+
   def add_external_ref(self, external_ref):
-    if not any(external_ref.uri == ref.uri for ref in self.external_refs):
+    if not self._external_ref_index.get(self.external_refs, external_ref.uri):
       self.external_refs.append(external_ref)
 
   def add_package(self, package):
-    p = next((p for p in self.packages if package.id == p.id), None)
+    p = self.get_package(package.id)
     if not p:
       self.packages.append(package)
     else:
@@ -137,27 +180,42 @@ class Document:
           p.declared_license_ids.append(license_id)
 
   def add_relationship(self, rel):
-    if not any(rel.id1 == r.id1 and rel.id2 == r.id2 and rel.relationship == r.relationship
-               for r in self.relationships):
+    if not self.has_relationship(rel):
       self.relationships.append(rel)
 
   def add_license(self, license):
-    if not any(license.id == l.id for l in self.licenses):
+    if not self._license_index.get(self.licenses, license.id):
       self.licenses.append(license)
 
+  def get_package(self, package_id):
+    return self._package_index.get(self.packages, package_id)
+
+  def get_file(self, file_id):
+    return self._file_index.get(self.files, file_id)
+
+  def get_files(self, file_ids):
+    """Return the files with the IDs, in the order of the files of the document."""
+    positions = self._file_index.positions(self.files)
+    return [self.files[i] for i in sorted(i for file_id in set(file_ids)
+                                          for i in positions.get(file_id, ()))]
+
+  def has_relationship(self, rel):
+    return self._relationship_index.get(self.relationships, rel) is not None
+
   def generate_packages_verification_code(self):
     for package in self.packages:
       if not package.file_ids:
         continue
 
-      checksums = []
-      for file in self.files:
-        if file.id in package.file_ids:
-          checksums.append(file.checksum.split(': ')[1])
-      checksums.sort()
-      h = hashlib.sha1()
-      h.update(''.join(checksums).encode(encoding='utf-8'))
-      package.verification_code = h.hexdigest()
+      checksums = [file.checksum.split(': ')[1] for file in self.get_files(package.file_ids)]
+      package.verification_code = generate_verification_code(checksums)
+
+
+def generate_verification_code(checksums):
+  """Return the package verification code of the SHA1 checksums of the files of a package."""
+  h = hashlib.sha1()
+  h.update(''.join(sorted(checksums)).encode(encoding='utf-8'))
+  return h.hexdigest()
 
 def encode_for_spdxid(s):
   """Simple encode for string values used in SPDXID which uses the charset of A-Za-Z0-9.-"""
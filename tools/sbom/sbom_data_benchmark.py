@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure how the time to build and write an SBOM document scales with the number of installed files.
+
+A document like the ones of gen_sbom is built for each number of files: each file is added with a
+package, a CONTAINS relationship from the product, a STATIC_LINK relationship and a license, and some
+of them again, as gen_sbom does for files shared by modules. The time per file should stay about the
+same as the number of files grows.
+"""
+
+import argparse
+import io
+import time
+import sbom_data
+import sbom_writers
+
+FILES_PER_PACKAGE = 10
+NUM_LICENSES = 100
+
+
+def build_doc(num_files):
+  doc = sbom_data.Document(name='benchmark',
+                           namespace='https://www.google.com/sbom/spdx/android/benchmark',
+                           creators=['Organization: Google'],
+                           created='2026-01-01T00:00:00Z')
+  product_package = sbom_data.Package(id=sbom_data.SPDXID_PRODUCT,
+                                      name=sbom_data.PACKAGE_NAME_PRODUCT,
+                                      files_analyzed=True)
+  doc.packages.append(product_package)
+  for i in range(num_files):
+    file_id = f'SPDXRef-file-{i}'
+    package_id = f'SPDXRef-PREBUILT-package-{i // FILES_PER_PACKAGE}'
+    license_id = f'LicenseRef-license-{i % NUM_LICENSES}'
+    doc.files.append(sbom_data.File(id=file_id, name=f'/system/lib/file{i}.so',
+                                    checksum=f'SHA1: {i:040x}',
+                                    concluded_license_ids=[license_id]))
+    product_package.file_ids.append(file_id)
+    doc.add_package(sbom_data.Package(id=package_id, name=package_id,
+                                      declared_license_ids=[license_id]))
+    doc.add_relationship(sbom_data.Relationship(id1=file_id,
+                                                relationship=sbom_data.RelationshipType.GENERATED_FROM,
+                                                id2=package_id))
+    doc.add_relationship(sbom_data.Relationship(id1=file_id,
+                                                relationship=sbom_data.RelationshipType.STATIC_LINK,
+                                                id2=f'SPDXRef-file-{i // 2}'))
+    doc.add_license(sbom_data.License(id=license_id, name=license_id, text='license text'))
+    doc.add_external_ref(sbom_data.DocumentExternalReference(id=f'DocumentRef-{i % NUM_LICENSES}',
+                                                             uri=f'uri-{i % NUM_LICENSES}',
+                                                             checksum='SHA1: 0'))
+  return doc
+
+
+def measure(fn):
+  start = time.perf_counter()
+  result = fn()
+  return result, time.perf_counter() - start
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--num_files', type=int, nargs='+', default=[1000, 10000, 50000, 200000],
+                      help='Numbers of files of the documents')
+  args = parser.parse_args()
+
+  print(f'{"files":>8} {"build":>10} {"verification":>13} {"tagvalue":>10} {"json":>10}  (us per file)')
+  for num_files in args.num_files:
+    doc, build_time = measure(lambda: build_doc(num_files))
+    _, code_time = measure(doc.generate_packages_verification_code)
+    _, tagvalue_time = measure(lambda: sbom_writers.TagValueWriter.write(doc, io.StringIO()))
+    _, json_time = measure(lambda: sbom_writers.JSONWriter.write(doc, io.StringIO()))
+    print(f'{num_files:>8} ' + ' '.join(f'{t * 1e6 / num_files:>{w}.1f}' for t, w in (
+        (build_time, 10), (code_time, 13), (tagvalue_time, 10), (json_time, 10))))
+
+
+if __name__ == '__main__':
+  main()
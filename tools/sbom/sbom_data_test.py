@@ -138,6 +138,32 @@ class SBOMDataTest(unittest.TestCase):
     self.sbom_doc.generate_packages_verification_code()
     self.assertEqual(expected_package_verification_code, self.sbom_doc.packages[0].verification_code)
 
+  def test_add_after_direct_changes(self):
+    # Items added to the lists directly are found by the add_* methods.
+    self.sbom_doc.packages.append(sbom_data.Package(id=SPDXID_PREBUILT_PACKAGE2,
+                                                    name='Prebuilt package2'))
+    self.sbom_doc.add_package(sbom_data.Package(id=SPDXID_PREBUILT_PACKAGE2,
+                                                name='Prebuilt package2',
+                                                declared_license_ids=[SPDXID_LICENSE1]))
+    self.assertEqual(1, len([p for p in self.sbom_doc.packages if p.id == SPDXID_PREBUILT_PACKAGE2]))
+    self.assertEqual([SPDXID_LICENSE1], self.sbom_doc.get_package(SPDXID_PREBUILT_PACKAGE2).declared_license_ids)
+
+    rel = sbom_data.Relationship(id1=SPDXID_FILE1,
+                                 relationship=sbom_data.RelationshipType.STATIC_LINK,
+                                 id2=SPDXID_FILE2)
+    self.sbom_doc.relationships = [rel]
+    self.sbom_doc.add_relationship(sbom_data.Relationship(id1=SPDXID_FILE1,
+                                                          relationship=sbom_data.RelationshipType.STATIC_LINK,
+                                                          id2=SPDXID_FILE2))
+    self.assertEqual([rel], self.sbom_doc.relationships)
+
+    self.assertEqual(self.sbom_doc.files[:2],
+                     self.sbom_doc.get_files([SPDXID_FILE2, SPDXID_FILE1]))
+    file = self.sbom_doc.files.pop()
+    self.sbom_doc.files.insert(0, file)
+    self.assertEqual([file, self.sbom_doc.files[1]],
+                     self.sbom_doc.get_files([self.sbom_doc.files[1].id, file.id]))
+
   def test_add_package_(self):
     self.sbom_doc.add_package(sbom_data.Package(id=SPDXID_PREBUILT_PACKAGE2,
                                                 name='Prebuilt package2',
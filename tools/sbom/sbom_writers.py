@@ -19,6 +19,9 @@ Serialize objects defined in package sbom_data to SPDX format: tagvalue, JSON.
 """
 
 import json
+import shutil
+import tempfile
+import textwrap
 import sbom_data
 
 SPDX_VER = 'SPDX-2.3'
@@ -124,16 +127,17 @@ class TagValueWriter:
           f'{Tags.RELATIONSHIP}: {sbom_doc.id} {sbom_data.RelationshipType.DESCRIBES} {sbom_doc.describes}')
       tagvalues.append('')
 
-    for file in sbom_doc.files:
-      if file.id in package.file_ids:
-        tagvalues += TagValueWriter.marshal_file(file)
+    for file in sbom_doc.get_files(package.file_ids):
+      tagvalues += TagValueWriter.marshal_file(file)
 
     return tagvalues
 
   @staticmethod
-  def marshal_packages(sbom_doc, fragment):
-    tagvalues = []
-    marshaled_relationships = []
+  def group_packages(sbom_doc, has_relationship):
+    """Yield the packages of sbom_doc in output order, as (packages, relationship) pairs.
+
+    relationship is the VARIANT_OF relationship written after a pair of SOURCE and UPSTREAM packages, or None.
+    """
     i = 0
     packages = sbom_doc.packages
     while i < len(packages):
@@ -142,22 +146,27 @@ class TagValueWriter:
           and packages[i + 1].id.startswith('SPDXRef-UPSTREAM-')):
         # Output SOURCE, UPSTREAM packages and their VARIANT_OF relationship together, so they are close to each other
         # in SBOMs in tagvalue format.
-        tagvalues += TagValueWriter.marshal_package(sbom_doc, packages[i], fragment)
-        tagvalues += TagValueWriter.marshal_package(sbom_doc, packages[i + 1], fragment)
-        rel = next((r for r in sbom_doc.relationships if
-                    r.id1 == packages[i].id and
-                    r.id2 == packages[i + 1].id and
-                    r.relationship == sbom_data.RelationshipType.VARIANT_OF), None)
-        if rel:
-          marshaled_relationships.append(rel)
-          tagvalues.append(TagValueWriter.marshal_relationship(rel))
-          tagvalues.append('')
-
+        rel = sbom_data.Relationship(id1=packages[i].id,
+                                     relationship=sbom_data.RelationshipType.VARIANT_OF,
+                                     id2=packages[i + 1].id)
+        yield packages[i:i + 2], rel if has_relationship(rel) else None
         i += 2
       else:
-        tagvalues += TagValueWriter.marshal_package(sbom_doc, packages[i], fragment)
+        yield packages[i:i + 1], None
         i += 1
 
+  @staticmethod
+  def marshal_packages(sbom_doc, fragment):
+    tagvalues = []
+    marshaled_relationships = []
+    for packages, rel in TagValueWriter.group_packages(sbom_doc, sbom_doc.has_relationship):
+      for package in packages:
+        tagvalues += TagValueWriter.marshal_package(sbom_doc, package, fragment)
+      if rel:
+        marshaled_relationships.append(rel)
+        tagvalues.append(TagValueWriter.marshal_relationship(rel))
+        tagvalues.append('')
+
     return tagvalues, marshaled_relationships
 
   @staticmethod
@@ -178,9 +187,9 @@ class TagValueWriter:
   @staticmethod
   def marshal_files(sbom_doc, fragment):
     tagvalues = []
-    files_in_packages = []
+    files_in_packages = set()
     for package in sbom_doc.packages:
-      files_in_packages += package.file_ids
+      files_in_packages.update(package.file_ids)
     for file in sbom_doc.files:
       if file.id in files_in_packages:
         continue
@@ -196,13 +205,17 @@ class TagValueWriter:
   def marshal_relationship(rel):
     return f'{Tags.RELATIONSHIP}: {rel.id1} {rel.relationship} {rel.id2}'
 
+  @staticmethod
+  def sort_relationships(relationships):
+    return sorted(relationships, key=lambda r: r.id2 + r.id1)
+
   @staticmethod
   def marshal_relationships(sbom_doc, marshaled_rels):
     tagvalues = []
-    sorted_rels = sorted(sbom_doc.relationships, key=lambda r: r.id2 + r.id1)
+    sorted_rels = TagValueWriter.sort_relationships(sbom_doc.relationships)
+    marshaled_rels = set(marshaled_rels)
     for rel in sorted_rels:
-      if any(r.id1 == rel.id1 and r.id2 == rel.id2 and r.relationship == rel.relationship
-             for r in marshaled_rels):
+      if rel in marshaled_rels:
         continue
       tagvalues.append(TagValueWriter.marshal_relationship(rel))
     tagvalues.append('')
@@ -322,75 +335,79 @@ class JSONWriter:
 
   @staticmethod
   def marshal_packages(sbom_doc):
-    packages = []
-    for p in sbom_doc.packages:
-      package = {
-        PropNames.NAME: p.name,
-        PropNames.SPDXID: p.id,
-        PropNames.PACKAGE_DOWNLOAD_LOCATION: p.download_location if p.download_location else sbom_data.VALUE_NOASSERTION,
-        PropNames.FILES_ANALYZED: p.files_analyzed
+    return {PropNames.PACKAGES: [JSONWriter.marshal_package(p) for p in sbom_doc.packages]}
+
+  @staticmethod
+  def marshal_package(p):
+    package = {
+      PropNames.NAME: p.name,
+      PropNames.SPDXID: p.id,
+      PropNames.PACKAGE_DOWNLOAD_LOCATION: p.download_location if p.download_location else sbom_data.VALUE_NOASSERTION,
+      PropNames.FILES_ANALYZED: p.files_analyzed
+    }
+    if p.version:
+      package[PropNames.PACKAGE_VERSION] = p.version
+    if p.supplier:
+      package[PropNames.PACKAGE_SUPPLIER] = p.supplier
+    package[PropNames.PACKAGE_LICENSE_DECLARED] = sbom_data.VALUE_NOASSERTION
+    if p.declared_license_ids:
+      package[PropNames.PACKAGE_LICENSE_DECLARED] = ' OR '.join(p.declared_license_ids)
+    if p.verification_code:
+      package[PropNames.PACKAGE_VERIFICATION_CODE] = {
+        PropNames.PACKAGE_VERIFICATION_CODE_VALUE: p.verification_code
       }
-      if p.version:
-        package[PropNames.PACKAGE_VERSION] = p.version
-      if p.supplier:
-        package[PropNames.PACKAGE_SUPPLIER] = p.supplier
-      package[PropNames.PACKAGE_LICENSE_DECLARED] = sbom_data.VALUE_NOASSERTION
-      if p.declared_license_ids:
-        package[PropNames.PACKAGE_LICENSE_DECLARED] = ' OR '.join(p.declared_license_ids)
-      if p.verification_code:
-        package[PropNames.PACKAGE_VERIFICATION_CODE] = {
-          PropNames.PACKAGE_VERIFICATION_CODE_VALUE: p.verification_code
+    if p.external_refs:
+      package[PropNames.PACKAGE_EXTERNAL_REFS] = []
+      for ref in p.external_refs:
+        ext_ref = {
+          PropNames.PACKAGE_EXTERNAL_REF_CATEGORY: ref.category,
+          PropNames.PACKAGE_EXTERNAL_REF_TYPE: ref.type,
+          PropNames.PACKAGE_EXTERNAL_REF_LOCATOR: ref.locator,
         }
-      if p.external_refs:
-        package[PropNames.PACKAGE_EXTERNAL_REFS] = []
-        for ref in p.external_refs:
-          ext_ref = {
-            PropNames.PACKAGE_EXTERNAL_REF_CATEGORY: ref.category,
-            PropNames.PACKAGE_EXTERNAL_REF_TYPE: ref.type,
-            PropNames.PACKAGE_EXTERNAL_REF_LOCATOR: ref.locator,
-          }
-          package[PropNames.PACKAGE_EXTERNAL_REFS].append(ext_ref)
-      if p.file_ids:
-        package[PropNames.PACKAGE_HAS_FILES] = []
-        for file_id in p.file_ids:
-          package[PropNames.PACKAGE_HAS_FILES].append(file_id)
-
-      packages.append(package)
-
-    return {PropNames.PACKAGES: packages}
+        package[PropNames.PACKAGE_EXTERNAL_REFS].append(ext_ref)
+    if p.file_ids:
+      package[PropNames.PACKAGE_HAS_FILES] = []
+      for file_id in p.file_ids:
+        package[PropNames.PACKAGE_HAS_FILES].append(file_id)
+
+    return package
 
   @staticmethod
   def marshal_files(sbom_doc):
-    files = []
-    for f in sbom_doc.files:
-      file = {
-        PropNames.FILE_NAME: f.name,
-        PropNames.SPDXID: f.id
-      }
-      checksum = f.checksum.split(': ')
-      file[PropNames.FILE_CHECKSUMS] = [{
-        PropNames.ALGORITHM: checksum[0],
-        PropNames.CHECKSUM_VALUE: checksum[1],
-      }]
-      file[PropNames.FILE_LICENSE_CONCLUDED] = sbom_data.VALUE_NOASSERTION
-      if f.concluded_license_ids:
-        file[PropNames.FILE_LICENSE_CONCLUDED] = ' OR '.join(f.concluded_license_ids)
-      files.append(file)
-    return {PropNames.FILES: files}
+    return {PropNames.FILES: [JSONWriter.marshal_file(f) for f in sbom_doc.files]}
+
+  @staticmethod
+  def marshal_file(f):
+    file = {
+      PropNames.FILE_NAME: f.name,
+      PropNames.SPDXID: f.id
+    }
+    checksum = f.checksum.split(': ')
+    file[PropNames.FILE_CHECKSUMS] = [{
+      PropNames.ALGORITHM: checksum[0],
+      PropNames.CHECKSUM_VALUE: checksum[1],
+    }]
+    file[PropNames.FILE_LICENSE_CONCLUDED] = sbom_data.VALUE_NOASSERTION
+    if f.concluded_license_ids:
+      file[PropNames.FILE_LICENSE_CONCLUDED] = ' OR '.join(f.concluded_license_ids)
+    return file
+
+  @staticmethod
+  def sort_relationships(relationships):
+    return sorted(relationships, key=lambda r: r.relationship + r.id2 + r.id1)
 
   @staticmethod
   def marshal_relationships(sbom_doc):
-    relationships = []
-    sorted_rels = sorted(sbom_doc.relationships, key=lambda r: r.relationship + r.id2 + r.id1)
-    for r in sorted_rels:
-      rel = {
-        PropNames.REL_ELEMENT_ID: r.id1,
-        PropNames.REL_RELATED_ELEMENT_ID: r.id2,
-        PropNames.REL_TYPE: r.relationship,
-      }
-      relationships.append(rel)
+    sorted_rels = JSONWriter.sort_relationships(sbom_doc.relationships)
+    return {PropNames.RELATIONSHIPS: [JSONWriter.marshal_relationship(r) for r in sorted_rels]}
 
-    return {PropNames.RELATIONSHIPS: relationships}
+  @staticmethod
+  def marshal_relationship(r):
+    return {
+      PropNames.REL_ELEMENT_ID: r.id1,
+      PropNames.REL_RELATED_ELEMENT_ID: r.id2,
+      PropNames.REL_TYPE: r.relationship,
+    }
 
   @staticmethod
   def marshal_licenses(sbom_doc):
@@ -412,3 +429,125 @@ class JSONWriter:
     doc.update(JSONWriter.marshal_relationships(sbom_doc))
     doc.update(JSONWriter.marshal_licenses(sbom_doc))
     file.write(json.dumps(doc, indent=4))
+
+
+class StreamingTagValueWriter:
+  """Write an SBOM document in tagvalue format, with files added as they are generated.
+
+  The files are spooled to temporary files instead of being kept in memory. finish() writes the output
+  file with the same layout as TagValueWriter.write(), since the packages, their verification codes and
+  the relationships are only complete at the end.
+  """
+
+  def __init__(self, sbom_doc, file, fragment=False):
+    self.sbom_doc = sbom_doc
+    self.file = file
+    self.fragment = fragment
+    self.unpackaged_files = tempfile.TemporaryFile('w+', encoding='utf-8')
+    # Package id -> spooled files of the package
+    self.package_files = {}
+
+  def add_file(self, file, package_id=None):
+    tagvalues = TagValueWriter.marshal_file(file)
+    if package_id:
+      if package_id not in self.package_files:
+        self.package_files[package_id] = tempfile.TemporaryFile('w+', encoding='utf-8')
+      spool = self.package_files[package_id]
+    else:
+      spool = self.unpackaged_files
+      if file.id == self.sbom_doc.describes and not self.fragment:
+        tagvalues.append(
+            f'{Tags.RELATIONSHIP}: {self.sbom_doc.id} {sbom_data.RelationshipType.DESCRIBES} {self.sbom_doc.describes}')
+        tagvalues.append('')
+    self._write_lines(tagvalues, spool)
+
+  def _write_lines(self, tagvalues, file=None):
+    # Every line but the last one of the output is followed by a newline, see finish().
+    (file or self.file).write(''.join(tagvalue + '\n' for tagvalue in tagvalues))
+
+  def _copy_spool(self, spool):
+    spool.seek(0)
+    shutil.copyfileobj(spool, self.file)
+    spool.close()
+
+  def finish(self, sbom_doc, relationships, has_relationship):
+    """Write sbom_doc with the added files. sbom_doc must not have files or relationships itself.
+
+    relationships are the relationships of the document sorted by TagValueWriter.sort_relationships(), and
+    has_relationship returns whether the document has a relationship.
+    """
+    if not self.fragment:
+      self._write_lines(TagValueWriter.marshal_doc_headers(sbom_doc))
+    self._copy_spool(self.unpackaged_files)
+    marshaled_relationships = set()
+    for packages, rel in TagValueWriter.group_packages(sbom_doc, has_relationship):
+      for package in packages:
+        self._write_lines(TagValueWriter.marshal_package(sbom_doc, package, self.fragment))
+        if package.id in self.package_files:
+          self._copy_spool(self.package_files.pop(package.id))
+      if rel:
+        marshaled_relationships.add(rel)
+        self._write_lines([TagValueWriter.marshal_relationship(rel), ''])
+    for rel in relationships:
+      if rel not in marshaled_relationships:
+        self._write_lines([TagValueWriter.marshal_relationship(rel)])
+    # TagValueWriter.write() joins all the lines with newlines, so the empty line that ends the relationships
+    # is only followed by one if there are licenses.
+    self.file.write('\n'.join([''] + TagValueWriter.marshal_licenses(sbom_doc)))
+
+
+class StreamingJSONWriter:
+  """Write an SBOM document in JSON format, with files added as they are generated.
+
+  The files are spooled to a temporary file instead of being kept in memory. finish() writes the output
+  file with the same layout as JSONWriter.write(), since the packages come before the files in it and
+  are only complete at the end.
+  """
+
+  def __init__(self, sbom_doc, file):
+    self.file = file
+    self.files = tempfile.TemporaryFile('w+', encoding='utf-8')
+    self.num_files = 0
+
+  @staticmethod
+  def _dumps(value, indent):
+    return textwrap.indent(json.dumps(value, indent=4), ' ' * indent).lstrip()
+
+  def _write_member(self, name, value):
+    self.file.write(f'\n    {json.dumps(name)}: {self._dumps(value, 4)}')
+
+  def add_file(self, file, package_id=None):
+    self.files.write(',' if self.num_files else '')
+    self.files.write('\n        ' + self._dumps(JSONWriter.marshal_file(file), 8))
+    self.num_files += 1
+
+  def _end_array(self, num_items):
+    self.file.write('\n    ]' if num_items else ']')
+
+  def finish(self, sbom_doc, relationships):
+    """Write sbom_doc with the added files. sbom_doc must not have files or relationships itself.
+
+    relationships are the relationships of the document sorted by JSONWriter.sort_relationships().
+    """
+    members = JSONWriter.marshal_doc_headers(sbom_doc)
+    members.update(JSONWriter.marshal_packages(sbom_doc))
+    self.file.write('{')
+    for name, value in members.items():
+      self._write_member(name, value)
+      self.file.write(',')
+    self.file.write(f'\n    "{PropNames.FILES}": [')
+    self.files.seek(0)
+    shutil.copyfileobj(self.files, self.file)
+    self.files.close()
+    self._end_array(self.num_files)
+    self.file.write(f',\n    "{PropNames.RELATIONSHIPS}": [')
+    num_relationships = 0
+    for rel in relationships:
+      self.file.write(',' if num_relationships else '')
+      self.file.write('\n        ' + self._dumps(JSONWriter.marshal_relationship(rel), 8))
+      num_relationships += 1
+    self._end_array(num_relationships)
+    self.file.write(',')
+    for name, value in JSONWriter.marshal_licenses(sbom_doc).items():
+      self._write_member(name, value)
+    self.file.write('\n}')
@@ -14,6 +14,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import dataclasses
 import io
 import pathlib
 import unittest
@@ -185,6 +186,41 @@ class SBOMWritersTest(unittest.TestCase):
       self.maxDiff = None
       self.assertEqual(expected_output, output.getvalue())
 
+  def stream_doc(self, sbom_doc, writer):
+    for file in sbom_doc.files:
+      package_id = next((p.id for p in sbom_doc.packages if file.id in p.file_ids), None)
+      writer.add_file(file, package_id)
+    streamed_doc = dataclasses.replace(sbom_doc, files=[], relationships=[])
+    if isinstance(writer, sbom_writers.StreamingTagValueWriter):
+      writer.finish(streamed_doc, sbom_writers.TagValueWriter.sort_relationships(sbom_doc.relationships),
+                    sbom_doc.has_relationship)
+    else:
+      writer.finish(streamed_doc, sbom_writers.JSONWriter.sort_relationships(sbom_doc.relationships))
+
+  def test_streaming_tagvalue_writer(self):
+    self.maxDiff = None
+    for describes in (sbom_data.SPDXID_PRODUCT, SPDXID_FILE4):
+      self.sbom_doc.describes = describes
+      with io.StringIO() as expected_output, io.StringIO() as output:
+        sbom_writers.TagValueWriter.write(self.sbom_doc, expected_output)
+        self.stream_doc(self.sbom_doc, sbom_writers.StreamingTagValueWriter(self.sbom_doc, output))
+        self.assertEqual(expected_output.getvalue(), output.getvalue())
+
+  def test_streaming_tagvalue_writer_unbundled(self):
+    with io.StringIO() as output:
+      self.stream_doc(self.unbundled_sbom_doc,
+                      sbom_writers.StreamingTagValueWriter(self.unbundled_sbom_doc, output, fragment=True))
+      expected_output = pathlib.Path('testdata/expected_tagvalue_sbom_unbundled.spdx').read_text()
+      self.maxDiff = None
+      self.assertEqual(expected_output, output.getvalue())
+
+  def test_streaming_json_writer(self):
+    with io.StringIO() as output:
+      self.stream_doc(self.sbom_doc, sbom_writers.StreamingJSONWriter(self.sbom_doc, output))
+      expected_output = pathlib.Path('testdata/expected_json_sbom.spdx.json').read_text()
+      self.maxDiff = None
+      self.assertEqual(expected_output, output.getvalue())
+
 
 if __name__ == '__main__':
   unittest.main(verbosity=2)
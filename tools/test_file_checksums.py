@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+
+import file_checksums
+
+
+class FileChecksumsTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(self.tmpdir.cleanup)
+    self.cache_file = os.path.join(self.tmpdir.name, 'cache.json')
+
+  def write_file(self, name, content, age_seconds=60):
+    path = os.path.join(self.tmpdir.name, name)
+    with open(path, 'wb') as f:
+      f.write(content)
+    mtime = os.stat(path).st_mtime - age_seconds
+    os.utime(path, (mtime, mtime))
+    return path
+
+  def test_checksums_of_chunked_files_and_symlinks(self):
+    big = self.write_file('big', b'x' * (file_checksums.CHUNK_SIZE * 2 + 1))
+    small = self.write_file('small', b'small')
+    link = os.path.join(self.tmpdir.name, 'link')
+    os.symlink('small', link)
+
+    checksums = file_checksums.FileChecksums(follow_symlinks=False).get_checksums([big, small, link, small])
+
+    self.assertEqual([big, small, link], list(checksums))
+    self.assertEqual(hashlib.sha1(b'x' * (file_checksums.CHUNK_SIZE * 2 + 1)).hexdigest(), checksums[big])
+    self.assertEqual(hashlib.sha1(b'small').hexdigest(), checksums[small])
+    self.assertEqual(hashlib.sha1(b'small').hexdigest(), checksums[link])
+
+    checksums = file_checksums.FileChecksums(algorithm='md5').get_checksums([link])
+    self.assertEqual(hashlib.md5(b'small').hexdigest(), checksums[link])
+
+  def test_cache_only_rehashes_changed_files(self):
+    unchanged = self.write_file('unchanged', b'unchanged')
+    changed = self.write_file('changed', b'old')
+    checksums = file_checksums.FileChecksums(self.cache_file)
+    checksums.get_checksums([unchanged, changed])
+    checksums.save()
+
+    changed = self.write_file('changed', b'new content')
+    checksums = file_checksums.FileChecksums(self.cache_file)
+    with mock.patch.object(file_checksums, 'hash_file', wraps=file_checksums.hash_file) as hash_file:
+      result = checksums.get_checksums([unchanged, changed])
+    self.assertEqual([mock.call(changed, 'sha1', True)], hash_file.call_args_list)
+    self.assertEqual(hashlib.sha1(b'unchanged').hexdigest(), result[unchanged])
+    self.assertEqual(hashlib.sha1(b'new content').hexdigest(), result[changed])
+
+  def test_recently_modified_files_are_not_cached(self):
+    recent = self.write_file('recent', b'recent', age_seconds=0)
+    checksums = file_checksums.FileChecksums(self.cache_file)
+    checksums.get_checksums([recent])
+    checksums.save()
+    self.assertFalse(os.path.exists(self.cache_file))
+
+  def test_files_not_looked_up_are_dropped(self):
+    kept = self.write_file('kept', b'kept')
+    dropped = self.write_file('dropped', b'dropped')
+    checksums = file_checksums.FileChecksums(self.cache_file)
+    checksums.get_checksums([kept, dropped])
+    checksums.save()
+
+    checksums = file_checksums.FileChecksums(self.cache_file)
+    checksums.get_checksums([kept])
+    checksums.save()
+
+    with open(self.cache_file, encoding='utf-8') as f:
+      self.assertEqual([kept], list(json.load(f)['files']))
+
+  def test_cache_of_other_algorithm_is_ignored(self):
+    path = self.write_file('file', b'content')
+    checksums = file_checksums.FileChecksums(self.cache_file, algorithm='md5')
+    checksums.get_checksums([path])
+    checksums.save()
+
+    checksums = file_checksums.FileChecksums(self.cache_file)
+    self.assertEqual(hashlib.sha1(b'content').hexdigest(), checksums.get_checksum(path))
+
+
+if __name__ == '__main__':
+  unittest.main(verbosity=2)
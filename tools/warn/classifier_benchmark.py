@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compare the cost of classifying warnings as the number of patterns grows.
+
+Run with: python3 -m warn.classifier_benchmark [--log build.log]
+
+The same warnings are classified with increasing numbers of the Android warn
+patterns, by classify_one_warning and by WarningClassifier. Without --log, the
+warnings are made up from the tags and texts of the first warn patterns.
+"""
+
+import argparse
+import io
+import re
+import time
+
+# pylint:disable=relative-beyond-top-level,no-name-in-module
+from . import warn_common as common
+
+
+def make_up_warnings(classifier):
+  """Return warnings with the keys of the first indexed warn patterns."""
+  warnings = []
+  # pylint:disable=protected-access
+  for kind, key in list(classifier._indexed_patterns)[:200]:
+    if kind == 'tag':
+      warnings.append('packages/apps/Foo/src/Foo.java:12: warning: '
+                      'something is wrong [%s]' % key)
+    else:
+      warnings.append('external/foo/bar.cpp:34:5: warning: %s of something'
+                      % key)
+  warnings.append('frameworks/base/core/jni/baz.cpp:1:1: warning: '
+                  'an unknown warning')
+  return warnings
+
+
+def read_warnings(logfile):
+  """Return the unique warnings in an Android build log."""
+  flags = argparse.Namespace(platform='android', url='', separator='?l=')
+  with io.open(logfile, encoding='utf-8') as log:
+    warnings, _ = common.parse_input_file_android(log, flags)
+  return list(warnings)
+
+
+def time_per_warning(classify, warnings, repeat):
+  """Return the average time in microseconds to classify a warning."""
+  start = time.perf_counter()
+  for _ in range(repeat):
+    for warning in warnings:
+      classify(warning)
+  return (time.perf_counter() - start) * 1e6 / (repeat * len(warnings))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--log', help='Path to an Android build log')
+  parser.add_argument('--repeat', type=int, default=3,
+                      help='Number of times to classify each warning')
+  args = parser.parse_args()
+
+  warn_patterns = common.get_warn_patterns('android')
+  project_patterns = [re.compile(p[1])
+                      for p in common.get_project_list('android')]
+  if args.log:
+    warnings = read_warnings(args.log)
+  else:
+    warnings = make_up_warnings(
+        common.WarningClassifier(warn_patterns, project_patterns))
+
+  print('%d warnings' % len(warnings))
+  print('%10s %22s %22s' % ('patterns', 'classify_one_warning',
+                            'WarningClassifier'))
+  for fraction in (8, 4, 2, 1):
+    patterns = warn_patterns[:len(warn_patterns) // fraction]
+    classifier = common.WarningClassifier(patterns, project_patterns)
+    # Compile the candidate regexes before timing.
+    for warning in warnings:
+      classifier.classify_one_warning(warning, '', [])
+
+    old_cost = time_per_warning(
+        lambda warning, patterns=patterns: common.classify_one_warning(
+            warning, '', [], project_patterns, patterns),
+        warnings, args.repeat)
+    new_cost = time_per_warning(
+        lambda warning, classifier=classifier: classifier.classify_one_warning(
+            warning, '', []),
+        warnings, args.repeat)
+    print('%10d %19.1f us %19.1f us' % (
+        sum(len(p['compiled_patterns']) for p in patterns), old_cost,
+        new_cost))
+
+
+if __name__ == '__main__':
+  main()
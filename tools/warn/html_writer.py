@@ -53,11 +53,20 @@
 # New dynamic HTML related function to emit data:
 #   escape_string, strip_escape_string, emit_warning_arrays
 #   emit_js_data():
+#
+# With flags.data_path, WarningMessages, Warnings and WarningLinks are written
+# to a separate JSON file instead, which the page loads after it is shown:
+#   write_warning_data():   writes the compact JSON file
+#   emit_js_data_loader():  emits the JavaScript to load it
+#   get_top_dirs_files():   precomputes TopDirs and TopFiles
 
 from __future__ import print_function
 import csv
 import datetime
+import decimal
 import html
+import json
+import os
 import sys
 
 # pylint:disable=relative-beyond-top-level
@@ -610,9 +619,24 @@ def emit_const_object_array(name, array, writer):
   writer('];')
 
 
+# Emit a JavaScript const of a JSON value.
+def emit_const_json(name, value, writer):
+  writer('const ' + name + ' = ' + json.dumps(value, separators=(',', ':')) +
+         ';')
+
+
 def emit_js_data(writer, flags, warning_messages, warning_links,
                  warning_records, warn_patterns, project_names):
   """Dump dynamic HTML page's static JavaScript data."""
+  emit_js_flags_and_patterns(writer, flags, warn_patterns, project_names)
+  emit_const_html_string_array('WarningMessages', warning_messages, writer)
+  emit_const_object_array('Warnings', warning_records, writer)
+  if flags.platform == 'chrome':
+    emit_const_html_string_array('WarningLinks', warning_links, writer)
+  writer('function whenWarningsLoaded(callback) { callback(); }')
+
+
+def emit_js_flags_and_patterns(writer, flags, warn_patterns, project_names):
   emit_const_string('FlagPlatform', flags.platform, writer)
   emit_const_string('FlagURL', flags.url, writer)
   emit_const_string('FlagSeparator', flags.separator, writer)
@@ -632,10 +656,170 @@ def emit_js_data(writer, flags, warning_messages, warning_links,
   emit_const_html_string_array('WarnPatternsDescription',
                                [w['description'] for w in warn_patterns],
                                writer)
-  emit_const_html_string_array('WarningMessages', warning_messages, writer)
-  emit_const_object_array('Warnings', warning_records, writer)
+
+
+def html_escape_message(line):
+  """Return a warning message as it is used in the HTML page."""
+  if line and line[-1] == '\n':
+    line = line[:-1]
+  return html.escape(line)
+
+
+def intern_strings(strings):
+  """Return the unique strings, and the index of each string in them."""
+  indexes = {}
+  unique_strings = []
+  string_indexes = []
+  for string in strings:
+    idx = indexes.get(string)
+    if idx is None:
+      idx = len(unique_strings)
+      indexes[string] = idx
+      unique_strings.append(string)
+    string_indexes.append(idx)
+  return unique_strings, string_indexes
+
+
+def write_warning_data(data_path, flags, warning_messages, warning_links,
+                       warning_records):
+  """Write the warnings to a compact JSON file, for emit_js_data_loader.
+
+  The messages are split into their file paths, which are interned, and the
+  rest of the text. The warning records are stored by columns, and the links
+  are interned.
+  """
+  paths = []
+  texts = []
+  for message in warning_messages:
+    message = html_escape_message(message)
+    idx = message.find(':')
+    idx = len(message) if idx < 0 else idx
+    paths.append(message[:idx])
+    texts.append(message[idx:])
+  unique_paths, path_indexes = intern_strings(paths)
+  data = {
+      'paths': unique_paths,
+      'messagePaths': path_indexes,
+      'messageTexts': texts,
+      'patterns': [record[0] for record in warning_records],
+      'projects': [record[1] for record in warning_records],
+      'messages': [record[2] for record in warning_records],
+  }
   if flags.platform == 'chrome':
-    emit_const_html_string_array('WarningLinks', warning_links, writer)
+    unique_links, link_indexes = intern_strings(
+        html_escape_message(link) for link in warning_links)
+    data['links'] = unique_links
+    data['warningLinks'] = [link_indexes[record[3]]
+                            for record in warning_records]
+  with open(data_path, 'w') as outf:
+    json.dump(data, outf, separators=(',', ':'))
+
+
+WARNING_DATA_LOADER_JAVASCRIPT = """
+var WarningMessages = [];
+var Warnings = [];
+var WarningLinks = [];
+const WarningDataLoaded = fetch(WarningDataURL)
+  .then(function(response) {
+    if (!response.ok) {
+      throw new Error(response.status + " " + response.statusText);
+    }
+    return response.json();
+  })
+  .then(function(data) {
+    WarningMessages = data.messagePaths.map(
+        (p, i) => data.paths[p] + data.messageTexts[i]);
+    Warnings = data.patterns.map(
+        (w, i) => [w, data.projects[i], data.messages[i], i]);
+    if (data.links) {
+      WarningLinks = data.warningLinks.map((l) => data.links[l]);
+    }
+  })
+  .catch(function(error) {
+    var message = document.createElement("p");
+    message.style.color = "red";
+    message.textContent =
+        "Failed to load the warnings from " + WarningDataURL + ": " + error;
+    document.body.prepend(message);
+    throw error;
+  });
+function whenWarningsLoaded(callback) {
+  // A failure to load the warnings is already shown on the page.
+  WarningDataLoaded.then(callback, () => {});
+}
+"""
+
+
+def to_fixed(number, digits):
+  """Format number like JavaScript's Number.toFixed()."""
+  return str(decimal.Decimal(number).quantize(
+      decimal.Decimal(1).scaleb(-digits), rounding=decimal.ROUND_HALF_UP))
+
+
+def get_top_dirs_files(warning_messages):
+  """Compute TopDirs and TopFiles like computeTopDirsFiles() in JavaScript."""
+  # pylint:disable=too-many-locals
+  num_warnings = len(warning_messages)
+  warnings_of_files = {}
+  warnings_of_dirs = {}
+  sub_dirs = {}
+
+  def add_one_warning(counts, key, warning_type, unique):
+    counts[key] = counts.get(key, 0) + 1
+    if warning_type:
+      type_key = warning_type + ' ' + key
+      counts[type_key] = counts.get(type_key, 0) + 1
+      if unique:
+        counts[warning_type + ' *'] = counts.get(warning_type + ' *', 0) + 1
+
+  for message in warning_messages:
+    message = html_escape_message(message)
+    file_name = message.split(':', 1)[0]
+    warning_type = ''
+    if message.endswith(']'):
+      warning_type = message[max(message.rfind('['), 0):]
+    add_one_warning(warnings_of_files, file_name, warning_type, True)
+    dirs = file_name.split('/')
+    dir_name = dirs[0]
+    add_one_warning(warnings_of_dirs, dir_name, warning_type, True)
+    for sub_dir in dirs[1:-1]:
+      sub_dir = dir_name + '/' + sub_dir
+      sub_dirs.setdefault(dir_name, set()).add(sub_dir)
+      dir_name = sub_dir
+      add_one_warning(warnings_of_dirs, dir_name, warning_type, False)
+
+  min_dir_warnings = num_warnings * (LIMIT_PERCENT_WARNINGS / 100)
+  min_file_warnings = min(LIMIT_WARNINGS_PER_FILE, min_dir_warnings)
+
+  def count_warnings(min_warnings, warnings_of, is_dir):
+    rows = []
+    for name, count in warnings_of.items():
+      if is_dir and name in sub_dirs and len(sub_dirs[name]) < 2:
+        continue  # skip a directory if it has only one subdir
+      if count >= min_warnings:
+        name = (name + '/...') if is_dir else name
+        percent = to_fixed(100 * count / num_warnings, 1)
+        rows.append([0, {'v': count, 'f': '%d (%s%%)' % (count, percent)},
+                     name])
+    rows.sort(key=lambda row: -row[1]['v'])
+    for idx, row in enumerate(rows):
+      row[0] = idx
+    return rows
+
+  return (count_warnings(min_dir_warnings, warnings_of_dirs, True),
+          count_warnings(min_file_warnings, warnings_of_files, False))
+
+
+def emit_js_data_loader(writer, flags, warning_messages, warn_patterns,
+                        project_names):
+  """Dump the JavaScript to load the data written by write_warning_data."""
+  emit_js_flags_and_patterns(writer, flags, warn_patterns, project_names)
+  emit_const_string('WarningDataURL', os.path.basename(flags.data_path),
+                    writer)
+  top_dirs, top_files = get_top_dirs_files(warning_messages)
+  emit_const_json('PrecomputedTopDirs', top_dirs, writer)
+  emit_const_json('PrecomputedTopFiles', top_files, writer)
+  writer(WARNING_DATA_LOADER_JAVASCRIPT)
 
 
 DRAW_TABLE_JAVASCRIPT = """
@@ -661,6 +845,11 @@ function genSelectedProjectsTable() {
 window.TopDirs = [];
 window.TopFiles = [];
 function computeTopDirsFiles() {
+  if (typeof PrecomputedTopDirs !== "undefined") {
+    TopDirs = PrecomputedTopDirs;
+    TopFiles = PrecomputedTopFiles;
+    return;
+  }
   var numWarnings = WarningMessages.length;
   var warningsOfFiles = {};
   var warningsOfDirs = {};
@@ -774,16 +963,18 @@ function selectDirFile(idx, rows, dirFile) {
   table.draw(data, {allowHtml: true, alternatingRowStyle: true});
 }
 function selectDir(idx) {
-  selectDirFile(idx, TopDirs, "directory")
+  whenWarningsLoaded(() => selectDirFile(idx, TopDirs, "directory"));
 }
 function selectFile(idx) {
-  selectDirFile(idx, TopFiles, "file");
+  whenWarningsLoaded(() => selectDirFile(idx, TopFiles, "file"));
 }
 function genTables() {
   genSelectedProjectsTable();
-  if (WarningMessages.length > 1) {
-    genTopDirsFilesTables();
-  }
+  whenWarningsLoaded(function() {
+    if (WarningMessages.length > 1) {
+      genTopDirsFilesTables();
+    }
+  });
 }
 """
 
@@ -857,8 +1048,14 @@ def dump_html(flags, output_stream, warning_messages, warning_links,
         str(LIMIT_WARNINGS_PER_FILE) + ' cases')
   def section4():
     writer('<script>')
-    emit_js_data(writer, flags, warning_messages, warning_links,
-                 warning_records, warn_patterns, project_names)
+    if getattr(flags, 'data_path', ''):
+      write_warning_data(flags.data_path, flags, warning_messages,
+                         warning_links, warning_records)
+      emit_js_data_loader(writer, flags, warning_messages, warn_patterns,
+                          project_names)
+    else:
+      emit_js_data(writer, flags, warning_messages, warning_links,
+                   warning_records, warn_patterns, project_names)
     writer(SCRIPTS_FOR_WARNING_GROUPS)
     writer('</script>')
     dump_section_header(writer, 'all_warnings_section',
@@ -868,9 +1065,9 @@ def dump_html(flags, output_stream, warning_messages, warning_links,
     # Warning messages are grouped by severities or project names.
     writer('<br><div id="warning_groups"></div>')
     if flags.byproject:
-      writer('<script>groupByProject();</script>')
+      writer('<script>whenWarningsLoaded(groupByProject);</script>')
     else:
-      writer('<script>groupBySeverity();</script>')
+      writer('<script>whenWarningsLoaded(groupBySeverity);</script>')
     dump_fixed(writer, warn_patterns)
     writer('</div>')
   dump_boxed_section(writer, section1)
@@ -889,6 +1086,20 @@ def write_html(flags, project_names, warn_patterns, html_path, warning_messages,
                 header_str, warn_patterns, project_names)
 
 
+def write_delta_csv(csvpath, new_warnings, fixed_warnings, warn_patterns,
+                    project_names):
+  """Write the new and fixed (line, pattern_idx, project_idx) warnings."""
+  with open(csvpath, 'w') as outf:
+    csvwriter = csv.writer(outf, lineterminator='\n')
+    for change, warnings in (('new', new_warnings), ('fixed', fixed_warnings)):
+      for line, pattern_idx, project_idx in warnings:
+        pattern = warn_patterns[pattern_idx]
+        csvwriter.writerow([
+            change, '???' if project_idx < 0 else project_names[project_idx],
+            pattern['severity'].header, pattern['category'],
+            pattern['description'], line])
+
+
 def write_out_csv(flags, warn_patterns, warning_messages, warning_links,
                   warning_records, header_str, project_names):
   """Write warnings csv file."""
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import io
+import json
+import os
+import re
+import tempfile
+import unittest
+
+from warn import html_writer
+
+MESSAGES = [
+    'frameworks/base/a.cpp:1:2: warning: unused "x" [-Wunused]\n',
+    'frameworks/base/a.cpp:3:4: warning: a < b && c > d [-Wparentheses]\n',
+    'frameworks/av/b.cpp:5:6: warning: path\\to\\file [-Wunused]\n',
+    'external/c.java:7: warning: [deprecation] foo()\n',
+    'device/d.mk: warning: overriding commands\n',
+    'no colon in this warning\n',
+]
+LINKS = ['https://a?l=1', 'https://a?l=3', 'https://b?l=5', '', '', '']
+# Records in a different order than the messages, like they are after
+# warn.py sorts them.
+RECORDS = [[2, 0, 1, 1], [1, 0, 0, 0], [0, 1, 2, 2], [3, -1, 3, 3],
+           [2, 2, 4, 4], [0, -1, 5, 5]]
+
+
+def make_flags(platform, data_path=''):
+  return argparse.Namespace(platform=platform, url='', separator='?l=',
+                            data_path=data_path)
+
+
+def parse_js_arrays(text):
+  """Return {name: items} of the arrays emitted by emit_const_*_array."""
+  arrays = {}
+  items = None
+  for line in text.splitlines():
+    match = re.fullmatch(r'const (\w+) = \[', line)
+    if match:
+      items = arrays[match.group(1)] = []
+    elif line == '];':
+      items = None
+    elif items is not None and line.startswith('"'):
+      # Unescape like JavaScript, which also ignores the escapes of '&'.
+      items.append(re.sub(r'\\(.)', r'\1', line[1:-2]))
+    elif items is not None:
+      items.append(json.loads(line[:-1]))
+  return arrays
+
+
+class WriteWarningDataTest(unittest.TestCase):
+
+  def setUp(self):
+    tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(tmpdir.cleanup)
+    self.data_path = os.path.join(tmpdir.name, 'warnings.json')
+
+  def get_inline_warnings(self, flags):
+    """Return the warnings as they are read from the inline arrays."""
+    output = io.StringIO()
+    html_writer.emit_js_data(html_writer.make_writer(output), flags, MESSAGES,
+                             LINKS, RECORDS, [], [])
+    arrays = parse_js_arrays(output.getvalue())
+    links = arrays.get('WarningLinks')
+    return [(w[0], w[1], arrays['WarningMessages'][w[2]],
+             links[w[3]] if links else None) for w in arrays['Warnings']]
+
+  def get_loaded_warnings(self, flags):
+    """Return the warnings as WARNING_DATA_LOADER_JAVASCRIPT reads them."""
+    html_writer.write_warning_data(self.data_path, flags, MESSAGES, LINKS,
+                                   RECORDS)
+    with open(self.data_path) as f:
+      data = json.load(f)
+    messages = [data['paths'][p] + text
+                for p, text in zip(data['messagePaths'], data['messageTexts'])]
+    warnings = [[w, data['projects'][i], data['messages'][i], i]
+                for i, w in enumerate(data['patterns'])]
+    links = None
+    if 'links' in data:
+      links = [data['links'][l] for l in data['warningLinks']]
+    return [(w[0], w[1], messages[w[2]], links[w[3]] if links else None)
+            for w in warnings]
+
+  def test_same_warnings_as_inline_data(self):
+    for platform in ('android', 'chrome'):
+      with self.subTest(platform=platform):
+        flags = make_flags(platform, self.data_path)
+        expected = self.get_inline_warnings(flags)
+        self.assertEqual(len(RECORDS), len(expected))
+        self.assertEqual(expected, self.get_loaded_warnings(flags))
+
+  def test_paths_and_links_are_interned(self):
+    html_writer.write_warning_data(self.data_path, make_flags('chrome'),
+                                   MESSAGES, LINKS, RECORDS)
+    with open(self.data_path) as f:
+      data = json.load(f)
+    self.assertEqual(['frameworks/base/a.cpp', 'frameworks/av/b.cpp',
+                      'external/c.java', 'device/d.mk',
+                      'no colon in this warning'], data['paths'])
+    self.assertEqual([0, 0, 1, 2, 3, 4], data['messagePaths'])
+    self.assertEqual(['https://a?l=1', 'https://a?l=3', 'https://b?l=5', ''],
+                     data['links'])
+
+
+class GetTopDirsFilesTest(unittest.TestCase):
+
+  def test_top_dirs_and_files(self):
+    # The expected rows are those of computeTopDirsFiles() in the page.
+    top_dirs, top_files = html_writer.get_top_dirs_files(MESSAGES)
+    self.assertEqual([
+        [0, {'v': 3, 'f': '3 (50.0%)'}, 'frameworks/...'],
+        [1, {'v': 2, 'f': '2 (33.3%)'}, '[-Wunused] frameworks/...'],
+        [2, {'v': 2, 'f': '2 (33.3%)'}, '[-Wunused] */...'],
+        [3, {'v': 2, 'f': '2 (33.3%)'}, 'frameworks/base/...'],
+        [4, {'v': 1, 'f': '1 (16.7%)'}, '[-Wunused] frameworks/base/...'],
+        [5, {'v': 1, 'f': '1 (16.7%)'}, '[-Wparentheses] frameworks/...'],
+        [6, {'v': 1, 'f': '1 (16.7%)'}, '[-Wparentheses] */...'],
+        [7, {'v': 1, 'f': '1 (16.7%)'},
+         '[-Wparentheses] frameworks/base/...'],
+        [8, {'v': 1, 'f': '1 (16.7%)'}, 'frameworks/av/...'],
+        [9, {'v': 1, 'f': '1 (16.7%)'}, '[-Wunused] frameworks/av/...'],
+        [10, {'v': 1, 'f': '1 (16.7%)'}, 'external/...'],
+        [11, {'v': 1, 'f': '1 (16.7%)'}, 'device/...'],
+        [12, {'v': 1, 'f': '1 (16.7%)'}, 'no colon in this warning/...'],
+    ], top_dirs)
+    self.assertEqual([
+        [0, {'v': 2, 'f': '2 (33.3%)'}, 'frameworks/base/a.cpp'],
+        [1, {'v': 2, 'f': '2 (33.3%)'}, '[-Wunused] *'],
+        [2, {'v': 1, 'f': '1 (16.7%)'}, '[-Wunused] frameworks/base/a.cpp'],
+        [3, {'v': 1, 'f': '1 (16.7%)'},
+         '[-Wparentheses] frameworks/base/a.cpp'],
+        [4, {'v': 1, 'f': '1 (16.7%)'}, '[-Wparentheses] *'],
+        [5, {'v': 1, 'f': '1 (16.7%)'}, 'frameworks/av/b.cpp'],
+        [6, {'v': 1, 'f': '1 (16.7%)'}, '[-Wunused] frameworks/av/b.cpp'],
+        [7, {'v': 1, 'f': '1 (16.7%)'}, 'external/c.java'],
+        [8, {'v': 1, 'f': '1 (16.7%)'}, 'device/d.mk'],
+        [9, {'v': 1, 'f': '1 (16.7%)'}, 'no colon in this warning'],
+    ], top_files)
+
+  def test_rare_dirs_and_files_are_skipped(self):
+    messages = ['a/x.c:1: warning: foo'] * 149 + ['b/y.c:1: warning: foo']
+    top_dirs, top_files = html_writer.get_top_dirs_files(messages)
+    self.assertEqual([[0, {'v': 149, 'f': '149 (99.3%)'}, 'a/...']], top_dirs)
+    self.assertEqual([[0, {'v': 149, 'f': '149 (99.3%)'}, 'a/x.c']],
+                     top_files)
+
+
+if __name__ == '__main__':
+  unittest.main(verbosity=2)
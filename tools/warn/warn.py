@@ -38,9 +38,10 @@ def classify_warnings(args):
     results: a list of the classified warnings.
   """
   results = []
+  classifier = common.WarningClassifier(args['warn_patterns'],
+                                        args['project_patterns'])
   for line, link in args['group']:
-    common.classify_one_warning(line, link, results, args['project_patterns'],
-                                args['warn_patterns'])
+    classifier.classify_one_warning(line, link, results)
 
   # After the main work, ignore all other signals to a child process,
   # to avoid bad warning/error messages from the exit clean-up process.
@@ -47,6 +47,7 @@ Default input file is build.log, which can be changed with the --log flag.
 #
 import argparse
 import io
+import mmap
 import multiprocessing
 import os
 import re
@@ -62,6 +63,7 @@ from . import java_warn_patterns as java_patterns
 from . import make_warn_patterns as make_patterns
 from . import other_warn_patterns as other_patterns
 from . import tidy_warn_patterns as tidy_patterns
+from . import warning_db as warning_db_lib
 
 
 # Location of this file is used to guess the root of Android source tree.
@@ -84,6 +86,16 @@ def parse_args(use_google3):
   parser.add_argument('--csvwithdescription', default='',
                       help="""Save CSV warning file to the passed path this csv
                             will contain all the warning descriptions""")
+  parser.add_argument('--data_path', default='',
+                      help='Save the warning messages to the passed path '
+                      'instead of the HTML output, which loads them from the '
+                      'same directory when it is viewed')
+  parser.add_argument('--warning_db', default='',
+                      help='Path to an SQLite file of warnings kept across '
+                      'builds; only warnings not in it are classified')
+  parser.add_argument('--delta_csvpath', default='',
+                      help='Save CSV of the warnings new or fixed since the '
+                      'last build in --warning_db to this file')
   parser.add_argument('--byproject', action='store_true',
                       help='Separate warnings in HTML output by project names')
   parser.add_argument('--url', default='',
@@ -95,6 +107,9 @@ def parse_args(use_google3):
   parser.add_argument('--processes', default=multiprocessing.cpu_count(),
                       type=int,
                       help='Number of parallel processes to process warnings')
+  parser.add_argument('--chunked', action='store_true',
+                      help='Split an Android build log into chunks and parse '
+                      'them with --processes parallel processes')
   # Old Android build scripts call warn.py without --platform,
   # so the default platform is set to 'android'.
   parser.add_argument('--platform', default='android',
@@ -140,6 +155,215 @@ def classify_one_warning(warning, link, results, project_patterns,
   # 2 or more concurrent compiles
 
 
+# A numbered backreference or conditional group, whose number would refer to
+# another group once patterns are combined. Escaped backslashes are removed
+# before searching.
+_NUMBERED_GROUP_REFERENCE = re.compile(r'\\[1-9]|\(\?\(\d')
+
+
+def compile_alternation(patterns):
+  """Compile patterns into one regex that matches like the first of them.
+
+  Return None if there are no patterns, or if they can't be combined.
+  Otherwise, the name of the last group of a match is 'p' followed by the
+  index of the matching pattern.
+  """
+  if not patterns or any(
+      _NUMBERED_GROUP_REFERENCE.search(pattern.replace('\\\\', ''))
+      for pattern in patterns):
+    return None
+  try:
+    return re.compile('|'.join('(?P<p%d>%s)' % (idx, pattern)
+                               for idx, pattern in enumerate(patterns)))
+  except re.error:
+    return None
+
+
+def get_required_literals(pattern):
+  """Return the literal texts that every match of pattern must contain.
+
+  Only the literal texts outside of groups and sets are returned, in order.
+  Return None if pattern has a '|' outside of groups.
+  """
+  # pylint:disable=too-many-branches
+  literals = []
+  literal = ''
+  depth = 0
+  idx = 0
+  while idx <= len(pattern):
+    char = pattern[idx:idx + 1]
+    is_literal = False
+    if char == '\\' and not pattern[idx + 1:idx + 2].isalnum():
+      char = pattern[idx + 1:idx + 2]
+      is_literal = depth == 0
+      idx += 2
+    elif char == '[':
+      # Skip the set, where a ']' right after '[' or '[^' is a literal.
+      idx += 1
+      if pattern[idx:idx + 1] == '^':
+        idx += 1
+      if pattern[idx:idx + 1] == ']':
+        idx += 1
+      while idx < len(pattern) and pattern[idx] != ']':
+        idx += 2 if pattern[idx] == '\\' else 1
+      idx += 1
+    else:
+      if char == '(':
+        depth += 1
+      elif char == ')':
+        depth -= 1
+      elif char == '|' and depth == 0:
+        return None
+      is_literal = depth == 0 and char and char not in '\\.^$*+?{}'
+      idx += 1 if char != '\\' else 2
+
+    if is_literal:
+      quantifier = pattern[idx:idx + 1]
+      if quantifier and quantifier in '*?{':
+        # char is optional.
+        is_literal = False
+      else:
+        literal += char
+        if quantifier == '+':
+          # The following text is at a variable offset.
+          is_literal = False
+    if not is_literal and literal:
+      literals.append(literal)
+      literal = ''
+    if not char:
+      break
+  return literals
+
+
+class WarningClassifier:
+  """Classify warning lines like classify_one_warning, but faster.
+
+  Warn patterns are indexed by a literal text that every warning they match
+  must contain: either the first word of a tag like '[bugprone-...]', or the
+  first few characters after ': warning: '. A warning is only matched against
+  the patterns indexed by the tags and texts it contains, and the patterns
+  that can't be indexed. Those candidates are
+  combined into one regex, compiled once per set of keys, whose first matching
+  alternative is the first matching pattern. The cost per warning thus depends
+  on the number of candidates, not on the total number of patterns.
+
+  Project patterns that end with '/.*: warning:' only depend on the directory
+  of a warning with a single ': warning:', so their results are cached by
+  directory.
+  """
+
+  _WARNING_SEPARATOR = ': warning: '
+  _KEY_LENGTH = 4
+  # The first word of a tag like '[bugprone-macro-parentheses]', which must
+  # be followed by a non-word character in a pattern.
+  _PATTERN_TAG = re.compile(r'\[(\w+)\W')
+  _WARNING_TAG = re.compile(r'\[(\w+)')
+
+  def __init__(self, warn_patterns, project_patterns):
+    # All of the compiled patterns, with their warn_patterns index, in order.
+    self._patterns = [(idx, cpat) for idx, pattern in enumerate(warn_patterns)
+                      for cpat in pattern['compiled_patterns']]
+    self._indexed_patterns = dict()
+    self._unindexed_patterns = []
+    for pos, (_, cpat) in enumerate(self._patterns):
+      key = self.get_pattern_key(cpat.pattern)
+      if key:
+        self._indexed_patterns.setdefault(key, []).append(pos)
+      else:
+        self._unindexed_patterns.append(pos)
+    # Map keys to (regex, candidate positions).
+    self._candidate_regexes = dict()
+
+    self._project_patterns = project_patterns
+    self._project_regex = compile_alternation(
+        [cpat.pattern for cpat in project_patterns])
+    self._project_cache = None
+    if all(cpat.pattern == '.*' or cpat.pattern.endswith('/.*: warning:')
+           for cpat in project_patterns):
+      self._project_cache = dict()
+
+  @classmethod
+  def get_pattern_key(cls, pattern):
+    """Return the key to index a warn pattern, or None."""
+    literals = get_required_literals(pattern)
+    if not literals:
+      return None
+    for literal in literals:
+      tag = cls._PATTERN_TAG.search(literal)
+      if tag:
+        return ('tag', tag.group(1))
+    for literal in literals:
+      idx = literal.find(cls._WARNING_SEPARATOR)
+      if idx >= 0:
+        start = idx + len(cls._WARNING_SEPARATOR)
+        if len(literal) >= start + cls._KEY_LENGTH:
+          return ('text', literal[start:start + cls._KEY_LENGTH])
+    return None
+
+  def _get_keys(self, warning):
+    keys = set(('tag', tag) for tag in self._WARNING_TAG.findall(warning))
+    idx = warning.find(self._WARNING_SEPARATOR)
+    while idx >= 0:
+      start = idx + len(self._WARNING_SEPARATOR)
+      keys.add(('text', warning[start:start + self._KEY_LENGTH]))
+      idx = warning.find(self._WARNING_SEPARATOR, idx + 1)
+    return tuple(sorted(keys))
+
+  def _get_candidate_regex(self, keys):
+    result = self._candidate_regexes.get(keys)
+    if result is None:
+      candidates = set(self._unindexed_patterns)
+      for key in keys:
+        candidates.update(self._indexed_patterns.get(key, ()))
+      candidates = sorted(candidates)
+      regex = compile_alternation(
+          [self._patterns[pos][1].pattern for pos in candidates])
+      result = (regex, candidates)
+      self._candidate_regexes[keys] = result
+    return result
+
+  def find_pattern_index(self, warning):
+    """Return the index to the warn_patterns array, or -1."""
+    regex, candidates = self._get_candidate_regex(self._get_keys(warning))
+    if regex is None:
+      for pos in candidates:
+        if self._patterns[pos][1].match(warning):
+          return self._patterns[pos][0]
+      return -1
+    result = regex.match(warning)
+    if result is None:
+      return -1
+    return self._patterns[candidates[int(result.lastgroup[1:])]][0]
+
+  def _match_project(self, warning):
+    if self._project_regex is None:
+      return find_project_index(warning, self._project_patterns)
+    result = self._project_regex.match(warning)
+    if result is None:
+      return -1
+    return int(result.lastgroup[1:])
+
+  def find_project_index(self, warning):
+    """Return the index to the project pattern array, or -1."""
+    if self._project_cache is None:
+      return self._match_project(warning)
+    separator_idx = warning.find(': warning:')
+    if separator_idx < 0 or warning.find(': warning:', separator_idx + 1) >= 0:
+      return self._match_project(warning)
+    directory = warning[:warning.rfind('/', 0, separator_idx) + 1]
+    project_idx = self._project_cache.get(directory)
+    if project_idx is None:
+      project_idx = self._match_project(warning)
+      self._project_cache[directory] = project_idx
+    return project_idx
+
+  def classify_one_warning(self, warning, link, results):
+    """Classify one warning line, like classify_one_warning()."""
+    idx = self.find_pattern_index(warning)
+    if idx >= 0:
+      results.append([warning, link, idx, self.find_project_index(warning)])
+
+
 def remove_prefix(src, sub):
   """Remove everything before last occurrence of substring sub in string src."""
   if sub in src:
@@ -367,16 +591,8 @@ def add_normalized_line_to_warnings(line, flags, android_root, unique_warnings):
   return unique_warnings
 
 
-def parse_input_file_android(infile, flags):
-  """Parse Android input file, collect parameters and warning lines."""
-  # pylint:disable=too-many-locals,too-many-branches
-  platform_version = 'unknown'
-  target_product = 'unknown'
-  target_variant = 'unknown'
-  build_id = 'unknown'
-  android_root, root_top_dirs = find_android_root(infile)
-  infile.seek(0)
-
+def get_android_warning_patterns(root_top_dirs):
+  """Return the patterns to find and clean up warning lines in Android logs."""
   # rustc warning messages have two lines that should be combined:
   #     warning: description
   #        --> file_path:line_number:column_number
@@ -412,6 +628,68 @@ def parse_input_file_android(infile, flags):
         ')/[^ ]*: warning: .*)')
   else:
     extra_warning_pattern = re.compile('^[^/]* ([^ /]*/[^ ]*: warning: .*)')
+  return (warning_pattern, rustc_file_position, bfw_warning_pattern,
+          extra_warning_pattern)
+
+
+def clean_up_warning_line(line, bfw_warning_pattern, extra_warning_pattern):
+  """Clean up extra prefix that could be introduced when RBE was used."""
+  if '/b/f/w/' in line:
+    result = bfw_warning_pattern.search(line)
+  else:
+    result = extra_warning_pattern.search(line)
+  if result is not None:
+    return result.group(1)
+  return line
+
+
+def parse_android_build_variable(line, build_variables):
+  """Save the value of a build variable line in build_variables.
+
+  Return True if line sets one of the build variables in the header.
+  """
+  for name in build_variables:
+    result = re.search('(?<=^%s=).*' % name, line)
+    if result is not None:
+      build_variables[name] = result.group(0)
+      return True
+  return False
+
+
+def get_android_header_str(build_variables):
+  """Return the header string from the build variables."""
+  return '%s - %s - %s (%s)' % (
+      build_variables['PLATFORM_VERSION'], build_variables['TARGET_PRODUCT'],
+      build_variables['TARGET_BUILD_VARIANT'], build_variables['BUILD_ID'])
+
+
+def new_android_build_variables():
+  """Return the build variables in the header, with unknown values."""
+  return {name: 'unknown' for name in
+          ('PLATFORM_VERSION', 'TARGET_PRODUCT', 'TARGET_BUILD_VARIANT',
+           'BUILD_ID')}
+
+
+def renormalize_android_warnings(unique_warnings, flags, android_root):
+  """Normalize warning lines and links again, once android_root is known."""
+  new_unique_warnings = dict()
+  for warning_line in unique_warnings:
+    normalized_line = normalize_warning_line(warning_line, flags,
+                                             android_root)
+    new_unique_warnings[normalized_line] = generate_android_cs_link(
+        warning_line, flags, android_root)
+  return new_unique_warnings
+
+
+def parse_input_file_android(infile, flags):
+  """Parse Android input file, collect parameters and warning lines."""
+  # pylint:disable=too-many-locals,too-many-branches
+  build_variables = new_android_build_variables()
+  android_root, root_top_dirs = find_android_root(infile)
+  infile.seek(0)
+
+  (warning_pattern, rustc_file_position, bfw_warning_pattern,
+   extra_warning_pattern) = get_android_warning_patterns(root_top_dirs)
 
   # Collect all unique warning lines
   unique_warnings = dict()
@@ -449,13 +727,8 @@ def parse_input_file_android(infile, flags):
       continue
     checked_warning_lines[line] = True
 
-    # Clean up extra prefix that could be introduced when RBE was used.
-    if '/b/f/w/' in line:
-      result = bfw_warning_pattern.search(line)
-    else:
-      result = extra_warning_pattern.search(line)
-    if result is not None:
-      line = result.group(1)
+    line = clean_up_warning_line(line, bfw_warning_pattern,
+                                 extra_warning_pattern)
 
     if warning_pattern.match(line):
       if line.startswith('warning: '):
@@ -468,34 +741,132 @@ def parse_input_file_android(infile, flags):
 
     if line_counter < 100:
       # save a little bit of time by only doing this for the first few lines
-      result = re.search('(?<=^PLATFORM_VERSION=).*', line)
-      if result is not None:
-        platform_version = result.group(0)
-        continue
-      result = re.search('(?<=^TARGET_PRODUCT=).*', line)
-      if result is not None:
-        target_product = result.group(0)
-        continue
-      result = re.search('(?<=^TARGET_BUILD_VARIANT=).*', line)
-      if result is not None:
-        target_variant = result.group(0)
+      parse_android_build_variable(line, build_variables)
+
+  if android_root:
+    unique_warnings = renormalize_android_warnings(unique_warnings, flags,
+                                                   android_root)
+
+  return unique_warnings, get_android_header_str(build_variables)
+
+
+def find_log_chunks(log, num_chunks):
+  """Split a log into about num_chunks [start, end) ranges of whole lines."""
+  size = len(log)
+  boundaries = [0]
+  for i in range(1, num_chunks):
+    newline = log.find(b'\n', max(boundaries[-1], size * i // num_chunks))
+    if newline < 0:
+      break
+    if newline + 1 > boundaries[-1]:
+      boundaries.append(newline + 1)
+  if boundaries[-1] < size:
+    boundaries.append(size)
+  return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def read_log_line(log, start):
+  """Return the line of a log that starts at start, and the next line start."""
+  end = log.find(b'\n', start)
+  end = len(log) if end < 0 else end + 1
+  return log[start:end].decode('utf-8', errors='replace'), end
+
+
+def parse_android_log_chunk(args):
+  """Collect the unique warning lines that start in a chunk of a log.
+
+  Args:
+    args: tuple of (path to the log, chunk start, chunk end, flags,
+        android_root, root_top_dirs)
+  Returns:
+    A list of (raw line, normalized warning line, link) tuples, for the first
+    occurrence in the chunk of each raw warning line, in the log order.
+  """
+  # pylint:disable=too-many-locals
+  logfile, start, end, flags, android_root, root_top_dirs = args
+  (warning_pattern, rustc_file_position, bfw_warning_pattern,
+   extra_warning_pattern) = get_android_warning_patterns(root_top_dirs)
+
+  chunk_warnings = []
+  checked_warning_lines = set()
+  with open(logfile, 'rb') as f, mmap.mmap(
+      f.fileno(), 0, access=mmap.ACCESS_READ) as log:
+    pos = start
+    while True:
+      # Only look at the lines with warnings, without splitting the others.
+      pos = log.find(b'warning: ', pos, end)
+      if pos < 0:
+        break
+      raw_line, pos = read_log_line(
+          log, max(log.rfind(b'\n', start, pos) + 1, start))
+      if raw_line in checked_warning_lines:
         continue
-      result = re.search('(?<=^BUILD_ID=).*', line)
-      if result is not None:
-        build_id = result.group(0)
+      checked_warning_lines.add(raw_line)
+
+      line = clean_up_warning_line(raw_line, bfw_warning_pattern,
+                                   extra_warning_pattern)
+      if not warning_pattern.match(line):
         continue
+      if line.startswith('warning: '):
+        # The file position of a rustc warning is in the next line, which
+        # may start in the next chunk. Like in parse_input_file_android, only
+        # the first occurrence of a repeated line is combined with it.
+        next_line, next_pos = read_log_line(log, pos)
+        if rustc_file_position.match(next_line):
+          line = next_line.strip().replace('--> ', '') + ': ' + line
+          pos = next_pos
+        else:
+          line = 'unknown_source_file: ' + line
+      chunk_warnings.append(
+          (raw_line, normalize_warning_line(line, flags, android_root),
+           generate_cs_link(line, flags, android_root)))
+  return chunk_warnings
+
+
+def parse_input_file_android_chunked(logfile, flags):
+  """Parse Android log file in parallel chunks, like parse_input_file_android.
+
+  The log is memory mapped and split on line boundaries into one chunk per
+  process. The unique warnings of the chunks are merged in the order of the
+  chunks, so the result doesn't depend on the number of chunks or on the
+  scheduling of the processes. A raw warning line repeated in several chunks
+  is only kept from the first one, so the result is the same as the one of
+  parse_input_file_android.
+  """
+  build_variables = new_android_build_variables()
+  with io.open(logfile, encoding='utf-8') as log:
+    android_root, root_top_dirs = find_android_root(log)
+    log.seek(0)
+    for line_counter, line in enumerate(log):
+      if line_counter >= 99:
+        break
+      parse_android_build_variable(line, build_variables)
+  header_str = get_android_header_str(build_variables)
+
+  if os.path.getsize(logfile) == 0:
+    return dict(), header_str
+  with open(logfile, 'rb') as f, mmap.mmap(
+      f.fileno(), 0, access=mmap.ACCESS_READ) as log:
+    chunks = find_log_chunks(log, max(flags.processes, 1))
+  chunk_args = [(logfile, start, end, flags, android_root, root_top_dirs)
+                for start, end in chunks]
+  if len(chunk_args) > 1:
+    with multiprocessing.Pool(len(chunk_args)) as pool:
+      chunk_warnings = pool.map(parse_android_log_chunk, chunk_args)
+  else:
+    chunk_warnings = [parse_android_log_chunk(args) for args in chunk_args]
+
+  unique_warnings = dict()
+  checked_warning_lines = set()
+  for warnings in chunk_warnings:
+    for raw_line, line, link in warnings:
+      if raw_line not in checked_warning_lines:
+        checked_warning_lines.add(raw_line)
+        unique_warnings.setdefault(line, link)
 
   if android_root:
-    new_unique_warnings = dict()
-    for warning_line in unique_warnings:
-      normalized_line = normalize_warning_line(warning_line, flags,
-                                               android_root)
-      new_unique_warnings[normalized_line] = generate_android_cs_link(
-          warning_line, flags, android_root)
-    unique_warnings = new_unique_warnings
-
-  header_str = '%s - %s - %s (%s)' % (
-      platform_version, target_product, target_variant, build_id)
+    unique_warnings = renormalize_android_warnings(unique_warnings, flags,
+                                                   android_root)
   return unique_warnings, header_str
 
 
@@ -550,19 +921,84 @@ def get_project_list(platform):
 def parallel_classify_warnings(warning_data, args, project_names,
                                project_patterns, warn_patterns,
                                use_google3, create_launch_subprocs_fn,
-                               classify_warnings_fn):
-  """Classify all warning lines with num_cpu parallel processes."""
+                               classify_warnings_fn, warning_db=None):
+  """Classify all warning lines with num_cpu parallel processes.
+
+  With a warning_db, only the lines that are not in it are classified. The
+  results are in the same order as without it.
+  """
   # pylint:disable=too-many-arguments,too-many-locals
+  if warning_db is None:
+    results = classify_warning_data(warning_data, args, project_patterns,
+                                    warn_patterns, use_google3,
+                                    create_launch_subprocs_fn,
+                                    classify_warnings_fn)
+  else:
+    warning_db.set_current_warnings(warning_data.keys())
+    cached = warning_db.get_cached_classification()
+    new_data = {w: link for w, link in warning_data.items()
+                if w not in cached}
+    # Warnings of the last build that lost their classification when the
+    # patterns changed are classified again, to be reported as fixed.
+    for line in warning_db.get_unclassified_fixed_warnings():
+      new_data[line] = ''
+    new_results = classify_warning_data(
+        new_data, args, project_patterns, warn_patterns, use_google3,
+        create_launch_subprocs_fn, classify_warnings_fn)
+    # Lines that match no warn pattern are stored with pattern_idx -1.
+    for line in new_data:
+      cached[line] = (-1, -1)
+    for line, _, pattern_idx, project_idx in new_results:
+      cached[line] = (pattern_idx, project_idx)
+    warning_db.add_classification((line,) + cached[line] for line in new_data)
+    results = [[line, link, cached[line][0], cached[line][1]]
+               for group in split_warning_groups(warning_data, args.processes)
+               for line, link in group
+               if cached[line][0] >= 0]
+
+  warning_messages = []
+  warning_links = []
+  warning_records = []
+  for line, link, pattern_idx, project_idx in results:
+    pattern = warn_patterns[pattern_idx]
+    pattern['members'].append(line)
+    message_idx = len(warning_messages)
+    warning_messages.append(line)
+    link_idx = len(warning_links)
+    warning_links.append(link)
+    warning_records.append([pattern_idx, project_idx, message_idx,
+                            link_idx])
+    pname = '???' if project_idx < 0 else project_names[project_idx]
+    # Count warnings by project.
+    if pname in pattern['projects']:
+      pattern['projects'][pname] += 1
+    else:
+      pattern['projects'][pname] = 1
+  return warning_messages, warning_links, warning_records
+
+
+def split_warning_groups(warning_data, num_groups):
+  """Split the (warning, link) items round-robin into num_groups groups.
+
+  The classified warnings are in the order of the groups.
+  """
+  warning_groups = [[] for _ in range(max(num_groups, 1))]
+  for i, item in enumerate(warning_data.items()):
+    warning_groups[i % len(warning_groups)].append(item)
+  return warning_groups
+
+
+def classify_warning_data(warning_data, args, project_patterns, warn_patterns,
+                          use_google3, create_launch_subprocs_fn,
+                          classify_warnings_fn):
+  """Return [line, link, pattern_idx, project_idx] of the classified lines."""
+  # pylint:disable=too-many-arguments
   num_cpu = args.processes
   group_results = []
 
   if num_cpu > 1:
     # set up parallel processing for this...
-    warning_groups = [[] for _ in range(num_cpu)]
-    i = 0
-    for warning, link in warning_data.items():
-      warning_groups[i].append((warning, link))
-      i = (i + 1) % num_cpu
+    warning_groups = split_warning_groups(warning_data, num_cpu)
     arg_groups = [[] for _ in range(num_cpu)]
     for i, group in enumerate(warning_groups):
       arg_groups[i] = [{
@@ -578,34 +1014,18 @@ def parallel_classify_warnings(warning_data, args, project_names,
                                               group_results)
   else:
     group_results = []
+    classifier = WarningClassifier(warn_patterns, project_patterns)
     for warning, link in warning_data.items():
-      classify_one_warning(warning, link, group_results,
-                           project_patterns, warn_patterns)
-    group_results = [group_results]
+      classifier.classify_one_warning(warning, link, group_results)
+    # Nest the results like the results of create_launch_subprocs_fn.
+    group_results = [[group_results]]
 
-  warning_messages = []
-  warning_links = []
-  warning_records = []
   if use_google3:
     group_results = [group_results]
-  for group_result in group_results:
-    for result in group_result:
-      for line, link, pattern_idx, project_idx in result:
-        pattern = warn_patterns[pattern_idx]
-        pattern['members'].append(line)
-        message_idx = len(warning_messages)
-        warning_messages.append(line)
-        link_idx = len(warning_links)
-        warning_links.append(link)
-        warning_records.append([pattern_idx, project_idx, message_idx,
-                                link_idx])
-        pname = '???' if project_idx < 0 else project_names[project_idx]
-        # Count warnings by project.
-        if pname in pattern['projects']:
-          pattern['projects'][pname] += 1
-        else:
-          pattern['projects'][pname] = 1
-  return warning_messages, warning_links, warning_records
+  return [classified
+          for group_result in group_results
+          for result in group_result
+          for classified in result]
 
 
 def process_log(logfile, flags, project_names, project_patterns, warn_patterns,
@@ -623,16 +1043,35 @@ def process_log(logfile, flags, project_names, project_patterns, warn_patterns,
   Note that if the arguments to this function change, process_gs_logs.py must
   be updated accordingly.
   """
-  if logfile_object is None:
+  if (logfile_object is None and getattr(flags, 'chunked', False) and
+      flags.platform == 'android'):
+    warning_lines_and_links, header_str = parse_input_file_android_chunked(
+        logfile, flags)
+  elif logfile_object is None:
     with io.open(logfile, encoding='utf-8') as log:
       warning_lines_and_links, header_str = parse_input_file(log, flags)
   else:
     warning_lines_and_links, header_str = parse_input_file(
         logfile_object, flags)
-  warning_messages, warning_links, warning_records = parallel_classify_warnings(
-      warning_lines_and_links, flags, project_names, project_patterns,
-      warn_patterns, use_google3, create_launch_subprocs_fn,
-      classify_warnings_fn)
+  warning_db = None
+  if getattr(flags, 'warning_db', ''):
+    warning_db = warning_db_lib.WarningDatabase(
+        flags.warning_db, warn_patterns, project_patterns)
+  try:
+    warning_messages, warning_links, warning_records = (
+        parallel_classify_warnings(
+            warning_lines_and_links, flags, project_names, project_patterns,
+            warn_patterns, use_google3, create_launch_subprocs_fn,
+            classify_warnings_fn, warning_db))
+    if warning_db is not None:
+      new_warnings, fixed_warnings = warning_db.record_build(header_str)
+      if flags.delta_csvpath:
+        html_writer.write_delta_csv(flags.delta_csvpath, new_warnings,
+                                    fixed_warnings, warn_patterns,
+                                    project_names)
+  finally:
+    if warning_db is not None:
+      warning_db.close()
 
   html_writer.write_html(flags, project_names, warn_patterns, html_path,
                          warning_messages, warning_links, warning_records,
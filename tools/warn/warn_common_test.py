@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import io
+import os
+import re
+import tempfile
+import unittest
+
+from warn import warn_common
+
+
+def make_log_lines():
+  """Return the lines of a build log with the kinds of warning lines."""
+  lines = ['PLATFORM_VERSION=15', 'TARGET_PRODUCT=aosp_arm64',
+           'TARGET_BUILD_VARIANT=userdebug', 'BUILD_ID=MAIN']
+  for i in range(300):
+    lines.append('[%d/300] compile' % i)
+    lines.append('external/lib%d/a.c:%d:3: warning: unused variable [-Wunused]'
+                 % (i % 7, i % 11))
+    # rustc warnings with a description repeated at different positions.
+    lines.append('warning: unused import: `foo`')
+    lines.append('   --> external/rust/lib%d/src/lib.rs:%d:5' % (i % 5, i))
+    lines.append('warning: field is never read')
+    lines.append('  |')
+    # RBE output with leading characters from stderr
+    lines.append('12 warnings/b/f/w/frameworks/base/b%d.cpp:1:1: warning: '
+                 'deprecated [-Wdeprecated]' % (i % 3))
+    lines.append('5 warnings generated frameworks/av/c%d.cpp:2:2: warning: '
+                 'shadow [-Wshadow]' % (i % 13))
+    lines.append('device/google/d.mk: warning: overriding commands')
+  return lines
+
+
+class ParseInputFileAndroidTest(unittest.TestCase):
+
+  def setUp(self):
+    tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(tmpdir.cleanup)
+    self.logfile = os.path.join(tmpdir.name, 'build.log')
+    with open(self.logfile, 'w', encoding='utf-8') as f:
+      f.write('\n'.join(make_log_lines()) + '\n')
+
+  def make_flags(self, processes):
+    return argparse.Namespace(platform='android', processes=processes,
+                              url='', separator='?l=')
+
+  def test_chunked_parser_matches_default_parser(self):
+    with io.open(self.logfile, encoding='utf-8') as log:
+      expected = warn_common.parse_input_file_android(log, self.make_flags(1))
+    self.assertIn('unknown_source_file: warning: field is never read',
+                  expected[0])
+    for processes in (1, 2, 3, 7, 16):
+      with self.subTest(processes=processes):
+        actual = warn_common.parse_input_file_android_chunked(
+            self.logfile, self.make_flags(processes))
+        self.assertEqual(expected, actual)
+        self.assertEqual(list(expected[0].items()), list(actual[0].items()))
+
+
+# A group without nested groups, whose first alternative is kept.
+_SAMPLE_GROUP = re.compile(r'\((?:\?:)?([^()|]*)(?:\|[^()]*)?\)[?*+]?')
+# A set, which is replaced by its first character, or by 'x' if negated.
+_SAMPLE_SET = re.compile(r'\[(\^?)\\?(.)(?:[^\]\\]|\\.)*\][*+?]?(?:\{[^}]*\})?')
+
+
+def make_sample_warning(pattern):
+  """Return a line that the warn pattern is expected to match."""
+  # Escaped parentheses are literal text, not groups.
+  sample = pattern.replace('\\(', '\x01').replace('\\)', '\x02')
+  sample = re.sub(r'(?<!\\)[$^]', '', sample)
+  sample = re.sub(r'\\s[*+?]?', ' ', sample)
+  sample = re.sub(r'\\d[*+?]?', '1', sample)
+  sample = re.sub(r'\\w[*+?]?', 'w', sample)
+  sample = _SAMPLE_SET.sub(lambda m: 'x' if m.group(1) else m.group(2), sample)
+  sample = re.sub(r'(?<!\\)\.[*+?]?', 'x', sample)
+  while True:
+    sample, num_groups = _SAMPLE_GROUP.subn(r'\1', sample)
+    if not num_groups:
+      break
+  sample = re.sub(r'(?<!\\)[?*+]', '', sample)
+  sample = re.sub(r'\\(.)', r'\1', sample)
+  return sample.replace('\x01', '(').replace('\x02', ')')
+
+
+class WarningClassifierTest(unittest.TestCase):
+
+  def assert_same_classification(self, warnings, warn_patterns,
+                                 project_patterns):
+    classifier = warn_common.WarningClassifier(warn_patterns, project_patterns)
+    for warning in warnings:
+      expected = []
+      warn_common.classify_one_warning(warning, '', expected,
+                                       project_patterns, warn_patterns)
+      actual = []
+      classifier.classify_one_warning(warning, '', actual)
+      self.assertEqual(expected, actual, warning)
+
+  def test_android_patterns(self):
+    warn_patterns = warn_common.get_warn_patterns('android')
+    project_patterns = [re.compile(p[1]) for p in
+                        warn_common.get_project_list('android')]
+    families = {
+        'make': warn_common.make_patterns.warn_patterns,
+        'cpp': warn_common.cpp_patterns.warn_patterns,
+        'java': warn_common.java_patterns.warn_patterns,
+        'tidy': warn_common.tidy_patterns.warn_patterns,
+        'other': warn_common.other_patterns.warn_patterns,
+    }
+    warnings = []
+    unmatched_samples = []
+    for family, patterns in families.items():
+      for pattern in patterns:
+        for cpat in pattern['compiled_patterns']:
+          sample = make_sample_warning(cpat.pattern)
+          if not cpat.match(sample):
+            unmatched_samples.append((family, cpat.pattern, sample))
+          warnings += [
+              'frameworks/base/core/jni/' + sample,
+              'external/foo/' + sample + ' [-Wunused-variable]',
+              # Usually matches no pattern, or a different one.
+              sample[:len(sample) * 2 // 3],
+          ]
+    self.assertEqual([], unmatched_samples)
+    self.assertGreater(len(warnings), 3000)
+    self.assert_same_classification(warnings, warn_patterns, project_patterns)
+
+  def test_no_candidate_patterns(self):
+    warn_patterns = [{'compiled_patterns': [re.compile(r'.*: warning: unused')]}]
+    project_patterns = []
+    self.assert_same_classification(
+        ['a.c:1: warning: unused', 'a.c:1: warning: other', 'other'],
+        warn_patterns, project_patterns)
+
+  def test_backreferences(self):
+    warn_patterns = [
+        {'compiled_patterns': [re.compile(r'.*: warning: (\w+) and (\w+)$')]},
+        {'compiled_patterns': [re.compile(r'.*: warning: (\w+) is \1$')]},
+    ]
+    project_patterns = [re.compile(r'(\w+)/.*'), re.compile(r'(\w+)/\1/.*')]
+    self.assert_same_classification(
+        ['a/a/b.c:1: warning: x is x', 'a/b/c.c:1: warning: x is y',
+         'b/b/c.c:1: warning: x and y'],
+        warn_patterns, project_patterns)
+
+
+if __name__ == '__main__':
+  unittest.main(verbosity=2)
@@ -0,0 +1,190 @@
+# python3
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""SQLite store of classified warnings, shared by consecutive builds.
+
+Each normalized warning line is stored with its index to warn_patterns and
+project_names, so a build only classifies the lines that no earlier build had.
+The store also remembers the warnings of the last build, to find the warnings
+that are new or fixed since then, and keeps the number of warnings of each
+build.
+
+The cached indexes are dropped when the warn patterns or project patterns
+change, because the indexes are only valid for the same lists of patterns.
+Lines that are in none of the last KEEP_BUILDS builds are deleted, so the
+store doesn't grow with every warning ever seen.
+"""
+
+import hashlib
+import sqlite3
+
+# Number of recorded builds whose warnings are kept.
+KEEP_BUILDS = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS properties (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS warnings (
+    line TEXT PRIMARY KEY,
+    pattern_idx INTEGER,
+    project_idx INTEGER,
+    first_build INTEGER NOT NULL,
+    last_build INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS warnings_last_build ON warnings (last_build);
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    header TEXT,
+    num_warnings INTEGER NOT NULL,
+    num_new INTEGER NOT NULL,
+    num_fixed INTEGER NOT NULL);
+"""
+
+
+def get_patterns_signature(warn_patterns, project_patterns):
+  """Return a digest of the patterns that the cached indexes depend on."""
+  digest = hashlib.sha256()
+  for pattern in warn_patterns:
+    for regex in pattern['patterns']:
+      digest.update(regex.encode('utf-8'))
+      digest.update(b'\0')
+    digest.update(b'\1')
+  for regex in project_patterns:
+    digest.update(regex.pattern.encode('utf-8'))
+    digest.update(b'\0')
+  return digest.hexdigest()
+
+
+class WarningDatabase:
+  """Classified warnings of consecutive builds, stored in an SQLite file.
+
+  Usage:
+    set_current_warnings() with the lines of the current build;
+    get_cached_classification() for the lines classified by earlier builds;
+    get_unclassified_fixed_warnings() for the lines of the last build that
+    must be classified again;
+    add_classification() for the other lines and those, once they are
+    classified;
+    record_build() to find the new and fixed warnings.
+  """
+
+  def __init__(self, path, warn_patterns, project_patterns,
+               keep_builds=KEEP_BUILDS):
+    self._keep_builds = keep_builds
+    self._conn = sqlite3.connect(path)
+    self._conn.executescript(_SCHEMA)
+    signature = get_patterns_signature(warn_patterns, project_patterns)
+    row = self._conn.execute(
+        "SELECT value FROM properties WHERE name = 'patterns'").fetchone()
+    with self._conn:
+      if row is None or row[0] != signature:
+        self._conn.execute(
+            'UPDATE warnings SET pattern_idx = NULL, project_idx = NULL')
+        self._conn.execute(
+            "INSERT OR REPLACE INTO properties VALUES ('patterns', ?)",
+            (signature,))
+    self._conn.execute('CREATE TEMP TABLE current (line TEXT PRIMARY KEY)')
+
+  def close(self):
+    self._conn.close()
+
+  def set_current_warnings(self, lines):
+    """Set the warning lines of the current build."""
+    with self._conn:
+      self._conn.execute('DELETE FROM current')
+      self._conn.executemany('INSERT OR IGNORE INTO current VALUES (?)',
+                             ((line,) for line in lines))
+
+  def get_cached_classification(self):
+    """Return {line: (pattern_idx, project_idx)} of the classified lines.
+
+    Only lines of the current build are returned. A pattern_idx of -1 means
+    that the line matched no warn pattern.
+    """
+    return {
+        line: (pattern_idx, project_idx)
+        for line, pattern_idx, project_idx in self._conn.execute(
+            'SELECT w.line, w.pattern_idx, w.project_idx '
+            'FROM current c JOIN warnings w ON w.line = c.line '
+            'WHERE w.pattern_idx IS NOT NULL')
+    }
+
+  def get_unclassified_fixed_warnings(self):
+    """Return the lines of the last build that are not in the current build
+    and are not classified, because the patterns changed since then.
+
+    They must be classified again and given to add_classification() before
+    record_build(), to be reported as fixed.
+    """
+    return [
+        line for (line,) in self._conn.execute(
+            'SELECT w.line FROM warnings w '
+            'WHERE w.last_build = ? AND w.pattern_idx IS NULL AND NOT EXISTS '
+            '(SELECT 1 FROM current c WHERE c.line = w.line) ORDER BY w.line',
+            (self._get_last_build(),))
+    ]
+
+  def _get_last_build(self):
+    row = self._conn.execute('SELECT MAX(id) FROM builds').fetchone()
+    return row[0] or 0
+
+  def add_classification(self, classified_lines):
+    """Store (line, pattern_idx, project_idx) of newly classified lines."""
+    next_build = self._get_last_build() + 1
+    with self._conn:
+      self._conn.executemany(
+          'INSERT INTO warnings VALUES (?, ?, ?, ?, 0) '
+          'ON CONFLICT (line) DO UPDATE SET '
+          'pattern_idx = excluded.pattern_idx, '
+          'project_idx = excluded.project_idx',
+          ((line, pattern_idx, project_idx, next_build)
+           for line, pattern_idx, project_idx in classified_lines))
+
+  def record_build(self, header_str=''):
+    """Record the current warnings as a new build.
+
+    The lines that are in none of the last keep_builds builds are deleted.
+
+    Returns:
+      (new, fixed), the lists of (line, pattern_idx, project_idx) of the
+      warnings that are in the current build but not in the last recorded
+      build, and of the warnings that are in the last build but not in the
+      current build. Both are empty for the first recorded build.
+    """
+    last_build = self._get_last_build()
+    query = ('SELECT w.line, w.pattern_idx, w.project_idx FROM warnings w '
+             'WHERE w.last_build {} ? AND {} EXISTS '
+             '(SELECT 1 FROM current c WHERE c.line = w.line) '
+             'AND w.pattern_idx >= 0 ORDER BY w.line')
+    new, fixed = [], []
+    if last_build:
+      new = self._conn.execute(query.format('!=', ''),
+                               (last_build,)).fetchall()
+      fixed = self._conn.execute(query.format('=', 'NOT'),
+                                 (last_build,)).fetchall()
+    num_warnings = self._conn.execute(
+        'SELECT COUNT(*) FROM current c JOIN warnings w ON w.line = c.line '
+        'WHERE w.pattern_idx >= 0').fetchone()[0]
+    with self._conn:
+      build = self._conn.execute(
+          'INSERT INTO builds (header, num_warnings, num_new, num_fixed) '
+          'VALUES (?, ?, ?, ?)',
+          (header_str, num_warnings, len(new), len(fixed))).lastrowid
+      self._conn.execute(
+          'UPDATE warnings SET last_build = ? '
+          'WHERE line IN (SELECT line FROM current)', (build,))
+      self._conn.execute('DELETE FROM warnings WHERE last_build <= ?',
+                         (build - self._keep_builds,))
+    return new, fixed
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import os
+import re
+import sqlite3
+import tempfile
+import unittest
+
+from warn import warn_common
+from warn import warning_db
+
+PROJECT_NAMES = ['external', 'frameworks']
+PROJECT_PATTERNS = [re.compile('external/.*: warning:'),
+                    re.compile('frameworks/.*: warning:')]
+
+A = 'external/a.c:1: warning: unused'
+B = 'external/b.c:2: warning: deprecated'
+C = 'frameworks/c.c:3: warning: unused'
+D = 'frameworks/d.c:4: warning: deprecated'
+E = 'external/e.c:5: warning: other'
+
+
+def make_warn_patterns(regexes):
+  return [{'patterns': [regex], 'compiled_patterns': [re.compile(regex)],
+           'members': [], 'projects': {}} for regex in regexes]
+
+
+WARN_PATTERNS = [r'.*: warning: unused', r'.*: warning: deprecated']
+
+
+class WarningDatabaseTest(unittest.TestCase):
+
+  def setUp(self):
+    tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(tmpdir.cleanup)
+    self.db_path = os.path.join(tmpdir.name, 'warnings.db')
+    # The lines classified by each build.
+    self.classified = []
+
+  def launch_in_process(self, num_cpu, classify_warnings_fn, arg_groups,
+                        group_results):
+    """Classify the groups like warn.create_and_launch_subprocesses."""
+    del num_cpu  # Unused
+    for args in arg_groups:
+      self.classified[-1].extend(line for line, _ in args[0]['group'])
+      group_results.append([classify_warnings_fn(arg) for arg in args])
+    return group_results
+
+  @staticmethod
+  def classify_warnings(args):
+    results = []
+    classifier = warn_common.WarningClassifier(args['warn_patterns'],
+                                               args['project_patterns'])
+    for line, link in args['group']:
+      classifier.classify_one_warning(line, link, results)
+    return results
+
+  def classify(self, lines, processes=2, regexes=None, db=None):
+    """Return the classified warning messages and records of lines."""
+    self.classified.append([])
+    warning_messages, _, warning_records = (
+        warn_common.parallel_classify_warnings(
+            {line: '' for line in lines},
+            argparse.Namespace(processes=processes), PROJECT_NAMES,
+            PROJECT_PATTERNS, make_warn_patterns(regexes or WARN_PATTERNS),
+            False, self.launch_in_process, self.classify_warnings, db))
+    self.classified[-1].sort()
+    return warning_messages, [record[:2] for record in warning_records]
+
+  def run_build(self, lines, regexes=None, processes=2):
+    """Classify the lines of a build with the database, and record it."""
+    regexes = regexes or WARN_PATTERNS
+    db = warning_db.WarningDatabase(
+        self.db_path, make_warn_patterns(regexes), PROJECT_PATTERNS)
+    try:
+      results = self.classify(lines, processes, regexes, db)
+      # The database doesn't change the results, nor their order.
+      self.assertEqual(self.classify(lines, processes, regexes), results)
+      self.classified.pop()
+      return db.record_build('header')
+    finally:
+      db.close()
+
+  def get_lines(self):
+    with sqlite3.connect(self.db_path) as conn:
+      return [line for (line,) in conn.execute(
+          'SELECT line FROM warnings ORDER BY line')]
+
+  def get_builds(self):
+    with sqlite3.connect(self.db_path) as conn:
+      return conn.execute('SELECT num_warnings, num_new, num_fixed FROM builds '
+                          'ORDER BY id').fetchall()
+
+  def test_new_and_fixed_warnings(self):
+    self.assertEqual(([], []), self.run_build([A, B]))
+    self.assertEqual(([(C, 0, 1)], [(B, 1, 0)]), self.run_build([A, C]))
+    self.assertEqual([(2, 0, 0), (2, 1, 1)], self.get_builds())
+
+  def test_cached_rerun_classifies_nothing(self):
+    self.run_build([A, B])
+    self.assertEqual(([], []), self.run_build([A, B]))
+    self.assertEqual([[A, B], []], self.classified)
+
+  def test_fixed_warnings_after_patterns_change(self):
+    self.run_build([A, B])
+    changed_regexes = WARN_PATTERNS + [r'.*: warning: other']
+    self.assertEqual(([], [(B, 1, 0)]),
+                     self.run_build([A], regexes=changed_regexes))
+    # All the lines are classified again for the changed patterns.
+    self.assertEqual([[A, B], [A, B]], self.classified)
+    self.assertEqual([(2, 0, 0), (1, 0, 1)], self.get_builds())
+
+  def test_results_order(self):
+    lines = [A, B, C, D, E]
+    for processes in (2, 3, 4, 1):
+      with self.subTest(processes=processes):
+        self.run_build(lines, processes=processes)
+    self.assertEqual([sorted(lines)] + [[]] * 3, self.classified)
+
+  def test_old_warnings_are_deleted(self):
+    self.run_build([A, B])
+    for _ in range(warning_db.KEEP_BUILDS - 1):
+      self.run_build([A])
+    self.assertEqual([A, B], self.get_lines())
+    self.run_build([A, C])
+    self.assertEqual([A, C], self.get_lines())
+
+  def test_deleted_warnings_are_new_again(self):
+    self.run_build([A, B])
+    for _ in range(warning_db.KEEP_BUILDS):
+      self.run_build([A])
+    self.assertEqual(([(B, 1, 0)], []), self.run_build([A, B]))
+    self.assertEqual([A, B], self.classified[0])
+    self.assertEqual([B], self.classified[-1])
+
+
+if __name__ == '__main__':
+  unittest.main(verbosity=2)